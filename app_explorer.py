@@ -1,24 +1,12 @@
 from framework import BaseApp
-import os
-import lcd
+import lcd_meter as lcd
+import image
+from dir_listing import DirListing, join_path
+from text_cache import draw_text
+from dir_index import DirIndex, IndexBuilder, ensure_index_dir, ORDER_NAME, order_names
+import logger
 
-# import uos
-
-S_IFDIR = 0o040000  # directory
-
-
-# noinspection PyPep8Naming
-def S_IFMT(mode):
-    """Return the portion of the file's mode that describes the
-    file type.
-    """
-    return mode & 0o170000
-
-
-# noinspection PyPep8Naming
-def S_ISDIR(mode):
-    """Return True if mode is from a directory."""
-    return S_IFMT(mode) == S_IFDIR
+log = logger.get_logger("explorer")
 
 
 def sizeof_fmt(num, suffix='B'):
@@ -30,68 +18,258 @@ def sizeof_fmt(num, suffix='B'):
 
 
 class ExplorerApp(BaseApp):
+    # a scroll renders one row, its name bitmap may miss the text cache
+    alloc_budget = 24 * 1024
+
     def __init__(self, system):
         super(ExplorerApp, self).__init__(system)
         self.current_offset = 0
         self.current_selected_index = 0
+        self.visible_rows = 7
+        self.current_dir = "/sd"
+        # (dir, selected index, offset) of the parent directories
+        self.dir_stack = []
+        self.listing = None
+        self.index_builder = None
+        self.sort_mode = ORDER_NAME
+        self.row_top = 6
+        self.row_height = 18
+        # unselected row bitmaps of the rows on screen, keyed by row, a
+        # scroll pushes them at their new position instead of drawing text
+        self.row_images = {}
+        self.row_pool = []
+        self.selected_image = None
+        self.selected_image_row = None
+        # what is on the lcd now, None forces a full redraw
+        self.drawn_offset = None
+        self.drawn_selected = None
+        self.draw_calls = 0
+        self.rows_rendered = 0
+        self.rows_pushed = 0
         self.__initialized = False
 
     def __lazy_init(self):
-        current_dir_files = os.listdir("/sd/")
-        self.current_dir_file_info_list = []
-        for file_name in current_dir_files:
-            info = {}
-            info["file_name"] = file_name
-            try:
-                f_stat = os.stat('/sd/' + file_name)
-                info["stat"] = f_stat
-            except Exception as e:
-                info["stat"] = None
-                print(
-                    "----- error when calling os.stat() ----- file_name =", file_name, e)
-            self.current_dir_file_info_list.append(info)
-        print(self.current_dir_file_info_list)
+        try:
+            # must exist before any directory of /sd is counted
+            ensure_index_dir()
+        except OSError as e:
+            log.warn("cannot create index dir:", e)
+        self.open_dir(self.current_dir)
         self.__initialized = True
 
+    def open_dir(self, path):
+        self.current_dir = path
+        self.current_selected_index = 0
+        self.current_offset = 0
+        self.index_builder = None
+        index = DirIndex.load(path)
+        if index is not None:
+            self.listing = index
+            return
+        # only a screenful of names is read before the first frame, the
+        # index is built in the background and used from the next visit
+        self.listing = DirListing(path)
+        self.listing.ensure(self.visible_rows + 1)
+        self.index_builder = IndexBuilder(DirListing(path))
+        self.start_task("dir_index", self.build_index_step)
+
+    def build_index_step(self):
+        builder = self.index_builder
+        if builder is None:
+            return None
+        delay = builder.step()
+        if delay is None:
+            if builder.index is not None and builder.listing.path == self.current_dir:
+                selected = self.entry_index(self.current_selected_index)
+                self.listing = builder.index
+                self.select_entry(selected)
+                self.invalidate_drawing()
+            self.index_builder = None
+        return delay
+
+    def entry_index(self, row):
+        """listing index of a row in the current sort mode"""
+        order = None
+        if self.listing.complete and hasattr(self.listing, "order"):
+            order = self.listing.order(self.sort_mode)
+        return order[row] if order is not None else row
+
+    def select_row(self, row):
+        self.current_selected_index = row
+        if row >= self.visible_rows:
+            self.current_offset = row - self.visible_rows + 1
+        else:
+            self.current_offset = 0
+
+    def select_entry(self, index):
+        """move the cursor to the row that shows listing entry index"""
+        for row in range(self.listing.count()):
+            if self.entry_index(row) == index:
+                self.select_row(row)
+                return
+
     def on_top_button_changed(self, state):
         if state == "pressed":
             self.current_selected_index += 1
-            if self.current_selected_index >= len(self.current_dir_file_info_list):
+            if self.current_selected_index >= self.listing.ensure(self.current_selected_index + 1):
                 self.current_selected_index = 0
-            if self.current_selected_index >= 7:
-                self.current_offset = self.current_selected_index - 6
+            self.select_row(self.current_selected_index)
+            if self.drawn_offset == self.current_offset:
+                # cursor move inside the viewport, only two rows change
+                self.invalidate_row(self.drawn_selected)
+                self.invalidate_row(self.current_selected_index)
             else:
-                self.current_offset = 0
-            print("current_selected=", self.current_selected_index,
-                  "current_offset=", self.current_offset)
-            self.invalidate_drawing()
+                self.invalidate_rect(0, self.row_top, lcd.width(),
+                                     lcd.height() - self.row_top)
+        return True
+
+    def on_home_button_changed(self, state):
+        if state != "pressed" or self.listing.count() == 0:
+            return True
+        index = self.entry_index(self.current_selected_index)
+        is_dir, _ = self.listing.stat(index)
+        if is_dir:
+            # the entry, not the row: the sort mode may change in the child
+            self.dir_stack.append((self.current_dir, index))
+            self.open_dir(join_path(self.current_dir, self.listing.name(index)))
+        else:
+            # home on a file cycles the sort order: name, size, raw
+            self.sort_mode = (self.sort_mode + 1) % len(order_names)
+            self.select_entry(index)
+            log.info("explorer sort by", order_names[self.sort_mode])
+        self.invalidate_drawing()
+        return True
+
+    def on_resume(self):
+        # navigate back cancelled the background index build
+        if self.index_builder is not None:
+            self.start_task("dir_index", self.build_index_step)
+
+    def on_pause(self):
+        # row bitmaps are rendered again by the full redraw on resume
+        self.reset_rows()
+        self.row_pool = []
+        self.selected_image = None
+
+    def on_destroy(self):
+        self.listing = None
+        self.index_builder = None
+        self.__initialized = False
+
+    def on_back_pressed(self):
+        if len(self.dir_stack) == 0:
+            return False
+        path, index = self.dir_stack.pop()
+        self.open_dir(path)
+        # a DirListing has only read the first screen of names
+        self.listing.ensure(index + 1)
+        self.select_entry(index)
+        self.invalidate_drawing()
+        return True
+
+    def row_y(self, row):
+        return self.row_top + (row - self.current_offset) * self.row_height
+
+    def invalidate_row(self, row):
+        if row is None:
+            return
+        y = self.row_y(row)
+        if 0 <= y < lcd.height():
+            self.invalidate_rect(0, y, lcd.width(), min(self.row_height, lcd.height() - y))
+
+    def alloc_row_image(self):
+        if len(self.row_pool) > 0:
+            return self.row_pool.pop()
+        return image.Image(size=(lcd.width(), self.row_height))
+
+    def reset_rows(self):
+        """forget every row bitmap, the next draw renders all rows"""
+        for img in self.row_images.values():
+            self.row_pool.append(img)
+        self.row_images = {}
+        self.selected_image_row = None
+        self.drawn_offset = None
+        self.drawn_selected = None
+
+    def render_row(self, img, row, is_current):
+        index = self.entry_index(row)
+        file_name = self.listing.name(index)
+        is_dir, size = self.listing.stat(index)
+        img.draw_rectangle(0, 0, img.width(), img.height(), color=(0, 0, 0), fill=True)
+        if is_dir:
+            file_name = file_name + '/'
+        elif size is not None:
+            draw_text(img.width() - 50, 0, sizeof_fmt(size),
+                      (255, 255, 255), (0, 0, 255), img)
+        # the cursor cell is drawn apart so both variants of a row share
+        # the cached bitmap of its name
+        x = 4 + draw_text(4, 0, "->" if is_current else "  ",
+                          (255, 255, 255), (255, 0, 0), img)
+        draw_text(x, 0, " %d %s" % (row, file_name), (255, 255, 255), (255, 0, 0), img)
+        self.rows_rendered += 1
+
+    def row_image(self, row):
+        if row == self.current_selected_index:
+            if self.selected_image is None:
+                self.selected_image = image.Image(size=(lcd.width(), self.row_height))
+            if self.selected_image_row != row:
+                self.render_row(self.selected_image, row, True)
+                self.selected_image_row = row
+            return self.selected_image
+        img = self.row_images.get(row)
+        if img is None:
+            img = self.alloc_row_image()
+            self.render_row(img, row, False)
+            self.row_images[row] = img
+        return img
+
+    def push_row(self, row, count, is_blank):
+        y = self.row_y(row)
+        h = min(self.row_height, lcd.height() - y)
+        if h <= 0:
+            return
+        if row < count:
+            lcd.display(self.row_image(row), roi=(0, 0, lcd.width(), h), oft=(0, y))
+            self.rows_pushed += 1
+        elif is_blank:
+            return
+        else:
+            lcd.fill_rectangle(0, y, lcd.width(), h, lcd.BLACK)
+        self.draw_calls += 1
+
+    def draw_rows(self, is_blank=False):
+        listing = self.listing
+        offset = self.current_offset
+        # one more row than visible_rows is partly shown at the bottom
+        last = offset + self.visible_rows + 1
+        count = listing.ensure(last)
+        for row in list(self.row_images.keys()):
+            if row < offset or row >= last:
+                self.row_pool.append(self.row_images.pop(row))
+        if self.drawn_offset == offset:
+            rows = (self.drawn_selected, self.current_selected_index)
+            if rows[0] == rows[1]:
+                rows = rows[:1]
+        else:
+            # the viewport moved, the rows that stay on screen are pushed
+            # from their bitmaps and only newly exposed rows are rendered
+            rows = range(offset, last)
+        for row in rows:
+            if offset <= row < last:
+                self.push_row(row, count, is_blank)
+        self.drawn_offset = offset
+        self.drawn_selected = self.current_selected_index
 
     def on_draw(self):
         if not self.__initialized:
             self.__lazy_init()
-        x_offset = 4
-        y_offset = 6
+        self.reset_rows()
         lcd.clear()
-        print("progress 0")
-        for i in range(self.current_offset, len(self.current_dir_file_info_list)):
-            # gc.collect()
-            print("progress 1")
-            file_info = self.current_dir_file_info_list[i]
-            file_name = file_info["file_name"]
-            f_stat = file_info["stat"]
-            if f_stat != None:
-                if S_ISDIR(f_stat[0]):
-                    file_name = file_name + '/'
-                file_readable_size = sizeof_fmt(f_stat[6])
-                lcd.draw_string(lcd.width() - 50, y_offset,
-                                file_readable_size, lcd.WHITE, lcd.BLUE)
-            is_current = self.current_selected_index == i
-            line = "%s %d %s" % ("->" if is_current else "  ", i, file_name)
-            lcd.draw_string(x_offset, y_offset, line, lcd.WHITE, lcd.RED)
-            # gc.collect()
-            print("progress 2")
-            y_offset += 18
-            if y_offset > lcd.height():
-                print("y_offset > height(), break")
-                break
-            print("progress 3")
+        self.draw_calls += 1
+        self.draw_rows(True)
+
+    def on_draw_rects(self, rects):
+        if not self.__initialized or self.drawn_offset is None:
+            self.on_draw()
+            return
+        self.draw_rows()
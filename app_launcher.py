@@ -1,46 +1,81 @@
 
 import os
-import lcd
-import sys
+import lcd_meter as lcd
 import time
 import machine
 
 import image
 
-from framework import BaseApp
-from app_camera import CameraApp
-from app_explorer import ExplorerApp
-from app_system_info import SystemInfoApp
+from framework import BaseApp, rect_contains
 
 import config
+import image_cache
+from text_cache import TextField, draw_text, GLYPH_WIDTH, GLYPH_HEIGHT
+from battery_gauge import BatteryGauge
 import resource
+import logger
+
+log = logger.get_logger("launcher")
 
 
 class LauncherApp(BaseApp):
+    # a carousel step may decode one icon that fell out of the image cache
+    alloc_budget = 12 * 1024
+
     def __init__(self, system):
         super(LauncherApp, self).__init__(system)
-        print("LauncherApp: super.__init__() called")
         self.app_list = resource.app_list
         self.battery_icon_list = resource.battery_icon_list
         self.battery_charging_icon_list = resource.battery_charging_icon_list
         self.arrow_icon_path = resource.arrow_icon_path
         self.app_count = len(self.app_list)
         self.cursor_index = 0
+        # cursor position that never wraps, keys the tiles of the strip
+        self.carousel_seq = 0
         self.need_show_top_button_tip = True
-        self.animation_count = 3
+        self.animation_count = 6
         self.pending_animation_values = []
-        self.icon_path_to_image_cache = {}
+        self.animation_start_us = None
+        self.animation_frames = 0
+        self.last_animation_us = 0
         self.app_periodic_task_last_time = 0
+        self.icon_width = 64
+        self.icon_height = 60
+        self.icon_padding = 6
+        self.icon_pitch = self.icon_width + self.icon_padding
+        # battery text and icon, repainted alone by the periodic task
+        self.status_bar_height = 20
+        self.battery_label = "Battery: "
+        # voltage and percent redraw only the glyph cells that changed
+        self.battery_field = TextField(3 + len(self.battery_label) * GLYPH_WIDTH, 3, 10,
+                                       (0, 255, 0), (0, 0, 0))
+        self.drawn_battery_icon = None
+        self.screen_canvas = None
+        # icon row pre-composited as a ring of tiles, see draw_carousel()
+        self.carousel_strip = None
+        self.carousel_rect = None
+        self.carousel_slot_count = 0
+        self.carousel_half_count = 0
+        self.carousel_slot_seqs = []
+        capacity_mah = config.get_config_by_key("battery_capacity_mah")
+        if capacity_mah:
+            # fuse coulomb counter deltas into the voltage based estimate
+            system.pmu.enable_coulomb_counter(True)
+        self.battery_gauge = BatteryGauge(capacity_mah=capacity_mah)
+        self.preload_icons()
+
+    def preload_icons(self):
+        """decode the visible carousel neighbourhood before the first frame"""
+        visible_half_count = 2
+        paths = [self.arrow_icon_path]
+        for i in range(-visible_half_count - 1, visible_half_count + 2):
+            paths.append(self.app_list[(self.cursor_index + i) % self.app_count]["icon"])
+        image_cache.preload(paths)
 
     def draw_icon(self, screen_canvas, icon_path, x, y, horizontal_align, vertical_align):
         """closure: an inner function inside a method"""
         try:
-            icon = None
-            if icon_path in self.icon_path_to_image_cache:
-                icon = self.icon_path_to_image_cache[icon_path]
-            else:
-                icon = image.Image(icon_path)
-                self.icon_path_to_image_cache[icon_path] = icon
+            icon = image_cache.get_image(icon_path)
             # calculate horizontal
             if "center" == horizontal_align:
                 left = x - icon.width() // 2
@@ -53,80 +88,172 @@ class LauncherApp(BaseApp):
                 top = y
             screen_canvas.draw_image(icon, left, top)
         except Exception as e:
-            print("cannot draw icon:", e)
-            sys.print_exception(e)
+            log.warn("cannot draw icon:", e)
 
-    def on_draw(self):
-        print("LauncherApp.on_draw()")
-        icon_width = 64
-        icon_height = 60
-        icon_padding = 6
-        icon_margin_top = 0
-        screen_canvas = image.Image()
-        vbat = self.get_system().pmu.getVbatVoltage() / 1000.0
-        usb_plugged = self.get_system().pmu.is_usb_plugged_in()
-        battery_level = self.calculate_battery_level(vbat)
-        vbat_str = str(vbat) + "V"
-        print("vbat", vbat_str)
-        # screen_canvas.draw_string(180, 10, vbat_str, lcd.GREEN, scale=1)
-
-        icons_count = screen_canvas.width() // (icon_width + icon_padding)
+    def init_carousel(self, screen_canvas):
+        icons_count = screen_canvas.width() // self.icon_pitch
         if icons_count % 2 == 0:
             icons_count += 1
         else:
             icons_count += 2
         # icons_count must be an odd integer
-        icons_half_count = icons_count // 2
+        self.carousel_half_count = icons_count // 2
+        # one extra slot on the left scrolls in during the animation
+        self.carousel_slot_count = icons_count + 1
+        self.carousel_slot_seqs = [None] * self.carousel_slot_count
+        self.carousel_strip = image.Image(
+            size=(self.carousel_slot_count * self.icon_pitch, self.icon_height))
+        self.carousel_rect = (0, screen_canvas.height() // 2 - self.icon_height // 2,
+                              screen_canvas.width(), self.icon_height)
+
+    def update_carousel_strip(self, first_seq):
+        """render only the tiles that are not in the ring yet, a cursor
+        move by one position renders exactly one tile"""
+        strip = self.carousel_strip
+        for seq in range(first_seq, first_seq + self.carousel_slot_count):
+            slot = seq % self.carousel_slot_count
+            if self.carousel_slot_seqs[slot] == seq:
+                continue
+            slot_left = slot * self.icon_pitch
+            strip.draw_rectangle(slot_left, 0, self.icon_pitch, self.icon_height,
+                                 color=(0, 0, 0), fill=True)
+            icon_path = self.app_list[seq % self.app_count]["icon"]
+            self.draw_icon(strip, icon_path, slot_left + self.icon_pitch // 2,
+                           self.icon_height // 2, "center", "center")
+            self.carousel_slot_seqs[slot] = seq
+
+    def draw_carousel(self, screen_canvas):
+        if self.carousel_strip is None:
+            self.init_carousel(screen_canvas)
         animation_offset = 0
         # handle animation
         if len(self.pending_animation_values) > 0:
             anim_index = self.pending_animation_values.pop()
             animation_offset = int(
-                (icon_width + icon_padding * 2) * anim_index / self.animation_count)
+                (self.icon_width + self.icon_padding * 2) * anim_index / self.animation_count)
+            self.animation_frames += 1
             # invalidate when need animation
-            self.invalidate_drawing()
-        for i in range(-icons_half_count, icons_half_count + 1):
-            icon_center_x = screen_canvas.width() // 2 + i * (icon_width + icon_padding)
-            icon_center_y = screen_canvas.height() // 2 + icon_margin_top
-            icon_center_x += animation_offset
-            index = (self.cursor_index + i) % self.app_count
-            self.draw_icon(screen_canvas, self.app_list[index]["icon"],
-                           icon_center_x, icon_center_y, "center", "center")
+            self.invalidate_rect(*self.carousel_rect)
+        # leftmost tile of the window, only these slots are ever rendered
+        first_seq = self.carousel_seq - self.carousel_half_count - 1
+        self.update_carousel_strip(first_seq)
+        first_slot = first_seq % self.carousel_slot_count
+        # the window is the ring rotated by first_slot, this blit puts the
+        # tiles first_slot.. in place and leaves the others off-screen left
+        window_left = (screen_canvas.width() // 2 - self.icon_pitch // 2 + animation_offset -
+                       (self.carousel_half_count + 1) * self.icon_pitch)
+        top = self.carousel_rect[1]
+        screen_canvas.draw_image(self.carousel_strip,
+                                 window_left - first_slot * self.icon_pitch, top)
+        if first_slot > 0:
+            # wrapped part of the ring, its other tiles land off-screen right
+            screen_canvas.draw_image(self.carousel_strip, window_left +
+                                     (self.carousel_slot_count - first_slot) * self.icon_pitch, top)
+
+    def record_animation_time(self):
+        if self.animation_start_us is None or len(self.pending_animation_values) > 0:
+            return
+        self.last_animation_us = time.ticks_diff(
+            time.ticks_us(), self.animation_start_us)
+        self.animation_start_us = None
+        if log.debug_on:
+            log.debug("carousel animation: %d frames in %d us, %.1f fps" %
+                      (self.animation_frames, self.last_animation_us,
+                       self.animation_frames * 1000000 / max(self.last_animation_us, 1)))
+
+    def on_draw(self):
+        if self.screen_canvas is None:
+            # allocated once and kept, partial redraws push regions of it
+            self.screen_canvas = image.Image()
+        screen_canvas = self.screen_canvas
+        screen_canvas.draw_rectangle(0, 0, screen_canvas.width(), screen_canvas.height(),
+                                     color=(0, 0, 0), fill=True)
+        self.draw_carousel(screen_canvas)
         # draw center small arrow icon below
         self.draw_icon(screen_canvas, self.arrow_icon_path, screen_canvas.width() // 2,
-                       screen_canvas.height() // 2 + icon_height // 2 + icon_padding + icon_margin_top, "center", "top")
-        print("draw arrow ok")
-        battery_percent = battery_level * 100.0
-        battery_icon = self.find_battery_icon(battery_percent, usb_plugged)
-        print("before draw battery")
+                       screen_canvas.height() // 2 + self.icon_height // 2 + self.icon_padding,
+                       "center", "top")
+        self.draw_status_bar(screen_canvas)
+        lcd.display(screen_canvas)
+        self.record_animation_time()
+
+    def on_draw_rects(self, rects):
+        if self.screen_canvas is None:
+            self.on_draw()
+            return
+        status_bar_rect = (0, 0, self.screen_canvas.width(),
+                           self.status_bar_height)
+        battery_field_rect = self.battery_field_rect()
+        draw_battery_field = False
+        draw_status_bar = False
+        draw_carousel = False
+        for rect in rects:
+            if rect_contains(battery_field_rect, rect):
+                draw_battery_field = True
+            elif rect_contains(status_bar_rect, rect):
+                draw_status_bar = True
+            elif self.carousel_rect is not None and rect_contains(self.carousel_rect, rect):
+                draw_carousel = True
+            else:
+                # only the status bar and the icon row support partial redraw
+                self.on_draw()
+                return
+        if draw_carousel:
+            self.draw_carousel(self.screen_canvas)
+            lcd.display(self.screen_canvas, roi=self.carousel_rect,
+                        oft=(self.carousel_rect[0], self.carousel_rect[1]))
+        if draw_status_bar:
+            self.draw_status_bar(self.screen_canvas)
+            lcd.display(self.screen_canvas, roi=status_bar_rect, oft=(0, 0))
+        elif draw_battery_field:
+            self.draw_battery_text()
+        self.record_animation_time()
+
+    def draw_status_bar(self, screen_canvas):
+        screen_canvas.draw_rectangle(0, 0, screen_canvas.width(), self.status_bar_height,
+                                     color=(0, 0, 0), fill=True)
+        gauge = self.battery_gauge
+        if gauge.filtered is None:
+            gauge.update_from_pmu(self.get_system().pmu)
+        battery_icon = self.find_battery_icon(gauge.percent, gauge.is_charging)
+        self.drawn_battery_icon = battery_icon
         battery_icon_padding = 3
         self.draw_icon(screen_canvas, battery_icon,
                        screen_canvas.width() - battery_icon_padding, battery_icon_padding, "right", "top")
-        print("after draw battery")
-        lcd.display(screen_canvas)
-        del screen_canvas
-        lcd.draw_string(3, 3, "Battery: %.3fV %.1f%%" %
-                        (vbat, battery_percent), lcd.GREEN)
-        print("launcher on_draw end")
+        # the text goes out with the status bar, not pushed again on top
+        self.draw_battery_text(screen_canvas)
+
+    def battery_field_rect(self):
+        field = self.battery_field
+        return (field.x, field.y, field.width * GLYPH_WIDTH, GLYPH_HEIGHT)
+
+    def draw_battery_text(self, canvas=None):
+        """the whole text into canvas when the status bar is repainted,
+        otherwise only the changed cells of the readout are blitted"""
+        if canvas is not None:
+            draw_text(3, 3, self.battery_label, (0, 255, 0), (0, 0, 0), canvas)
+            self.battery_field.reset()
+        mv = self.battery_gauge.millivolts
+        self.battery_field.set("%d.%02dV %d%%" %
+                               (mv // 1000, mv % 1000 // 10, self.battery_gauge.percent), canvas)
 
     def navigate(self, app):
         self.get_system().navigate(app)
-        print("navigate from", self, "to", app)
+        log.info("navigate from", self, "to", app)
 
     def on_home_button_changed(self, state):
         # avoid navigate twice here
         if state == "pressed":
             app_id = self.app_list[self.cursor_index]["id"]
-            if app_id == "camera":
-                self.navigate(CameraApp(self.get_system()))
-            elif app_id == "explorer":
-                self.navigate(ExplorerApp(self.get_system()))
+            registry = self.get_system().app_registry
+            if registry.has_app(app_id):
+                self.navigate(registry.get_app(app_id))
             elif app_id == "reboot":
+                self.get_system().prepare_power_off()
                 machine.reset()
             elif app_id == "power":
+                self.get_system().prepare_power_off()
                 self.get_system().pmu.setEnterSleepMode()
-            elif app_id == "system_info":
-                self.navigate(SystemInfoApp(self.get_system()))
             elif app_id == "brightness":
                 self.change_brightness()
         return True
@@ -137,18 +264,25 @@ class LauncherApp(BaseApp):
         if value > 15:
             value = 7
         self.get_system().pmu.setScreenBrightness(value)
+        # cycling through the levels ends in a single write
         config.save_config("brightness", value)
-        print("set and save brightness value to", value)
+        log.info("set brightness value to", value)
 
     def on_top_button_changed(self, state):
         if state == "pressed":
             self.cursor_index += 1
-            print(self.cursor_index, len(self.app_list))
+            self.carousel_seq += 1
             if self.cursor_index >= self.app_count:
                 self.cursor_index = 0
             self.generate_pending_animations()
-            self.invalidate_drawing()
-            print(self.cursor_index, len(self.app_list))
+            self.animation_start_us = time.ticks_us()
+            self.animation_frames = 0
+            if self.carousel_rect is not None:
+                self.invalidate_rect(*self.carousel_rect)
+            else:
+                self.invalidate_drawing()
+            if log.debug_on:
+                log.debug("cursor", self.cursor_index, "of", self.app_count)
         return True
 
     def generate_pending_animations(self):
@@ -158,59 +292,22 @@ class LauncherApp(BaseApp):
         # handled by launcher app
         # TODO show power options
         self.cursor_index = 0
+        self.carousel_seq = 0
         self.invalidate_drawing()
         return True
 
     def app_periodic_task(self):
         now_ticks_ms = time.ticks_ms()
-        if now_ticks_ms - self.app_periodic_task_last_time > 2000:
+        if time.ticks_diff(now_ticks_ms, self.app_periodic_task_last_time) > 2000:
             self.app_periodic_task_last_time = now_ticks_ms
-            self.invalidate_drawing()
+            gauge = self.battery_gauge
+            if gauge.update_from_pmu(self.get_system().pmu):
+                if self.find_battery_icon(gauge.percent, gauge.is_charging) != self.drawn_battery_icon:
+                    self.invalidate_rect(0, 0, lcd.width(), self.status_bar_height)
+                else:
+                    self.invalidate_rect(*self.battery_field_rect())
 
     def find_battery_icon(self, battery_percent, is_charging):
         icon_list = self.battery_charging_icon_list if is_charging else self.battery_icon_list
-        index = int(battery_percent / 20.0)
+        index = min(battery_percent // 20, len(icon_list) - 1)
         return icon_list[index]
-
-    def calculate_battery_level(self, vbat):
-        levels = [4.13, 4.06, 3.98, 3.92, 3.87,
-                  3.82, 3.79, 3.77, 3.74, 3.68, 3.45, 3.00]
-        level = 1.0
-        if vbat >= levels[0]:
-            level = 1.0
-        elif vbat >= levels[1]:
-            level = 0.9
-            level += 0.1 * (vbat - levels[1]) / (levels[0] - levels[1])
-        elif vbat >= levels[2]:
-            level = 0.8
-            level += 0.1 * (vbat - levels[2]) / (levels[1] - levels[2])
-        elif vbat >= levels[3]:
-            level = 0.7
-            level += 0.1 * (vbat - levels[3]) / (levels[2] - levels[3])
-        elif vbat >= levels[4]:
-            level = 0.6
-            level += 0.1 * (vbat - levels[4]) / (levels[3] - levels[4])
-        elif vbat >= levels[5]:
-            level = 0.5
-            level += 0.1 * (vbat - levels[5]) / (levels[4] - levels[5])
-        elif vbat >= levels[6]:
-            level = 0.4
-            level += 0.1 * (vbat - levels[6]) / (levels[5] - levels[6])
-        elif vbat >= levels[7]:
-            level = 0.3
-            level += 0.1 * (vbat - levels[7]) / (levels[6] - levels[7])
-        elif vbat >= levels[8]:
-            level = 0.2
-            level += 0.1 * (vbat - levels[8]) / (levels[7] - levels[8])
-        elif vbat >= levels[9]:
-            level = 0.1
-            level += 0.1 * (vbat - levels[9]) / (levels[8] - levels[9])
-        elif vbat >= levels[10]:
-            level = 0.05
-            level += 0.05 * (vbat - levels[10]) / (levels[9] - levels[10])
-        elif vbat >= levels[11]:
-            level = 0.0
-            level += 0.05 * (vbat - levels[11]) / (levels[10] - levels[11])
-        else:
-            level = 0.0
-        return level
@@ -0,0 +1,126 @@
+import os
+import lcd_meter as lcd
+import time
+from framework import BaseApp
+import config
+import logger
+from wav_recorder import WavRecorder
+
+from Maix import I2S
+from board import board_info
+from fpioa_manager import fm
+
+log = logger.get_logger("microphone")
+
+sample_rates = (16000, 44100)
+
+
+def next_recording_path():
+    for i in range(10000):
+        path = "/sd/REC%04d.wav" % i
+        try:
+            os.stat(path)
+        except OSError:
+            return path
+    return "/sd/REC9999.wav"
+
+
+class MicrophoneApp(BaseApp):
+    def __init__(self, system):
+        super(MicrophoneApp, self).__init__(system)
+        self.sample_rate = config.get_config_by_key("mic_sample_rate") or sample_rates[0]
+        # samples fetched from the I2S DMA per step
+        self.chunk_points = 1024
+        # a block of the recorder fills in 256ms at 16kHz, 93ms at 44.1kHz
+        self.write_interval_ms = 20
+        self.rx = None
+        self.recorder = None
+        self.start_ticks = 0
+        self.status = "HOME: record  TOP: rate"
+        self.__initialized = False
+
+    def __lazy_init(self):
+        # the speaker owns I2S0, the microphone is routed to I2S2
+        fm.register(board_info.MIC_LRCLK, fm.fpioa.I2S2_WS)
+        fm.register(board_info.MIC_DAT, fm.fpioa.I2S2_IN_D0)
+        fm.register(board_info.MIC_CLK, fm.fpioa.I2S2_SCLK)
+        self.rx = I2S(I2S.DEVICE_2)
+        self.rx.channel_config(self.rx.CHANNEL_0, I2S.RECEIVER,
+                               align_mode=I2S.STANDARD_MODE)
+        self.__initialized = True
+
+    def start_recording(self):
+        self.rx.set_sample_rate(self.sample_rate)
+        self.recorder = WavRecorder(next_recording_path(), self.sample_rate)
+        self.start_ticks = time.ticks_ms()
+        self.start_task("microphone", self.record_step)
+        # the SD writes run between capture steps, the I2S DMA keeps
+        # capturing while a block is written
+        self.start_task("microphone_write", self.write_step, self.write_interval_ms)
+
+    def stop_recording(self):
+        recorder = self.recorder
+        self.recorder = None
+        samples = recorder.stop()
+        self.status = "%d samples, %d overruns" % (samples, recorder.overruns)
+        log.info("recording stopped:", self.status, "captured:", recorder.samples_in(),
+                 "max write:", recorder.max_write_us, "us")
+
+    def record_step(self):
+        recorder = self.recorder
+        if recorder is None:
+            return None
+        audio = self.rx.record(self.chunk_points)
+        recorder.feed(audio.to_bytes())
+        return 0
+
+    def write_step(self):
+        recorder = self.recorder
+        if recorder is None:
+            return None
+        recorder.service()
+        return 0
+
+    def on_home_button_changed(self, state):
+        if state == "pressed":
+            if self.recorder is None:
+                self.start_recording()
+            else:
+                self.stop_recording()
+            self.invalidate_drawing()
+        return True
+
+    def on_top_button_changed(self, state):
+        if state == "pressed" and self.recorder is None:
+            index = (sample_rates.index(self.sample_rate) + 1) % len(sample_rates) \
+                if self.sample_rate in sample_rates else 0
+            self.sample_rate = sample_rates[index]
+            self.invalidate_drawing()
+        return True
+
+    def on_pause(self):
+        if self.recorder is not None:
+            self.stop_recording()
+
+    def on_destroy(self):
+        self.rx = None
+        self.__initialized = False
+
+    def app_periodic_task(self):
+        if self.recorder is not None:
+            self.invalidate_drawing()
+
+    def on_draw(self):
+        if not self.__initialized:
+            self.__lazy_init()
+        lcd.clear()
+        lcd.draw_string(3, 3, "Microphone %dHz" % self.sample_rate, lcd.WHITE, lcd.BLUE)
+        recorder = self.recorder
+        if recorder is not None:
+            seconds = time.ticks_diff(time.ticks_ms(), self.start_ticks) // 1000
+            lcd.draw_string(3, 3 + 18, "REC %d:%02d" % (seconds // 60, seconds % 60),
+                            lcd.RED, lcd.BLACK)
+            lcd.draw_string(3, 3 + 36, "%d samples, %d overruns" %
+                            (recorder.samples_in(), recorder.overruns), lcd.WHITE, lcd.BLACK)
+        else:
+            lcd.draw_string(3, 3 + 18, self.status, lcd.WHITE, lcd.BLACK)
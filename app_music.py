@@ -0,0 +1,134 @@
+import os
+import lcd_meter as lcd
+from framework import BaseApp
+import config
+import logger
+from wav_player import WavPlayer
+
+import audio
+from Maix import I2S
+
+log = logger.get_logger("music")
+
+music_dir = "/sd"
+
+
+def list_wav_files(path):
+    names = []
+    try:
+        for entry in os.ilistdir(path):
+            name = entry[0]
+            if name.lower().endswith(".wav"):
+                names.append(name)
+    except AttributeError:
+        for name in os.listdir(path):
+            if name.lower().endswith(".wav"):
+                names.append(name)
+    names.sort()
+    return names
+
+
+class MusicPlayerApp(BaseApp):
+    # the status line repaint only formats a short string
+    alloc_budget = 2 * 1024
+
+    def __init__(self, system):
+        super(MusicPlayerApp, self).__init__(system)
+        self.file_names = []
+        self.selected_index = 0
+        self.i2s = None
+        self.__initialized = False
+
+    def __lazy_init(self):
+        self.file_names = list_wav_files(music_dir)
+        self.__initialized = True
+
+    def get_player(self):
+        return self.get_system().music_player
+
+    def play_chunk(self, samples, count):
+        self.i2s.play(audio.Audio(array=memoryview(samples)[:count]))
+
+    def start_playback(self, name):
+        system = self.get_system()
+        self.stop_playback()
+        system.init_speaker()
+        if self.i2s is None:
+            self.i2s = I2S(I2S.DEVICE_0)
+            self.i2s.channel_config(self.i2s.CHANNEL_1, I2S.TRANSMITTER,
+                                    resolution=I2S.RESOLUTION_16_BIT,
+                                    align_mode=I2S.STANDARD_MODE)
+        # full volume unless configured, the gain loop only runs below 100
+        volume = config.get_config_by_key("volume")
+        player = WavPlayer(music_dir + "/" + name, self.play_chunk,
+                           volume=volume if volume is not None else 100)
+        self.i2s.set_sample_rate(player.sample_rate)
+        player.prefill()
+        system.music_player = player
+        # owned by the system, playback goes on after leaving this app
+        system.add_app_task(system, "music", player.service)
+
+    def stop_playback(self):
+        player = self.get_player()
+        if player is not None:
+            player.stop()
+            log.info("music player stats:", player.stats())
+            self.get_system().music_player = None
+
+    def on_home_button_changed(self, state):
+        if state == "pressed" and len(self.file_names) > 0:
+            player = self.get_player()
+            if player is not None and not player.finished:
+                self.stop_playback()
+            else:
+                self.start_playback(self.file_names[self.selected_index])
+            self.invalidate_drawing()
+        return True
+
+    def on_top_button_changed(self, state):
+        if state == "pressed" and len(self.file_names) > 0:
+            self.selected_index = (self.selected_index + 1) % len(self.file_names)
+            self.invalidate_drawing()
+        return True
+
+    def app_periodic_task(self):
+        if self.get_player() is not None:
+            self.invalidate_rect(0, lcd.height() - 18, lcd.width(), 18)
+
+    def on_draw_rects(self, rects):
+        self.draw_status()
+
+    def draw_status(self):
+        player = self.get_player()
+        if player is None:
+            status = "HOME: play  TOP: next"
+        elif player.finished:
+            status = "finished, underruns %d" % player.underruns
+        else:
+            status = "%d%% underruns %d %dus/buf" % (
+                player.progress_percent(), player.underruns,
+                player.total_chunk_us // max(player.chunks_played, 1))
+        lcd.fill_rectangle(0, lcd.height() - 18, lcd.width(), 18, lcd.BLACK)
+        lcd.draw_string(3, lcd.height() - 17, status, lcd.GREEN, lcd.BLACK)
+
+    def on_destroy(self):
+        # a playing WavPlayer keeps its own reference to play_chunk
+        self.file_names = []
+        self.__initialized = False
+
+    def on_draw(self):
+        if not self.__initialized:
+            self.__lazy_init()
+        lcd.clear()
+        if len(self.file_names) == 0:
+            lcd.draw_string(3, 3, "No .wav files in " + music_dir, lcd.WHITE, lcd.RED)
+            return
+        y = 3
+        # keep the selected file on the first screen
+        first = max(0, self.selected_index - 5)
+        for i in range(first, min(first + 6, len(self.file_names))):
+            prefix = "->" if i == self.selected_index else "  "
+            lcd.draw_string(3, y, prefix + " " + self.file_names[i], lcd.WHITE,
+                            lcd.BLUE if i == self.selected_index else lcd.BLACK)
+            y += 18
+        self.draw_status()
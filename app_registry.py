@@ -0,0 +1,81 @@
+import gc
+import time
+
+import config
+import logger
+
+log = logger.get_logger("registry")
+
+# app id of resource.app_list -> (module, class), imported on first launch
+app_modules = {
+    "camera": ("app_camera", "CameraApp"),
+    "explorer": ("app_explorer", "ExplorerApp"),
+    "system_info": ("app_system_info", "SystemInfoApp"),
+    "video": ("app_video", "VideoRecorderApp"),
+    "microphone": ("app_microphone", "MicrophoneApp"),
+    "music": ("app_music", "MusicPlayerApp"),
+}
+default_max_resident = 2
+
+
+class AppRegistry:
+    """creates the apps of the launcher on demand and keeps the most
+    recently used ones resident, older ones get on_destroy() and are
+    dropped so their buffers can be collected"""
+
+    def __init__(self, system, max_resident=None):
+        self.system = system
+        if max_resident is None:
+            max_resident = config.get_config_by_key("max_resident_apps") or default_max_resident
+        self.max_resident = max_resident
+        # app id -> class, filled by the first launch
+        self.classes = {}
+        # [app id, instance], least recently used first
+        self.resident = []
+        # app id -> (import ms, heap bytes) of the module import
+        self.import_costs = {}
+
+    def has_app(self, app_id):
+        return app_id in app_modules
+
+    def load_class(self, app_id):
+        app_class = self.classes.get(app_id)
+        if app_class is not None:
+            return app_class
+        module_name, class_name = app_modules[app_id]
+        start_ms = time.ticks_ms()
+        start_alloc = gc.mem_alloc()
+        module = __import__(module_name)
+        app_class = getattr(module, class_name)
+        cost = (time.ticks_diff(time.ticks_ms(), start_ms), gc.mem_alloc() - start_alloc)
+        self.import_costs[app_id] = cost
+        log.info("imported %s in %dms, %d bytes" % (module_name, cost[0], cost[1]))
+        self.classes[app_id] = app_class
+        return app_class
+
+    def get_app(self, app_id):
+        """the resident instance of app_id, or a new one"""
+        for i in range(len(self.resident)):
+            entry = self.resident[i]
+            if entry[0] == app_id:
+                self.resident.append(self.resident.pop(i))
+                return entry[1]
+        app = self.load_class(app_id)(self.system)
+        app.on_create()
+        self.resident.append([app_id, app])
+        self.trim()
+        return app
+
+    def trim(self):
+        """destroy the least recently used apps that are not on the stack,
+        the most recently used one is about to be shown and always stays"""
+        i = 0
+        while len(self.resident) > self.max_resident and i < len(self.resident) - 1:
+            app_id, app = self.resident[i]
+            if app in self.system.app_stack:
+                i += 1
+                continue
+            self.resident.pop(i)
+            app.on_destroy()
+            log.info("destroyed", app_id)
+
@@ -1,9 +1,14 @@
 from framework import BaseApp
 import os
-import lcd
+import lcd_meter as lcd
 import machine
 import ubinascii
 
+from text_cache import draw_text
+import logger
+
+log = logger.get_logger("system_info")
+
 
 def sizeof_fmt(num, suffix='B'):
     for unit in ['', 'K', 'M', 'G', 'T', 'P', 'E', 'Z']:
@@ -14,6 +19,8 @@ def sizeof_fmt(num, suffix='B'):
 
 
 class SystemInfoApp(BaseApp):
+    alloc_budget = 2 * 1024
+
     def __init__(self, system):
         super(SystemInfoApp, self).__init__(system)
         self.__initialized = False
@@ -36,7 +43,7 @@ class SystemInfoApp(BaseApp):
                 sizeof_fmt(bs2 * free_blocks)
             )
             self.fs_info_list.append(info)
-            print(info)
+            log.debug(info)
         self.__initialized = True
 
     def on_top_button_changed(self, state):
@@ -46,13 +53,10 @@ class SystemInfoApp(BaseApp):
         if not self.__initialized:
             self.__lazy_init()
         lcd.clear()
+        # the lines never change, later visits blit the cached bitmaps
+        lines = [self.system_uname.machine, self.system_uname.version,
+                 self.device_id] + self.fs_info_list
         y = 3
-        lcd.draw_string(3, 3, self.system_uname.machine, lcd.WHITE, lcd.BLUE)
-        y += 16
-        lcd.draw_string(3, y, self.system_uname.version,
-                        lcd.WHITE, lcd.BLUE)
-        y += 16
-        lcd.draw_string(3, y, self.device_id, lcd.WHITE, lcd.BLUE)
-        for info in self.fs_info_list:
+        for line in lines:
+            draw_text(3, y, line, (255, 255, 255), (0, 0, 255))
             y += 16
-            lcd.draw_string(3, y, info, lcd.WHITE, lcd.BLUE)
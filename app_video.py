@@ -0,0 +1,95 @@
+import os
+import lcd_meter as lcd
+from framework import BaseApp
+import config
+import logger
+import image_cache
+import text_cache
+from avi_writer import AviWriter
+from camera_pipeline import init_sensor
+
+import sensor
+
+log = logger.get_logger("video")
+
+
+def next_video_path():
+    for i in range(10000):
+        path = "/sd/VID%04d.avi" % i
+        try:
+            os.stat(path)
+        except OSError:
+            return path
+    return "/sd/VID9999.avi"
+
+
+def sd_cluster_size():
+    try:
+        return os.statvfs("/sd")[0]
+    except Exception:
+        return 32768
+
+
+class VideoRecorderApp(BaseApp):
+    def __init__(self, system):
+        super(VideoRecorderApp, self).__init__(system)
+        self.writer = None
+        self.jpeg_quality = config.get_config_by_key("video_jpeg_quality") or 50
+        self.last_stats = None
+        self.__initialized = False
+
+    def __lazy_init(self):
+        image_cache.release_memory()
+        text_cache.release_memory()
+        init_sensor(sensor, lcd)
+        self.__initialized = True
+
+    def start_recording(self):
+        self.writer = AviWriter(next_video_path(), sensor.width(), sensor.height(),
+                                cluster_size=sd_cluster_size())
+        log.info("video recording started")
+
+    def stop_recording(self):
+        writer = self.writer
+        self.writer = None
+        writer.close()
+        self.last_stats = writer.stats()
+        log.info("video recording stopped:", self.last_stats)
+
+    def on_home_button_changed(self, state):
+        if state == "pressed":
+            if self.writer is None:
+                self.start_recording()
+            else:
+                self.stop_recording()
+        return True
+
+    def on_pause(self):
+        if self.writer is not None:
+            self.stop_recording()
+        if self.__initialized:
+            sensor.run(0)
+            self.__initialized = False
+
+    def on_draw(self):
+        if not self.__initialized:
+            self.__lazy_init()
+            self.start_task("video", self.video_step)
+
+    def video_step(self):
+        img = sensor.snapshot()
+        writer = self.writer
+        lcd.display(img)
+        # status goes to the lcd only, not into the recorded frame
+        if writer is not None:
+            lcd.draw_string(4, 4, "REC %d drop %d" % (writer.frames, writer.dropped),
+                            lcd.RED, lcd.BLACK)
+        elif self.last_stats is not None:
+            lcd.draw_string(4, 4, "%.1ffps %dKB/s drop %d" %
+                            (self.last_stats["fps"], self.last_stats["bytes_per_sec"] // 1024,
+                             self.last_stats["dropped"]), lcd.YELLOW, lcd.BLACK)
+        if writer is not None:
+            # compressed in place into the frame buffer, no extra copy
+            jpeg = img.compress(quality=self.jpeg_quality)
+            writer.write(jpeg.bytearray())
+        return 0
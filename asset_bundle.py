@@ -0,0 +1,138 @@
+import struct
+import time
+import image
+
+import config
+import logger
+
+log = logger.get_logger("assets")
+
+# written by tools/build_assets.py from the res/ directory
+default_bundle_path = "/sd/res/assets.bin"
+res_prefix = "/sd/res/"
+BUNDLE_MAGIC = b"ASTB"
+BUNDLE_VERSION = 1
+# magic, version, flags, asset count, names blob size
+HEADER_FORMAT = "<4sBBHI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# data offset, stored size, width, height, encoding, name length, name offset
+ENTRY_FORMAT = "<IIHHBBH"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+
+
+def rle_decode_into(data, buf):
+    """control byte c: bit 7 set repeats the next pixel (c & 0x7f) + 1
+    times, otherwise c + 1 literal pixels follow"""
+    src = 0
+    dst = 0
+    end = len(data)
+    while src < end:
+        c = data[src]
+        src += 1
+        n = (c & 0x7f) + 1
+        if c & 0x80:
+            buf[dst:dst + 2 * n] = data[src:src + 2] * n
+            src += 2
+            dst += 2 * n
+        else:
+            buf[dst:dst + 2 * n] = data[src:src + 2 * n]
+            src += 2 * n
+            dst += 2 * n
+    return dst
+
+
+class AssetBundle:
+    """packed RGB565 images with an offset table, an asset is read with
+    readinto() straight into the buffer of a blank image"""
+
+    def __init__(self, path=default_bundle_path):
+        self.path = path
+        self.file = open(path, "rb")
+        magic, version, _, count, names_size = struct.unpack(
+            HEADER_FORMAT, self.file.read(HEADER_SIZE))
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            self.file.close()
+            raise ValueError("not an asset bundle: " + path)
+        table = self.file.read(count * ENTRY_SIZE)
+        names = self.file.read(names_size)
+        # name relative to res/ -> (offset, size, width, height, encoding)
+        self.entries = {}
+        for i in range(count):
+            offset, size, width, height, encoding, name_len, name_offset = \
+                struct.unpack_from(ENTRY_FORMAT, table, i * ENTRY_SIZE)
+            name = names[name_offset:name_offset + name_len].decode()
+            self.entries[name] = (offset, size, width, height, encoding)
+
+    def name_of(self, path):
+        return path[len(res_prefix):] if path.startswith(res_prefix) else path
+
+    def has(self, path):
+        return self.name_of(path) in self.entries
+
+    def load(self, path):
+        offset, size, width, height, encoding = self.entries[self.name_of(path)]
+        img = image.Image(size=(width, height))
+        buf = img.bytearray()
+        self.file.seek(offset)
+        if encoding == ENCODING_RAW:
+            self.file.readinto(buf)
+        else:
+            rle_decode_into(self.file.read(size), buf)
+        return img
+
+    def close(self):
+        self.file.close()
+
+
+bundle = None
+bundle_checked = False
+
+
+def get_bundle():
+    """the bundle of config "asset_bundle", None when it is absent"""
+    global bundle, bundle_checked
+    if not bundle_checked:
+        bundle_checked = True
+        path = config.get_config_by_key("asset_bundle") or default_bundle_path
+        try:
+            bundle = AssetBundle(path)
+            log.info("asset bundle:", path, len(bundle.entries), "assets")
+        except (OSError, ValueError) as e:
+            log.info("no asset bundle, decoding jpeg:", e)
+    return bundle
+
+
+def load_image(path):
+    """from the bundle when it has the asset, otherwise the JPEG itself"""
+    assets = get_bundle()
+    if assets is not None and assets.has(path):
+        return assets.load(path)
+    return image.Image(path)
+
+
+def report_timing(paths):
+    """log JPEG decode time against bundle load time of every path"""
+    assets = get_bundle()
+    total_decode = 0
+    total_load = 0
+    for path in paths:
+        start = time.ticks_us()
+        try:
+            img = image.Image(path)
+        except Exception as e:
+            log.warn("cannot decode", path, e)
+            continue
+        decode_us = time.ticks_diff(time.ticks_us(), start)
+        del img
+        load_us = -1
+        if assets is not None and assets.has(path):
+            start = time.ticks_us()
+            img = assets.load(path)
+            load_us = time.ticks_diff(time.ticks_us(), start)
+            del img
+            total_load += load_us
+        total_decode += decode_us
+        log.info("asset %s: decode=%dus load=%dus" % (path, decode_us, load_us))
+    log.info("assets: decode total=%dus load total=%dus" % (total_decode, total_load))
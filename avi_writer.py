@@ -0,0 +1,165 @@
+import struct
+import time
+from array import array
+
+# byte offsets of the header fields patched by close(), see header()
+RIFF_SIZE_OFFSET = 4
+AVIH_USEC_PER_FRAME_OFFSET = 32
+AVIH_MAX_BYTES_PER_SEC_OFFSET = 36
+AVIH_TOTAL_FRAMES_OFFSET = 48
+STRH_SCALE_OFFSET = 128
+STRH_LENGTH_OFFSET = 140
+MOVI_SIZE_OFFSET = 216
+# the 'movi' fourcc, idx1 offsets are relative to it
+MOVI_FOURCC_OFFSET = 220
+HEADER_SIZE = 224
+AVIIF_KEYFRAME = 0x10
+
+
+def header(width, height):
+    """RIFF/AVI header up to the first movi chunk, sizes patched at close"""
+    avih = struct.pack("<IIIIIIIIIIIIII", 0, 0, 0, 0x10, 0, 0, 1, 0, width, height,
+                       0, 0, 0, 0)
+    strh = struct.pack("<4s4sIHHIIIIIIIIhhhh", b"vids", b"MJPG", 0, 0, 0, 0,
+                       1, 0, 0, 0, 0, 0xFFFFFFFF, 0, 0, 0, width, height)
+    strf = struct.pack("<IiiHH4sIiiII", 40, width, height, 1, 24, b"MJPG",
+                       width * height * 3, 0, 0, 0, 0)
+    strl = b"strl" + b"strh" + struct.pack("<I", len(strh)) + strh + \
+        b"strf" + struct.pack("<I", len(strf)) + strf
+    hdrl = b"hdrl" + b"avih" + struct.pack("<I", len(avih)) + avih + \
+        b"LIST" + struct.pack("<I", len(strl)) + strl
+    return b"RIFF" + struct.pack("<I", 0) + b"AVI " + \
+        b"LIST" + struct.pack("<I", len(hdrl)) + hdrl + \
+        b"LIST" + struct.pack("<I", 0) + b"movi"
+
+
+class AviWriter:
+    """streams MJPEG frames into an AVI file
+
+    Frames are copied into a ring of cluster sized slots and each write()
+    call flushes at most flush_clusters full clusters, so the file only
+    sees cluster aligned writes and the caller never waits for more than a
+    bounded amount of SD work. When the ring cannot take a frame it is
+    dropped and counted instead of stalling capture. The idx1 index is
+    kept in preallocated arrays and written by close()."""
+
+    def __init__(self, path, width, height, cluster_size=32768, ring_clusters=4,
+                 flush_clusters=1, max_frames=3600):
+        self.f = open(path, "wb")
+        self.cluster_size = cluster_size
+        self.ring = bytearray(cluster_size * ring_clusters)
+        self.ring_mv = memoryview(self.ring)
+        self.flush_clusters = flush_clusters
+        # absolute stream positions, ring index is position % len(ring)
+        self.write_pos = 0
+        self.flush_pos = 0
+        self.index_offsets = array('I', [0] * max_frames)
+        self.index_sizes = array('I', [0] * max_frames)
+        self.max_frames = max_frames
+        self.chunk_header = bytearray(8)
+        self.chunk_header[0:4] = b"00dc"
+        self.frames = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.max_frame_size = 0
+        self.start_ticks = time.ticks_ms()
+        self.copy_in(header(width, height))
+
+    def free_bytes(self):
+        return len(self.ring) - (self.write_pos - self.flush_pos)
+
+    def copy_in(self, data):
+        data = memoryview(data)
+        size = len(data)
+        start = self.write_pos % len(self.ring)
+        first = min(size, len(self.ring) - start)
+        self.ring_mv[start:start + first] = data[:first]
+        if first < size:
+            self.ring_mv[0:size - first] = data[first:]
+        self.write_pos += size
+
+    def write(self, jpeg):
+        """queue one JPEG frame, returns False when it had to be dropped"""
+        size = len(jpeg)
+        padded = size + (size & 1)
+        if self.frames == self.max_frames or self.free_bytes() < 8 + padded:
+            self.dropped += 1
+            self.flush(self.flush_clusters)
+            return False
+        self.index_offsets[self.frames] = self.write_pos - MOVI_FOURCC_OFFSET
+        self.index_sizes[self.frames] = size
+        struct.pack_into("<I", self.chunk_header, 4, size)
+        self.copy_in(self.chunk_header)
+        self.copy_in(jpeg)
+        if padded != size:
+            self.copy_in(b"\0")
+        self.frames += 1
+        if size > self.max_frame_size:
+            self.max_frame_size = size
+        self.flush(self.flush_clusters)
+        return True
+
+    def flush(self, max_clusters=None):
+        """write full clusters, or everything when max_clusters is None"""
+        ring_size = len(self.ring)
+        count = 0
+        while self.write_pos - self.flush_pos >= self.cluster_size:
+            if max_clusters is not None and count == max_clusters:
+                return
+            start = self.flush_pos % ring_size
+            self.f.write(self.ring_mv[start:start + self.cluster_size])
+            self.flush_pos += self.cluster_size
+            self.bytes_written += self.cluster_size
+            count += 1
+        if max_clusters is None and self.write_pos > self.flush_pos:
+            start = self.flush_pos % ring_size
+            size = self.write_pos - self.flush_pos
+            self.f.write(self.ring_mv[start:start + size])
+            self.flush_pos += size
+            self.bytes_written += size
+
+    def elapsed_ms(self):
+        return max(time.ticks_diff(time.ticks_ms(), self.start_ticks), 1)
+
+    def close(self):
+        elapsed_ms = self.elapsed_ms()
+        self.flush()
+        movi_end = self.write_pos
+        entry = bytearray(16)
+        entry[0:4] = b"00dc"
+        batch = bytearray(16 * 32)
+        self.f.write(b"idx1" + struct.pack("<I", 16 * self.frames))
+        batched = 0
+        for i in range(self.frames):
+            struct.pack_into("<4sIII", batch, batched * 16, b"00dc", AVIIF_KEYFRAME,
+                             self.index_offsets[i], self.index_sizes[i])
+            batched += 1
+            if batched == 32:
+                self.f.write(batch)
+                batched = 0
+        if batched:
+            self.f.write(memoryview(batch)[:batched * 16])
+        file_size = movi_end + 8 + 16 * self.frames
+        usec_per_frame = elapsed_ms * 1000 // max(self.frames, 1)
+        self.patch(RIFF_SIZE_OFFSET, file_size - 8)
+        self.patch(MOVI_SIZE_OFFSET, movi_end - MOVI_SIZE_OFFSET - 4)
+        self.patch(AVIH_USEC_PER_FRAME_OFFSET, usec_per_frame)
+        self.patch(AVIH_MAX_BYTES_PER_SEC_OFFSET, self.bytes_written * 1000 // elapsed_ms)
+        self.patch(AVIH_TOTAL_FRAMES_OFFSET, self.frames)
+        # strh rate / scale is the frame rate
+        self.patch(STRH_SCALE_OFFSET, usec_per_frame)
+        self.patch(STRH_SCALE_OFFSET + 4, 1000000)
+        self.patch(STRH_LENGTH_OFFSET, self.frames)
+        self.f.close()
+        self.bytes_written = file_size
+
+    def patch(self, offset, value):
+        self.f.seek(offset)
+        self.f.write(struct.pack("<I", value))
+
+    def stats(self):
+        elapsed_ms = self.elapsed_ms()
+        return {"frames": self.frames, "dropped": self.dropped,
+                "fps": self.frames * 1000 / elapsed_ms,
+                "bytes_per_sec": self.bytes_written * 1000 // elapsed_ms,
+                "max_frame_size": self.max_frame_size}
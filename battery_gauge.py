@@ -0,0 +1,110 @@
+# (millivolts, percent) discharge curve, highest voltage first
+default_curve = (
+    (4130, 100), (4060, 90), (3980, 80), (3920, 70), (3870, 60), (3820, 50),
+    (3790, 40), (3770, 30), (3740, 20), (3680, 10), (3450, 5), (3000, 0),
+)
+
+# AXP192-DS PG26 battery voltage ADC is 1.1mV/div
+MV_PER_COUNT_X10 = 11
+# one LUT entry per 4 ADC counts (4.4mV)
+LUT_SHIFT = 2
+# fractional bits of the filtered ADC count
+FILTER_BITS = 4
+
+
+def millivolts_to_count(mv):
+    return mv * 10 // MV_PER_COUNT_X10
+
+
+def count_to_millivolts(count):
+    return count * MV_PER_COUNT_X10 // 10
+
+
+def build_lut(curve):
+    """bytearray mapping (count - min_count) >> LUT_SHIFT to percent"""
+    min_count = millivolts_to_count(curve[-1][0])
+    max_count = millivolts_to_count(curve[0][0])
+    size = ((max_count - min_count) >> LUT_SHIFT) + 1
+    lut = bytearray(size)
+    for i in range(size):
+        mv = count_to_millivolts(min_count + (i << LUT_SHIFT))
+        percent = 0
+        for j in range(len(curve) - 1):
+            high_mv, high_percent = curve[j]
+            low_mv, low_percent = curve[j + 1]
+            if mv >= low_mv:
+                percent = low_percent + (high_percent - low_percent) * \
+                    (mv - low_mv) // (high_mv - low_mv)
+                break
+        lut[i] = min(percent, 100)
+    return lut, min_count
+
+
+class BatteryGauge:
+    """float free battery level: raw ADC counts go through an integer EMA
+    and a percent LUT, the shown values only move past a hysteresis band
+    so the UI redraws when the level really changed.
+
+    With capacity_mah set, coulomb counter deltas move the level between
+    voltage readings and the voltage estimate only resyncs it when the two
+    drift more than resync_percent apart."""
+
+    def __init__(self, curve=default_curve, ema_shift=3, hysteresis_percent=2,
+                 hysteresis_mv=10, capacity_mah=None, resync_percent=10):
+        self.lut, self.min_count = build_lut(curve)
+        self.ema_shift = ema_shift
+        self.hysteresis_percent = hysteresis_percent
+        self.hysteresis_mv = hysteresis_mv
+        self.capacity_mah = capacity_mah
+        self.resync_percent = resync_percent
+        self.filtered = None
+        self.percent = 0
+        self.millivolts = 0
+        self.is_charging = False
+        self.sync_percent = 0
+        self.sync_coulomb = 0
+
+    def count_to_percent(self, count):
+        index = (count - self.min_count) >> LUT_SHIFT
+        if index < 0:
+            return 0
+        if index >= len(self.lut):
+            return 100
+        return self.lut[index]
+
+    def update(self, raw_count, is_charging=False, coulomb_net=None):
+        """feed one raw vbat count, returns True when a shown value changed"""
+        if self.filtered is None:
+            self.filtered = raw_count << FILTER_BITS
+        else:
+            self.filtered += ((raw_count << FILTER_BITS) - self.filtered) >> self.ema_shift
+        count = self.filtered >> FILTER_BITS
+        estimate = self.count_to_percent(count)
+        if coulomb_net is not None and self.capacity_mah:
+            # AXP192 coulomb counter: 65536 * 0.5 / 3600 / 25 mAh per count
+            fused = self.sync_percent + (coulomb_net - self.sync_coulomb) * 3276800 // \
+                (90000 * self.capacity_mah)
+            if abs(fused - estimate) > self.resync_percent:
+                self.sync_percent = estimate
+                self.sync_coulomb = coulomb_net
+            else:
+                estimate = max(0, min(100, fused))
+        changed = is_charging != self.is_charging
+        self.is_charging = is_charging
+        first = self.millivolts == 0
+        if first or abs(estimate - self.percent) >= self.hysteresis_percent or \
+                (estimate == 100 and self.percent != 100) or (estimate == 0 and self.percent != 0):
+            changed = changed or estimate != self.percent
+            self.percent = estimate
+        mv = count_to_millivolts(count)
+        if first or abs(mv - self.millivolts) >= self.hysteresis_mv:
+            changed = True
+            self.millivolts = mv
+        return changed
+
+    def update_from_pmu(self, axp):
+        coulomb_net = None
+        if self.capacity_mah:
+            charge, discharge = axp.get_coulomb_raw()
+            coulomb_net = charge - discharge
+        return self.update(axp.get_adc_raw(0x78), axp.is_usb_plugged_in(), coulomb_net)
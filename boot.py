@@ -1,6 +1,3 @@
-# import gc
-# gc.disable()
-
 from m5stickv_system import M5StickVSystem
 
 '''This program suppports MaixPy firmware'''
@@ -0,0 +1,155 @@
+import time
+
+import config
+import logger
+from object_tracker import ObjectTracker
+
+log = logger.get_logger("camera")
+
+
+def reset_sensor(sensor):
+    """reset with DVP double buffering, the DVP fills one frame buffer
+    while snapshot() hands out the other. firmware without dual_buff gets
+    a plain reset and capture does not overlap the rest of the frame"""
+    try:
+        sensor.reset(dual_buff=True)
+    except TypeError:
+        sensor.reset()
+
+
+def init_sensor(sensor, lcd):
+    err_counter = 0
+    while 1:
+        try:
+            reset_sensor(sensor)  # Reset sensor may failed, let's try sometimes
+            break
+        except Exception:
+            err_counter = err_counter + 1
+            if err_counter == 20:
+                lcd.draw_string(lcd.width() // 2 - 100, lcd.height() // 2 - 4,
+                                "Error: Sensor Init Failed", lcd.WHITE, lcd.RED)
+            time.sleep_ms(100)
+    sensor.set_pixformat(sensor.RGB565)
+    sensor.set_framesize(sensor.QVGA)  # QVGA=320x240
+    sensor.run(1)
+
+
+class CameraPipeline:
+    """one camera frame per step(): capture, KPU detection, overlay and
+    display, paced to target_fps
+
+    init_sensor() resets the sensor with dual_buff=True, the DVP then
+    captures the next frame into its second buffer while this frame is
+    detected and displayed, snapshot() just picks up the finished one. The modules are
+    passed in so the host can drive it with a stand-in sensor/KPU that
+    yields synthetic frames."""
+
+    def __init__(self, sensor, kpu, lcd, target_fps=None):
+        self.sensor = sensor
+        self.kpu = kpu
+        self.lcd = lcd
+        if target_fps is None:
+            target_fps = config.get_config_by_key("camera_target_fps") or 30
+        self.frame_interval_us = 1000000 // target_fps
+        self.task = None
+        self.show_overlay = False
+        detect_interval = config.get_config_by_key("camera_detect_interval")
+        self.tracker = ObjectTracker(detect_interval or 3)
+        # optional path that gets one line of detections per KPU run, the
+        # input of tools/bench_tracker.py, record with camera_detect_interval 1
+        self.record_path = config.get_config_by_key("camera_record_boxes")
+        self.record_file = None
+        self.last_frame_start = None
+        # stage timings of the last frame and their totals, microseconds
+        self.capture_us = 0
+        self.inference_us = 0
+        self.display_us = 0
+        self.total_capture_us = 0
+        self.total_inference_us = 0
+        self.total_display_us = 0
+        self.frames = 0
+        # frames counted in the current one second window and the last fps
+        self.fps_window_start = None
+        self.fps_window_frames = 0
+        self.fps = 0
+
+    def start(self, model_address=0x300000):
+        init_sensor(self.sensor, self.lcd)
+        self.task = self.kpu.load(model_address)  # Load Model File from Flash
+        # Anchor data is for bbox, extracted from the training sets.
+        anchor = (1.889, 2.5245, 2.9465, 3.94056, 3.99987,
+                  5.3658, 5.155437, 6.92275, 6.718375, 9.01025)
+        self.kpu.init_yolo2(self.task, 0.5, 0.3, 5, anchor)
+
+    def stop(self):
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+        if self.task is not None:
+            self.kpu.deinit(self.task)
+            self.task = None
+        self.sensor.run(0)
+
+    def detect(self, img):
+        objects = self.kpu.run_yolo2(self.task, img)
+        detections = []
+        if objects:
+            for obj in objects:
+                x, y, w, h = obj.rect()
+                detections.append((x, y, w, h, obj.value()))
+        if self.record_path:
+            self.record(detections)
+        return detections
+
+    def record(self, detections):
+        if self.record_file is None:
+            self.record_file = open(self.record_path, "a")
+        self.record_file.write(repr([list(d) for d in detections]) + "\n")
+
+    def step(self):
+        """process one frame, returns the delay in ms until the next one"""
+        frame_start = time.ticks_us()
+        img = self.sensor.snapshot()
+        t1 = time.ticks_us()
+        # the KPU only runs every few frames, tracked boxes move in between
+        tracks = self.tracker.step(self.detect, img)
+        for track in tracks:
+            img.draw_rectangle(track.rect())
+        t2 = time.ticks_us()
+        if self.show_overlay:
+            self.draw_overlay(img)
+        self.lcd.display(img)
+        t3 = time.ticks_us()
+        self.capture_us = time.ticks_diff(t1, frame_start)
+        self.inference_us = time.ticks_diff(t2, t1)
+        self.display_us = time.ticks_diff(t3, t2)
+        self.total_capture_us += self.capture_us
+        self.total_inference_us += self.inference_us
+        self.total_display_us += self.display_us
+        self.frames += 1
+        self.count_fps(t3)
+        elapsed = time.ticks_diff(t3, frame_start)
+        return max(self.frame_interval_us - elapsed, 0) // 1000
+
+    def count_fps(self, now):
+        if self.fps_window_start is None:
+            self.fps_window_start = now
+        self.fps_window_frames += 1
+        window = time.ticks_diff(now, self.fps_window_start)
+        if window >= 1000000:
+            self.fps = self.fps_window_frames * 1000000 // window
+            self.fps_window_start = now
+            self.fps_window_frames = 0
+
+    def draw_overlay(self, img):
+        img.draw_string(2, 2, "%dfps cap %d inf %d disp %dms" %
+                        (self.fps, self.capture_us // 1000, self.inference_us // 1000,
+                         self.display_us // 1000), color=(255, 255, 0))
+
+    def report(self):
+        frames = max(self.frames, 1)
+        if log.info_on:
+            log.info("camera: frames=%d fps=%d avg capture=%dus inference=%dus display=%dus kpu_runs=%d saved=%d" %
+                     (self.frames, self.fps, self.total_capture_us // frames,
+                      self.total_inference_us // frames, self.total_display_us // frames,
+                      self.tracker.detections_run, self.tracker.detections_saved()))
@@ -1,45 +1,132 @@
 import ujson
+import os
 import sys
+import time
 
+# saves write config_path + ".tmp" and rename it over config_path, the
+# previous file is kept as config_path + ".bak"
 config_path = "/sd/config.json"
 
 normal_brightness = 8
+# changes are written once no other change came in for this long
+flush_delay_ms = 2000
 
 config_cache = None
+dirty_keys = set()
+last_change_ms = 0
+write_count = 0
+coalesced_count = 0
+total_write_us = 0
+max_write_us = 0
+
+
+def load_file(path):
+    f = open(path, "rb")
+    try:
+        conf = ujson.load(f)
+    finally:
+        f.close()
+    if type(conf) is not dict:
+        raise ValueError("config is not a dict")
+    return conf
 
 
 def get_config():
+    """parsed once, every later lookup is served from config_cache"""
     global config_cache
     if config_cache is None:
-        conf = {}
-        try:
-            f = open(config_path, "rb")
-            conf = ujson.load(f)
-            f.close()
-        except OSError:
+        conf = None
+        # config_path is only missing when a save lost power between its
+        # renames, the .tmp is complete then and newer than the .bak
+        for path in (config_path, config_path + ".tmp", config_path + ".bak"):
+            try:
+                conf = load_file(path)
+            except OSError:
+                continue
+            except ValueError:
+                print("invalid config file format:", path)
+                continue
+            if path != config_path:
+                print("config restored from", path)
+            break
+        if conf is None:
             print("config file not exist, use default dict")
-        except ValueError:
-            print("invalid config file format, use default dict")
-        if type(conf) is not dict:
             conf = {}
         config_cache = conf
     return config_cache
 
 
 def save_config(key, value):
+    """only marks the key dirty, flush_config() writes the file"""
+    global last_change_ms, coalesced_count
     config = get_config()
+    if key in config and config[key] == value:
+        return
     config[key] = value
-    save_config_to_file(config)
+    if len(dirty_keys) > 0:
+        coalesced_count += 1
+    dirty_keys.add(key)
+    last_change_ms = time.ticks_ms()
+
+
+def is_dirty():
+    return len(dirty_keys) > 0
+
+
+def flush_config(force=False):
+    """write the dirty config once it settled for flush_delay_ms, force
+    writes right away, e.g. before a reset. returns True when written"""
+    if len(dirty_keys) == 0:
+        return False
+    if not force and time.ticks_diff(time.ticks_ms(), last_change_ms) < flush_delay_ms:
+        return False
+    if save_config_to_file(get_config()):
+        dirty_keys.clear()
+        return True
+    return False
+
+
+def remove_if_exists(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 def save_config_to_file(config):
+    """atomic: the new file is complete before it replaces the old one"""
+    global write_count, total_write_us, max_write_us
+    start = time.ticks_us()
+    tmp_path = config_path + ".tmp"
+    bak_path = config_path + ".bak"
     try:
-        f = open(config_path, "wb")
-        ujson.dump(config, f)
-        f.close()
+        f = open(tmp_path, "w")
+        try:
+            ujson.dump(config, f)
+        finally:
+            f.close()
+        remove_if_exists(bak_path)
+        try:
+            os.rename(config_path, bak_path)
+        except OSError:
+            # first save, there is no previous file
+            pass
+        os.rename(tmp_path, config_path)
     except OSError as e:
         sys.print_exception(e)
-    print("save_config_to_file end")
+        return False
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    write_count += 1
+    total_write_us += elapsed
+    if elapsed > max_write_us:
+        max_write_us = elapsed
+    return True
+
+
+def stats():
+    return {"writes": write_count, "coalesced": coalesced_count,
+            "dirty": len(dirty_keys), "avg_write_us": total_write_us // max(write_count, 1),
+            "max_write_us": max_write_us}
 
 
 def get_config_by_key(key):
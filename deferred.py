@@ -0,0 +1,67 @@
+import time
+from array import array
+
+import logger
+
+log = logger.get_logger("deferred")
+
+
+class DeferredQueue:
+    """bounded queue of work posted from IRQ context, micropython.schedule
+    style: post() only records the call, the main loop runs it later
+
+    All slots are allocated up front so post() never allocates."""
+
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.funcs = [None] * capacity
+        self.args = [None] * capacity
+        self.post_ticks = array('i', [0] * capacity)
+        self.head = 0
+        self.count = 0
+        self.max_depth = 0
+        self.dropped = 0
+        self.handled = 0
+        self.total_latency_us = 0
+        self.max_latency_us = 0
+
+    def post(self, func, arg):
+        if self.count == self.capacity:
+            self.dropped += 1
+            return False
+        tail = (self.head + self.count) % self.capacity
+        self.funcs[tail] = func
+        self.args[tail] = arg
+        self.post_ticks[tail] = time.ticks_us()
+        self.count += 1
+        if self.count > self.max_depth:
+            self.max_depth = self.count
+        return True
+
+    def run_pending(self):
+        """run the work posted so far, returns the number of items run"""
+        pending = self.count
+        for _ in range(pending):
+            head = self.head
+            func = self.funcs[head]
+            arg = self.args[head]
+            latency = time.ticks_diff(time.ticks_us(), self.post_ticks[head])
+            self.funcs[head] = None
+            self.args[head] = None
+            self.head = (head + 1) % self.capacity
+            self.count -= 1
+            self.handled += 1
+            self.total_latency_us += latency
+            if latency > self.max_latency_us:
+                self.max_latency_us = latency
+            func(arg)
+        return pending
+
+    def depth(self):
+        return self.count
+
+    def report(self):
+        if log.debug_on:
+            log.debug("depth=%d max_depth=%d dropped=%d handled=%d avg_latency=%dus max_latency=%dus" %
+                      (self.count, self.max_depth, self.dropped, self.handled,
+                       self.total_latency_us // max(self.handled, 1), self.max_latency_us))
@@ -0,0 +1,234 @@
+import os
+import struct
+from array import array
+
+import logger
+from dir_listing import S_IFDIR, is_hidden, join_path
+
+log = logger.get_logger("dir_index")
+
+index_dir = "/sd/.explorer"
+INDEX_MAGIC = b"DIDX"
+INDEX_VERSION = 2
+# magic, version, order item size, path length, entry count, dir mtime,
+# names size, then the directory path: index files are named by a hash
+# of the path, the path tells two colliding directories apart
+HEADER_FORMAT = "<4sBBHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# size, offset in the names blob, type (1 = directory), name length
+RECORD_FORMAT = "<IIBB"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+ORDER_RAW = 0
+ORDER_NAME = 1
+ORDER_SIZE = 2
+order_names = ("raw", "name", "size")
+
+
+def index_path(dir_path):
+    h = 5381
+    for c in dir_path:
+        h = (h * 33 + ord(c)) & 0xFFFFFFFF
+    return "%s/%08x.idx" % (index_dir, h)
+
+
+def ensure_index_dir():
+    try:
+        os.stat(index_dir)
+    except OSError:
+        os.mkdir(index_dir)
+
+
+def dir_signature(path):
+    """(mtime, entry count), cheap to get: no stat per entry. Hidden
+    entries are not counted, like DirListing does not list them"""
+    mtime = os.stat(path)[8]
+    count = 0
+    try:
+        entries = os.ilistdir(path)
+    except AttributeError:
+        entries = os.listdir(path)
+    for entry in entries:
+        if not is_hidden(entry if type(entry) is str else entry[0]):
+            count += 1
+    return mtime, count
+
+
+class DirIndex:
+    """packed listing of one directory, saved on the card next to its
+    sorted orders and reused while the directory mtime and entry count
+    still match. Has the same count/ensure/name/stat interface as
+    DirListing.
+
+    A file written in place changes neither, so the size of a file is
+    stat'ed again the first time its row is shown. When it changed the
+    record is updated and the saved index removed, the size order is
+    rebuilt on the next visit."""
+
+    def __init__(self, path, mtime, records, names, by_name, by_size):
+        self.path = path
+        self.mtime = mtime
+        self.records = records
+        self.names = names
+        self.entry_count = len(records) // RECORD_SIZE
+        self.orders = (None, by_name, by_size)
+        self.complete = True
+        self.stat_calls = 0
+        # 1 once the size of the entry was checked against the card
+        self.checked = bytearray(self.entry_count)
+
+    def count(self):
+        return self.entry_count
+
+    def ensure(self, count):
+        return self.entry_count
+
+    def name(self, index):
+        _, offset, _, length = struct.unpack_from(RECORD_FORMAT, self.records, index * RECORD_SIZE)
+        return bytes(self.names[offset:offset + length]).decode()
+
+    def stat(self, index):
+        size, offset, entry_type, length = struct.unpack_from(RECORD_FORMAT, self.records,
+                                                              index * RECORD_SIZE)
+        if entry_type == 1:
+            return True, None
+        if self.checked[index]:
+            return False, size
+        self.checked[index] = 1
+        self.stat_calls += 1
+        try:
+            f_stat = os.stat(join_path(self.path, self.name(index)))
+        except OSError as e:
+            log.warn("cannot stat", self.name(index), e)
+            return False, size
+        is_dir = f_stat[0] & 0o170000 == S_IFDIR
+        if not is_dir and f_stat[6] == size:
+            return False, size
+        struct.pack_into(RECORD_FORMAT, self.records, index * RECORD_SIZE,
+                         0 if is_dir else f_stat[6], offset, 1 if is_dir else 0, length)
+        self.discard()
+        if is_dir:
+            return True, None
+        return False, f_stat[6]
+
+    def discard(self):
+        """removes the saved index, the next visit builds a new one"""
+        try:
+            os.remove(index_path(self.path))
+        except OSError:
+            pass
+
+    def order(self, mode):
+        return self.orders[mode]
+
+    @staticmethod
+    def load(path):
+        """the saved index of path, or None when missing or outdated"""
+        try:
+            f = open(index_path(path), "rb")
+        except OSError:
+            return None
+        try:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                return None
+            magic, version, item_size, path_size, count, mtime, names_size = \
+                struct.unpack(HEADER_FORMAT, header)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                return None
+            if f.read(path_size) != path.encode():
+                log.info("dir index of another path:", path)
+                return None
+            if (mtime, count) != dir_signature(path):
+                log.info("dir index outdated:", path)
+                return None
+            records = bytearray(count * RECORD_SIZE)
+            names = bytearray(names_size)
+            typecode = 'H' if item_size == 2 else 'I'
+            by_name = array(typecode, [0] * count)
+            by_size = array(typecode, [0] * count)
+            for buf, size in ((records, len(records)), (names, names_size),
+                              (by_name, count * item_size), (by_size, count * item_size)):
+                if size and f.readinto(buf) != size:
+                    return None
+            return DirIndex(path, mtime, records, names, by_name, by_size)
+        except (OSError, ValueError) as e:
+            log.warn("cannot load dir index:", path, e)
+            return None
+        finally:
+            f.close()
+
+    def save(self):
+        item_size = 2 if self.entry_count <= 0xFFFF else 4
+        path = self.path.encode()
+        f = open(index_path(self.path), "wb")
+        try:
+            f.write(struct.pack(HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION, item_size, len(path),
+                                self.entry_count, self.mtime, len(self.names)))
+            f.write(path)
+            f.write(self.records)
+            f.write(self.names)
+            f.write(self.orders[ORDER_NAME])
+            f.write(self.orders[ORDER_SIZE])
+        finally:
+            f.close()
+
+
+class IndexBuilder:
+    """builds the DirIndex of a DirListing a batch of entries per step(),
+    so it can run as an app task while the listing is already shown"""
+
+    def __init__(self, listing, batch=32):
+        self.listing = listing
+        self.batch = batch
+        self.mtime = os.stat(listing.path)[8]
+        self.sizes = array('I')
+        self.types = bytearray()
+        self.index = None
+
+    def step(self):
+        listing = self.listing
+        position = len(self.sizes)
+        count = listing.ensure(position + self.batch)
+        for i in range(position, count):
+            is_dir, size = listing.stat(i)
+            self.types.append(1 if is_dir else 0)
+            self.sizes.append(size or 0)
+        if not listing.complete or len(self.sizes) < count:
+            return 0
+        self.index = self.build()
+        try:
+            ensure_index_dir()
+            self.index.save()
+        except OSError as e:
+            log.warn("cannot save dir index:", listing.path, e)
+        return None
+
+    def build(self):
+        listing = self.listing
+        count = listing.count()
+        records = bytearray(count * RECORD_SIZE)
+        encoded = []
+        names_size = 0
+        for i in range(count):
+            name = listing.name(i).encode()[:255]
+            struct.pack_into(RECORD_FORMAT, records, i * RECORD_SIZE, self.sizes[i],
+                             names_size, self.types[i], len(name))
+            encoded.append(name)
+            names_size += len(name)
+        names = bytearray(names_size)
+        offset = 0
+        for name in encoded:
+            names[offset:offset + len(name)] = name
+            offset += len(name)
+        typecode = 'H' if count <= 0xFFFF else 'I'
+        lower = [listing.name(i).lower() for i in range(count)]
+        types = self.types
+        # directories first, then by name
+        by_name = array(typecode, sorted(range(count), key=lambda i: (1 - types[i], lower[i])))
+        sizes = self.sizes
+        by_size = array(typecode, sorted(range(count), key=lambda i: -sizes[i]))
+        index = DirIndex(listing.path, self.mtime, records, names, by_name, by_size)
+        # the sizes were just stat'ed
+        index.checked = bytearray(b"\x01" * count)
+        return index
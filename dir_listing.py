@@ -0,0 +1,102 @@
+import os
+
+import logger
+
+log = logger.get_logger("dir_listing")
+
+S_IFDIR = 0o040000  # directory
+
+
+def join_path(directory, name):
+    if directory.endswith("/"):
+        return directory + name
+    return directory + "/" + name
+
+
+def is_hidden(name):
+    """dot entries, among them the .explorer dir of the saved indexes"""
+    return name.startswith(".")
+
+
+class DirListing:
+    """directory entries read on demand
+
+    Names are streamed with os.ilistdir (os.listdir on ports without it)
+    only as far as ensure() asks for, and sizes are stat'ed only for the
+    rows that get shown, into a bounded cache. Hidden entries are
+    skipped."""
+
+    def __init__(self, path, stat_cache_size=64):
+        self.path = path
+        self.names = []
+        # 1 for directories, 0 for files, 2 when ilistdir gave no type
+        self.types = bytearray()
+        self.sizes = {}
+        # indexes in self.sizes, oldest first
+        self.size_order = []
+        self.stat_cache_size = stat_cache_size
+        self.stat_calls = 0
+        self.complete = False
+        try:
+            self.entries = os.ilistdir(path)
+        except AttributeError:
+            self.entries = iter(os.listdir(path))
+
+    def ensure(self, count):
+        """read entries until count are known or the directory ends"""
+        while len(self.names) < count and not self.complete:
+            try:
+                entry = next(self.entries)
+            except StopIteration:
+                self.complete = True
+                self.entries = None
+                break
+            if type(entry) is str:
+                if is_hidden(entry):
+                    continue
+                self.names.append(entry)
+                self.types.append(2)
+                continue
+            if is_hidden(entry[0]):
+                continue
+            self.names.append(entry[0])
+            self.types.append(1 if entry[1] == S_IFDIR else 0)
+            if len(entry) > 3 and entry[1] != S_IFDIR:
+                self.put_size(len(self.names) - 1, entry[3])
+        return len(self.names)
+
+    def count(self):
+        return len(self.names)
+
+    def name(self, index):
+        return self.names[index]
+
+    def put_size(self, index, size):
+        if index in self.sizes:
+            return
+        if len(self.size_order) >= self.stat_cache_size:
+            del self.sizes[self.size_order.pop(0)]
+        self.sizes[index] = size
+        self.size_order.append(index)
+
+    def stat(self, index):
+        """(is_dir, size) of an entry, size is None for directories and
+        for entries that cannot be stat'ed"""
+        entry_type = self.types[index]
+        if entry_type == 1:
+            return True, None
+        size = self.sizes.get(index)
+        if size is not None:
+            return False, size
+        self.stat_calls += 1
+        try:
+            f_stat = os.stat(join_path(self.path, self.names[index]))
+        except OSError as e:
+            log.warn("cannot stat", self.names[index], e)
+            return False, None
+        if f_stat[0] & 0o170000 == S_IFDIR:
+            self.types[index] = 1
+            return True, None
+        self.types[index] = 0
+        self.put_size(index, f_stat[6])
+        return False, f_stat[6]
@@ -0,0 +1,61 @@
+"""MaixPy `KPU` module: YOLO2 that finds the box of the emulated sensor"""
+import emulator.sensor as sensor
+from emulator.device import get_device
+
+
+class Task:
+    def __init__(self, model):
+        self.model = model
+        self.threshold = 0.5
+
+
+class KpuObject:
+    def __init__(self, rect, value, classid=0, index=0):
+        self.rect_tuple = rect
+        self.prob = value
+        self.class_id = classid
+        self.obj_index = index
+
+    def rect(self):
+        return self.rect_tuple
+
+    def x(self):
+        return self.rect_tuple[0]
+
+    def y(self):
+        return self.rect_tuple[1]
+
+    def w(self):
+        return self.rect_tuple[2]
+
+    def h(self):
+        return self.rect_tuple[3]
+
+    def value(self):
+        return self.prob
+
+    def classid(self):
+        return self.class_id
+
+    def index(self):
+        return self.obj_index
+
+
+def load(model):
+    return Task(model)
+
+
+def init_yolo2(task, threshold, nms_value, anchor_num, anchor):
+    task.threshold = threshold
+    return True
+
+
+def run_yolo2(task, img):
+    device = get_device()
+    device.counters.kpu_runs += 1
+    device.spend_us(device.costs["kpu_yolo_us"])
+    return [KpuObject(sensor.box_at(sensor.state["frame"]), 0.9)]
+
+
+def deinit(task):
+    return True
@@ -0,0 +1,175 @@
+"""MaixPy `Maix` module: GPIO routed through the FPIOA, I2S and the FPIOA
+function numbers.
+
+A GPIO reads and drives the board pin its function was registered to
+with fm.register(), so scripted button presses on board_info.BUTTON_A
+reach the GPIOHS the app routed there, with its edge IRQ.
+"""
+from emulator.device import get_device
+import emulator.audio as audio
+
+
+class FPIOA:
+    """K210 FPIOA function numbers"""
+    GPIOHS0 = 24
+    GPIO0 = 56
+    I2S0_MCLK = 88
+    I2C0_SCLK = 126
+    I2C0_SDA = 127
+
+
+def define_fpioa_functions():
+    for i in range(32):
+        setattr(FPIOA, "GPIOHS%d" % i, FPIOA.GPIOHS0 + i)
+    for i in range(8):
+        setattr(FPIOA, "GPIO%d" % i, FPIOA.GPIO0 + i)
+    for dev in range(3):
+        base = FPIOA.I2S0_MCLK + 11 * dev
+        for i, name in enumerate(("MCLK", "SCLK", "WS")):
+            setattr(FPIOA, "I2S%d_%s" % (dev, name), base + i)
+        for i in range(4):
+            setattr(FPIOA, "I2S%d_IN_D%d" % (dev, i), base + 3 + i)
+            setattr(FPIOA, "I2S%d_OUT_D%d" % (dev, i), base + 7 + i)
+
+
+define_fpioa_functions()
+
+
+class GPIO:
+    GPIOHS0 = 0
+    GPIO0 = 32
+    IN = 0
+    OUT = 3
+    PULL_NONE = 0
+    PULL_DOWN = 1
+    PULL_UP = 2
+    IRQ_NONE = 0
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+    IRQ_BOTH = 3
+    WAKEUP_NOT_SUPPORT = 0
+
+    def __init__(self, gpio_id, mode=IN, pull=PULL_NONE, value=None):
+        self.gpio_id = gpio_id
+        self.mode = mode
+        self.pull = pull
+        self.handler = None
+        self.trigger = GPIO.IRQ_NONE
+        self.level = 0
+        if value is not None:
+            self.value(value)
+
+    def function(self):
+        if self.gpio_id < GPIO.GPIO0:
+            return FPIOA.GPIOHS0 + self.gpio_id
+        return FPIOA.GPIO0 + self.gpio_id - GPIO.GPIO0
+
+    def board_pin(self):
+        return get_device().pin_of_function(self.function())
+
+    def value(self, level=None):
+        device = get_device()
+        pin = self.board_pin()
+        if level is None:
+            if self.mode == GPIO.OUT or pin is None:
+                return self.level
+            return device.pin_level(pin)
+        self.level = 1 if level else 0
+        if self.mode == GPIO.OUT and pin is not None:
+            device.set_pin(pin, self.level)
+
+    def irq(self, handler, trigger=IRQ_BOTH, wakeup=WAKEUP_NOT_SUPPORT, priority=7):
+        device = get_device()
+        self.handler = handler
+        self.trigger = trigger
+        if self not in device.irq_gpios:
+            device.irq_gpios.append(self)
+
+    def disirq(self):
+        self.handler = None
+        self.trigger = GPIO.IRQ_NONE
+        device = get_device()
+        if self in device.irq_gpios:
+            device.irq_gpios.remove(self)
+
+    def wants_edge(self, level):
+        if self.handler is None:
+            return False
+        return self.trigger & (GPIO.IRQ_RISING if level else GPIO.IRQ_FALLING) != 0
+
+    def fire_irq(self):
+        self.handler(self)
+
+
+def define_gpio_ids():
+    for i in range(32):
+        setattr(GPIO, "GPIOHS%d" % i, GPIO.GPIOHS0 + i)
+    for i in range(8):
+        setattr(GPIO, "GPIO%d" % i, GPIO.GPIO0 + i)
+
+
+define_gpio_ids()
+
+
+class I2S:
+    """play() and record() block like the DMA of the firmware: record()
+    returns once the samples were captured at the sample rate, play()
+    returns once no more than one buffer is queued ahead of the output"""
+    DEVICE_0 = 0
+    DEVICE_1 = 1
+    DEVICE_2 = 2
+    CHANNEL_0 = 0
+    CHANNEL_1 = 1
+    CHANNEL_2 = 2
+    CHANNEL_3 = 3
+    TRANSMITTER = 1
+    RECEIVER = 2
+    RESOLUTION_16_BIT = 2
+    RESOLUTION_24_BIT = 4
+    RESOLUTION_32_BIT = 5
+    STANDARD_MODE = 1
+    RIGHT_JUSTIFYING_MODE = 2
+    LEFT_JUSTIFYING_MODE = 4
+
+    def __init__(self, device_num, pll2=0, mclk=0):
+        self.device_num = device_num
+        self.sample_rate = 44100
+        self.channel_modes = {}
+        # virtual time the queued output runs out, and the capture clock
+        self.play_end_us = 0
+        self.record_start_us = None
+        self.recorded = 0
+
+    def channel_config(self, channel, mode, resolution=RESOLUTION_16_BIT, cycles=32,
+                       align_mode=STANDARD_MODE):
+        self.channel_modes[channel] = mode
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.record_start_us = None
+
+    def duration_us(self, samples):
+        return samples * 1000000 // max(self.sample_rate, 1)
+
+    def play(self, pcm):
+        device = get_device()
+        clock = device.clock
+        samples = len(pcm.to_bytes()) // 2
+        device.counters.audio_samples_out += samples
+        duration = self.duration_us(samples)
+        self.play_end_us = max(self.play_end_us, clock.now_us) + duration
+        clock.advance_to(self.play_end_us - duration)
+
+    def record(self, points):
+        device = get_device()
+        clock = device.clock
+        if self.record_start_us is None:
+            self.record_start_us = clock.now_us
+            self.recorded = 0
+        self.recorded += points
+        clock.advance_to(self.record_start_us + self.duration_us(self.recorded))
+        device.counters.audio_samples_in += points
+        return audio.Audio(array=bytearray(points * 2))
+
+    def stop(self):
+        self.record_start_us = None
@@ -0,0 +1,144 @@
+"""Headless emulation of the MaixPy firmware modules for the M5StickV
+
+install() puts pure Python versions of lcd, image, sensor, KPU, Maix,
+board, fpioa_manager, machine, audio, ujson, uio, ubinascii, uasyncio
+and micropython into sys.modules, and gives time, gc, os and open() the
+MicroPython behaviour the apps rely on, so boot.py and M5StickVSystem
+run unmodified on the host:
+
+- a virtual clock: only sleeps and the modelled hardware costs advance
+  it, runs are deterministic and time.ticks_us() deltas are device time;
+- the LCD draws into a framebuffer that is saved with save_png();
+- the buttons and the power key are driven by a script, see runner.py;
+- the AXP192 is a register file on the emulated I2C bus;
+- Device.counters count LCD bytes, I2C transactions, image decodes,
+  file I/O and more, so UI paths can be compared run against run.
+
+usage: python3 -m emulator --help
+"""
+import builtins
+import gc
+import struct
+import sys
+import time
+import types
+import zlib
+
+from emulator import device as device_module
+from emulator.clock import StopEmulation, Reset, PowerOff, ticks_add, ticks_diff  # noqa: F401
+from emulator.device import Device, get_device  # noqa: F401
+from emulator.fs import Vfs, device_error
+
+firmware_modules = ("lcd", "image", "sensor", "KPU", "Maix", "board", "fpioa_manager",
+                    "machine", "audio", "ujson", "uio", "ubinascii", "uasyncio", "micropython")
+host_gc = gc
+
+
+def print_exception(e, file=None):
+    """sys.print_exception() of MicroPython, same layout"""
+    if file is None:
+        file = sys.stdout
+    get_device().counters.exceptions_printed += 1
+    file.write("Traceback (most recent call last):\n")
+    tb = e.__traceback__
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        file.write('  File "%s", line %d, in %s\n' % (code.co_filename, tb.tb_lineno, code.co_name))
+        tb = tb.tb_next
+    message = str(e)
+    file.write("%s: %s\n" % (type(e).__name__, message) if message else type(e).__name__ + "\n")
+
+
+def make_time(clock):
+    module = types.ModuleType("time")
+    module.__dict__.update(time.__dict__)
+    module.ticks_ms = clock.ticks_ms
+    module.ticks_us = clock.ticks_us
+    module.ticks_cpu = clock.ticks_us
+    module.ticks_diff = ticks_diff
+    module.ticks_add = ticks_add
+    module.sleep = lambda seconds: clock.advance(int(seconds * 1000000))
+    module.sleep_ms = lambda ms: clock.advance(int(ms) * 1000)
+    module.sleep_us = lambda us: clock.advance(int(us))
+    return module
+
+
+def make_gc(device):
+    module = types.ModuleType("gc")
+    module.__dict__.update(host_gc.__dict__)
+    threshold = [-1]
+
+    def collect():
+        device.counters.gc_collections += 1
+        host_gc.collect()
+        device.spend_us(device.costs["gc_collect_us"])
+
+    def set_threshold(amount=None):
+        if amount is not None:
+            threshold[0] = amount
+        return threshold[0]
+    module.collect = collect
+    module.mem_alloc = device.heap_alloc
+    module.mem_free = device.heap_free
+    module.threshold = set_threshold
+    return module
+
+
+def device_errors(func):
+    def call(*args):
+        try:
+            return func(*args)
+        except OSError as e:
+            raise device_error(e) from None
+    return call
+
+
+def make_os(vfs):
+    import os
+    module = types.ModuleType("os")
+    module.__dict__.update(os.__dict__)
+    for name in ("listdir", "ilistdir", "stat", "statvfs", "remove", "rename", "mkdir", "rmdir",
+                 "uname", "sync"):
+        setattr(module, name, device_errors(getattr(vfs, name)))
+    return module
+
+
+def install(root, start_ms=0, costs=None, heap_bytes=2 * 1024 * 1024, track_heap=True):
+    """create the device with its volumes below root and install the
+    firmware modules, returns the Device. once per process"""
+    if device_module.current is not None:
+        raise RuntimeError("the emulator is already installed")
+    vfs = Vfs(root)
+    device = Device(vfs, start_ms * 1000, costs, heap_bytes, track_heap)
+    vfs.device = device
+    device_module.current = device
+    for name in firmware_modules:
+        sys.modules[name] = __import__("emulator." + name, fromlist=[name])
+    sys.modules["time"] = sys.modules["utime"] = make_time(device.clock)
+    sys.modules["gc"] = make_gc(device)
+    sys.modules["os"] = sys.modules["uos"] = make_os(vfs)
+    builtins.open = vfs.open
+    sys.print_exception = print_exception
+    return device
+
+
+def save_png(path, img=None):
+    """write img, the LCD framebuffer by default, as an RGB PNG on the host"""
+    from emulator.image import to_rgb888
+    if img is None:
+        img = get_device().framebuffer
+    w, h, buf = img.w, img.h, img.buf
+    raw = bytearray()
+    for y in range(h):
+        raw.append(0)
+        row = y * w * 2
+        for x in range(w):
+            raw.extend(to_rgb888(buf[row + 2 * x] | (buf[row + 2 * x + 1] << 8)))
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+    png = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+    png += chunk(b"IDAT", zlib.compress(bytes(raw), 9)) + chunk(b"IEND", b"")
+    with get_device().vfs.host_open(path, "wb") as f:
+        f.write(png)
@@ -0,0 +1,5 @@
+import sys
+
+from emulator.runner import main
+
+sys.exit(main())
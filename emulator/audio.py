@@ -0,0 +1,30 @@
+"""MaixPy `audio` module: PCM buffers handed to and from Maix.I2S"""
+
+
+class Audio:
+    def __init__(self, path=None, is_create=False, samplerate=16000, array=None, points=None):
+        self.path = path
+        if array is not None:
+            self.data = bytes(array)
+        elif points is not None:
+            self.data = bytes(points * 2)
+        else:
+            self.data = b""
+        self.volume_percent = 100
+
+    def to_bytes(self):
+        return self.data
+
+    def volume(self, percent=None):
+        if percent is not None:
+            self.volume_percent = percent
+        return self.volume_percent
+
+    def play_process(self, i2s):
+        return [0, 0, 0]
+
+    def play(self):
+        return 0
+
+    def finish(self):
+        pass
@@ -0,0 +1,87 @@
+from emulator.clock import PowerOff
+
+AXP192_ADDR = 52
+REG_POWER_STATUS = 0x00
+REG_POWER_OUTPUT = 0x12
+REG_SLEEP = 0x31
+REG_PEK_IRQ = 0x46
+REG_GPIO0_LDO = 0x91
+PEK_LONG_PRESS = 0x01
+PEK_SHORT_PRESS = 0x02
+
+
+class AXP192Registers:
+    """register file of the AXP192 power management chip on I2C0
+
+    The ADC registers hold a battery and USB state set with set_battery()
+    and set_usb(). The power key IRQ bits of 0x46 are raised by
+    press_power_key() and cleared by writing ones like on the chip, 0x91
+    is the screen backlight and turning every output of 0x12 off powers
+    the emulated device down."""
+
+    def __init__(self, device):
+        self.device = device
+        self.regs = bytearray(256)
+        # register pointer of plain writeto()/readfrom() transfers
+        self.pointer = 0
+        self.sleep_mode = False
+        self.set_battery(3950, discharge_ma=60)
+        self.set_usb(False)
+        self.set_temperature(35.0)
+
+    def read(self, reg, n):
+        return bytes(self.regs[(reg + i) & 0xff] for i in range(n))
+
+    def write(self, reg, data):
+        for i in range(len(data)):
+            self.write_reg((reg + i) & 0xff, data[i])
+
+    def write_reg(self, reg, value):
+        if reg == REG_PEK_IRQ:
+            # IRQ status bits are cleared by writing 1
+            self.regs[reg] &= ~value & 0xff
+            return
+        self.regs[reg] = value
+        if reg == REG_GPIO0_LDO:
+            self.device.brightness = value >> 4
+        elif reg == REG_SLEEP:
+            self.sleep_mode = value & 0x08 != 0
+        elif reg == REG_POWER_OUTPUT and value == 0:
+            raise PowerOff("axp192 outputs off" + (", sleep mode" if self.sleep_mode else ""))
+
+    def set_adc(self, reg, raw, low_bits=4):
+        raw = max(0, min(int(raw), (1 << (8 + low_bits)) - 1))
+        self.regs[reg] = raw >> low_bits
+        self.regs[reg + 1] = raw & ((1 << low_bits) - 1)
+
+    def set_battery(self, millivolts, charge_ma=0, discharge_ma=0):
+        self.set_adc(0x78, millivolts / 1.1)
+        self.set_adc(0x7A, charge_ma / 0.5, 5)
+        self.set_adc(0x7C, discharge_ma / 0.5, 5)
+        # instantaneous battery power, 0.5mA * 1.1mV per count
+        raw = int(millivolts * max(charge_ma, discharge_ma) / 0.55)
+        self.regs[0x70] = (raw >> 16) & 0xff
+        self.regs[0x71] = (raw >> 8) & 0xff
+        self.regs[0x72] = raw & 0xff
+
+    def set_usb(self, plugged, millivolts=5000, milliamps=120):
+        if plugged:
+            self.regs[REG_POWER_STATUS] |= 0xc0
+        else:
+            self.regs[REG_POWER_STATUS] &= 0x3f
+        self.set_adc(0x56, millivolts / 1.7 if plugged else 0)
+        self.set_adc(0x58, milliamps / 0.625 if plugged else 0)
+
+    def set_temperature(self, celsius):
+        self.set_adc(0x5E, (celsius + 144.7) / 0.1)
+
+    def add_coulombs(self, charge, discharge):
+        """advance the 32 bit charge and discharge coulomb counters"""
+        for reg, delta in ((0xB0, charge), (0xB4, discharge)):
+            value = (self.regs[reg] << 24 | self.regs[reg + 1] << 16 |
+                     self.regs[reg + 2] << 8 | self.regs[reg + 3]) + delta
+            for i in range(4):
+                self.regs[reg + i] = (value >> (24 - 8 * i)) & 0xff
+
+    def press_power_key(self, long_press=False):
+        self.regs[REG_PEK_IRQ] |= PEK_LONG_PRESS if long_press else PEK_SHORT_PRESS
@@ -0,0 +1,21 @@
+"""MaixPy `board` module: board_info of the M5StickV"""
+
+
+class board_info:
+    # only the buttons and the I2C pins are taken from the schematic, the
+    # emulator just needs the pins to be distinct
+    BUTTON_A = 36
+    BUTTON_B = 37
+    LED_W = 7
+    LED_R = 6
+    LED_G = 9
+    LED_B = 8
+    SPK_SD = 25
+    SPK_DIN = 11
+    SPK_BCLK = 10
+    SPK_LRCLK = 12
+    MIC_LRCLK = 19
+    MIC_DAT = 18
+    MIC_CLK = 20
+    I2C_SCL = 28
+    I2C_SDA = 29
@@ -0,0 +1,92 @@
+import heapq
+
+# ticks of the K210 port wrap at 2**30 like every MicroPython port
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD // 2
+
+
+class StopEmulation(BaseException):
+    """ends a run. BaseException so the `except Exception` handlers of the
+    app code, e.g. the blue screen of M5StickVSystem.run(), let it pass"""
+
+    def __init__(self, reason):
+        super(StopEmulation, self).__init__(reason)
+        self.reason = reason
+
+
+class Reset(StopEmulation):
+    pass
+
+
+class PowerOff(StopEmulation):
+    pass
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALF) & TICKS_MAX) - TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+class VirtualClock:
+    """device time in microseconds
+
+    Only sleeps and the modelled cost of the hardware (LCD and SD
+    transfers, I2C, decodes, KPU runs) advance it, host time never does,
+    so a run is deterministic and time.ticks_us() deltas measured by the
+    app are device time. Timers, GPIO IRQs and scripted input are events
+    that fire in order while the clock is advanced past their due time."""
+
+    def __init__(self, start_us=0):
+        self.start_us = start_us
+        self.now_us = start_us
+        # raises StopEmulation("deadline") once reached, None runs forever
+        self.deadline_us = None
+        # heap of [due_us, seq, callback], cancel() clears the callback
+        self.events = []
+        self.seq = 0
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def ticks_ms(self):
+        return (self.now_us // 1000) & TICKS_MAX
+
+    def elapsed_ms(self):
+        """virtual ms since the clock was created"""
+        return (self.now_us - self.start_us) // 1000
+
+    def call_at(self, due_us, callback):
+        self.seq += 1
+        event = [due_us, self.seq, callback]
+        heapq.heappush(self.events, event)
+        return event
+
+    def call_later(self, delay_us, callback):
+        return self.call_at(self.now_us + delay_us, callback)
+
+    def cancel(self, event):
+        event[2] = None
+
+    def advance_to(self, target_us):
+        """fire the events due up to target_us, then move there"""
+        if self.deadline_us is not None and target_us > self.deadline_us:
+            self.advance_to(self.deadline_us)
+            raise StopEmulation("deadline")
+        events = self.events
+        while len(events) > 0 and events[0][0] <= target_us:
+            due_us, _, callback = heapq.heappop(events)
+            if callback is None:
+                continue
+            if due_us > self.now_us:
+                self.now_us = due_us
+            callback()
+        if target_us > self.now_us:
+            self.now_us = target_us
+
+    def advance(self, us):
+        if us > 0:
+            self.advance_to(self.now_us + int(us))
@@ -0,0 +1,166 @@
+import tracemalloc
+
+from emulator.clock import VirtualClock
+from emulator.axp192 import AXP192Registers, AXP192_ADDR
+
+# modelled cost of the hardware, estimates for a K210 at 400MHz driving
+# the M5StickV. they make runs comparable with each other, they are not
+# cycle accurate
+default_costs = {
+    # ST7789 over SPI, every transfer also sets the address window
+    "lcd_spi_mhz": 15,
+    "lcd_transfer_us": 20,
+    # AXP192 on I2C0, 9 clocks per byte plus start, address and stop
+    "i2c_khz": 400,
+    "i2c_transaction_bytes": 2,
+    # FatFs on the SD card over SPI: reads and writes go through its
+    # sector cache, closing a written file and every directory change
+    # sync the FAT and the directory entry
+    "fs_call_us": 20,
+    "fs_ns_per_byte": 400,
+    "fs_sync_us": 3000,
+    # software JPEG decode/encode and image operations of the CPU
+    "jpeg_decode_ns_per_pixel": 500,
+    "jpeg_encode_ns_per_pixel": 250,
+    "fill_ns_per_pixel": 5,
+    "blit_ns_per_pixel": 12,
+    "glyph_us": 3,
+    "kpu_yolo_us": 22000,
+    "sensor_fps": 30,
+    "gc_collect_us": 3000,
+}
+
+
+class Counters:
+    """what a run cost, read with snapshot(), subtract two snapshots to
+    measure one UI path"""
+
+    names = ("lcd_transfers", "lcd_bytes", "i2c_transactions", "i2c_bytes",
+             "image_decodes", "decode_bytes", "jpeg_encodes", "fs_reads", "fs_read_bytes",
+             "fs_writes", "fs_write_bytes", "fs_syncs", "sensor_frames", "kpu_runs", "gpio_irqs",
+             "timer_callbacks", "audio_samples_out", "audio_samples_in", "gc_collections",
+             "exceptions_printed")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        for name in self.names:
+            setattr(self, name, 0)
+
+    def snapshot(self):
+        return dict((name, getattr(self, name)) for name in self.names)
+
+
+class Device:
+    """the emulated M5StickV: clock, counters, LCD framebuffer, board
+    pins, the I2C bus with the AXP192 and the file system root"""
+
+    def __init__(self, vfs, start_us=0, costs=None, heap_bytes=2 * 1024 * 1024, track_heap=True):
+        self.clock = VirtualClock(start_us)
+        self.costs = dict(default_costs)
+        if costs:
+            self.costs.update(costs)
+        self.counters = Counters()
+        self.vfs = vfs
+        # gc.mem_alloc() is the memory traced by tracemalloc since here,
+        # CPython objects are bigger than MicroPython ones so heap_bytes
+        # is bigger than the GC heap of the device
+        self.heap_bytes = heap_bytes
+        self.heap_base = None
+        if track_heap:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.heap_base = tracemalloc.get_traced_memory()[0]
+        # created by lcd.init(), logical size after the rotation
+        self.framebuffer = None
+        self.lcd_rotation = 0
+        # board pin -> level, the buttons are pulled up
+        self.pin_levels = {}
+        # fpioa function -> board pin, written by fm.register()
+        self.function_pins = {}
+        # Maix.GPIO objects with an IRQ handler
+        self.irq_gpios = []
+        self.axp192 = AXP192Registers(self)
+        self.i2c_devices = {AXP192_ADDR: self.axp192}
+        self.brightness = 0
+        self.sensor_running = False
+
+    # --- costs
+
+    def spend_us(self, us):
+        self.clock.advance(us)
+
+    def spend_ns(self, ns):
+        self.clock.advance(ns // 1000)
+
+    def lcd_transfer(self, pixels):
+        counters = self.counters
+        counters.lcd_transfers += 1
+        counters.lcd_bytes += pixels * 2
+        self.clock.advance(self.costs["lcd_transfer_us"] +
+                           pixels * 2 * 8 // self.costs["lcd_spi_mhz"])
+
+    def i2c_transaction(self, data_bytes):
+        counters = self.counters
+        counters.i2c_transactions += 1
+        counters.i2c_bytes += data_bytes
+        wire_bytes = data_bytes + self.costs["i2c_transaction_bytes"]
+        self.clock.advance(wire_bytes * 9 * 1000 // self.costs["i2c_khz"])
+
+    def fs_transfer(self, nbytes, is_write):
+        counters = self.counters
+        if is_write:
+            counters.fs_writes += 1
+            counters.fs_write_bytes += nbytes
+        else:
+            counters.fs_reads += 1
+            counters.fs_read_bytes += nbytes
+        self.clock.advance(self.costs["fs_call_us"] +
+                           nbytes * self.costs["fs_ns_per_byte"] // 1000)
+
+    def fs_sync(self):
+        self.counters.fs_syncs += 1
+        self.clock.advance(self.costs["fs_sync_us"])
+
+    def heap_alloc(self):
+        if self.heap_base is None:
+            return 0
+        return max(tracemalloc.get_traced_memory()[0] - self.heap_base, 0)
+
+    def heap_free(self):
+        return max(self.heap_bytes - self.heap_alloc(), 0)
+
+    # --- board pins
+
+    def pin_of_function(self, function):
+        return self.function_pins.get(function)
+
+    def pin_level(self, pin):
+        return self.pin_levels.get(pin, 1)
+
+    def set_pin(self, pin, level):
+        """drive a board pin, GPIOs routed to it get their edge IRQ"""
+        old = self.pin_level(pin)
+        self.pin_levels[pin] = level
+        if old == level:
+            return
+        for gpio in list(self.irq_gpios):
+            if gpio.board_pin() == pin and gpio.wants_edge(level):
+                self.counters.gpio_irqs += 1
+                gpio.fire_irq()
+
+    # --- scripted input
+
+    def schedule(self, at_ms, action):
+        """run action() when the virtual clock reaches at_ms since start"""
+        return self.clock.call_at(self.clock.start_us + at_ms * 1000, action)
+
+
+current = None
+
+
+def get_device():
+    if current is None:
+        raise RuntimeError("emulator.install() was not called")
+    return current
@@ -0,0 +1,28 @@
+"""MaixPy `fpioa_manager` module: routes FPIOA functions to board pins"""
+from emulator.device import get_device
+from emulator.Maix import FPIOA
+
+
+class FpioaManager:
+    def __init__(self):
+        self.fpioa = FPIOA()
+
+    def register(self, pin, function, force=True):
+        function_pins = get_device().function_pins
+        for other in list(function_pins):
+            # a pin carries one function, registering it again moves it
+            if function_pins[other] == pin:
+                del function_pins[other]
+        function_pins[function] = pin
+
+    def unregister(self, pin, function=None):
+        function_pins = get_device().function_pins
+        for other in list(function_pins):
+            if function_pins[other] == pin and (function is None or other == function):
+                del function_pins[other]
+
+    def get_pin_by_function(self, function):
+        return get_device().pin_of_function(function)
+
+
+fm = FpioaManager()
@@ -0,0 +1,193 @@
+"""The /flash and /sd volumes, mapped to directories below a host root
+
+open() and the os functions the apps use go through Vfs, paths outside
+the volumes are passed to the host unchanged so the Python runtime keeps
+working. File I/O on the volumes costs FatFs time, see Device.fs_transfer().
+"""
+import collections
+import errno
+import os
+import stat
+
+VOLUMES = ("flash", "sd")
+# statvfs() of the volumes: block size and total/free blocks of a 16MB
+# flash with 3MB for the file system and an 8GB SD card
+volume_blocks = {"flash": (4096, 768, 512), "sd": (32768, 243776, 200000)}
+
+UnameResult = collections.namedtuple("UnameResult",
+                                     ("sysname", "nodename", "release", "version", "machine"))
+
+
+def device_error(e):
+    """OSError like MicroPython raises it, without the host path"""
+    return OSError(e.errno, errno.errorcode.get(e.errno, str(e.errno)))
+
+
+class VolumeFile:
+    """a file on a volume, reads and writes are counted and cost time"""
+
+    def __init__(self, f, device):
+        self.f = f
+        self.device = device
+        self.written = False
+
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.device.fs_transfer(len(data), False)
+        return data
+
+    def readinto(self, buf):
+        n = self.f.readinto(buf)
+        self.device.fs_transfer(n or 0, False)
+        return n
+
+    def readline(self, limit=-1):
+        line = self.f.readline(limit)
+        self.device.fs_transfer(len(line), False)
+        return line
+
+    def write(self, data):
+        n = self.f.write(data)
+        self.written = True
+        self.device.fs_transfer(len(data), True)
+        return n
+
+    def flush(self):
+        self.f.flush()
+        if self.written:
+            self.written = False
+            self.device.fs_sync()
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+            if self.written:
+                self.written = False
+                self.device.fs_sync()
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class Vfs:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.device = None
+        self.host_open = open
+        for volume in VOLUMES:
+            path = os.path.join(self.root, volume)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+    def host_path(self, path):
+        """host path of a path on a volume, None for other paths"""
+        if not isinstance(path, str) or not path.startswith("/"):
+            return None
+        parts = [p for p in path.split("/") if p]
+        if len(parts) == 0:
+            return self.root
+        if parts[0] not in VOLUMES:
+            return None
+        return os.path.join(self.root, *parts)
+
+    def mapped(self, path):
+        host = self.host_path(path)
+        if host is None:
+            return path
+        return host
+
+    def open(self, path, mode="r", *args, **kwargs):
+        host = self.host_path(path)
+        if host is None:
+            return self.host_open(path, mode, *args, **kwargs)
+        try:
+            f = self.host_open(host, mode, *args, **kwargs)
+        except OSError as e:
+            raise device_error(e)
+        return VolumeFile(f, self.device)
+
+    def listdir(self, path=None):
+        if path is None:
+            return os.listdir()
+        host = self.host_path(path)
+        if host == self.root:
+            return list(VOLUMES)
+        names = sorted(os.listdir(self.mapped(path)))
+        if host is not None:
+            self.device.fs_transfer(32 * len(names), False)
+        return names
+
+    def ilistdir(self, path="."):
+        """MicroPython style (name, type, inode, size) tuples"""
+        if self.host_path(path) == self.root:
+            return iter([(volume, stat.S_IFDIR, 0, 0) for volume in VOLUMES])
+        host = self.mapped(path)
+        is_volume = self.host_path(path) is not None
+        entries = []
+        for name in sorted(os.listdir(host)):
+            st = os.stat(os.path.join(host, name))
+            if is_volume:
+                # one 32 byte directory entry per name
+                self.device.fs_transfer(32, False)
+            if stat.S_ISDIR(st.st_mode):
+                entries.append((name, stat.S_IFDIR, 0, 0))
+            else:
+                entries.append((name, stat.S_IFREG, 0, st.st_size))
+        return iter(entries)
+
+    def stat(self, path):
+        st = os.stat(self.mapped(path))
+        if self.host_path(path) is not None:
+            self.device.fs_transfer(32, False)
+        return (st.st_mode, 0, 0, 0, 0, 0, st.st_size, int(st.st_atime), int(st.st_mtime),
+                int(st.st_ctime))
+
+    def statvfs(self, path):
+        host = self.host_path(path)
+        if host is None:
+            return tuple(os.statvfs(path))
+        parts = [p for p in path.split("/") if p]
+        bsize, blocks, free = volume_blocks[parts[0] if parts else "flash"]
+        return (bsize, bsize, blocks, free, free, 0, 0, 0, 0, 255)
+
+    def sync_op(self, path):
+        if self.host_path(path) is not None:
+            self.device.fs_sync()
+
+    def remove(self, path):
+        os.remove(self.mapped(path))
+        self.sync_op(path)
+
+    def rename(self, old, new):
+        # FatFs refuses to rename over an existing file like MicroPython
+        if os.path.exists(self.mapped(new)) and self.host_path(new) is not None:
+            raise OSError(17, "EEXIST")
+        os.rename(self.mapped(old), self.mapped(new))
+        self.sync_op(new)
+
+    def mkdir(self, path):
+        os.mkdir(self.mapped(path))
+        self.sync_op(path)
+
+    def rmdir(self, path):
+        os.rmdir(self.mapped(path))
+        self.sync_op(path)
+
+    def uname(self):
+        return UnameResult("MaixPy", "MaixPy", "0.6.2", "v0.6.2 emulated",
+                           "Sipeed_M1 with kendryte-k210")
+
+    def sync(self):
+        pass
@@ -0,0 +1,352 @@
+"""MaixPy `image` module: RGB565 images backed by a bytearray.
+
+Pixels are little-endian RGB565 like the image buffers of MaixPy, so
+img.bytearray() can be filled with readinto() the way asset_bundle.py
+does on the device. JPEG and PNG files are decoded with Pillow when it
+is installed, otherwise the image gets the size from the file header and
+a flat color derived from its content, which is enough for layout, draw
+counts and timing. Text is drawn with a small built-in 3x5 font scaled
+to the 8 pixel glyph pitch of the firmware fonts.
+"""
+import struct
+import zlib
+
+from emulator.device import get_device
+
+RGB565 = 2
+GRAYSCALE = 1
+JPEG = 4
+
+# 3x5 glyphs, rows top to bottom, lower case letters use the upper case ones
+font_rows = {
+    " ": "...............", "0": "####.##.##.####", "1": ".#.##..#..#.###",
+    "2": "###..#####..###", "3": "###..#.##..####", "4": "#.##.####..#..#",
+    "5": "####..###..####", "6": "####..####.####", "7": "###..#.#..#..#.",
+    "8": "####.#####.####", "9": "####.####..####", "A": ".#.#.#####.##.#",
+    "B": "##.#.###.#.###.", "C": ".###..#..#...##", "D": "##.#.##.##.###.",
+    "E": "####..##.#..###", "F": "####..##.#..#..", "G": ".###..#.##.#.##",
+    "H": "#.##.#####.##.#", "I": "###.#..#..#.###", "J": "..#..#..##.#.#.",
+    "K": "#.##.###.#.##.#", "L": "#..#..#..#..###", "M": "#.########.##.#",
+    "N": "##.#.##.##.##.#", "O": ".#.#.##.##.#.#.", "P": "##.#.###.#..#..",
+    "Q": ".#.#.##.###..##", "R": "##.#.###.#.##.#", "S": ".###...#...###.",
+    "T": "###.#..#..#..#.", "U": "#.##.##.##.####", "V": "#.##.##.##.#.#.",
+    "W": "#.##.########.#", "X": "#.##.#.#.#.##.#", "Y": "#.##.#.#..#..#.",
+    "Z": "###..#.#.#..###", ".": ".............#.", ",": "..........#.#..",
+    ":": "....#.....#....", ";": "....#.....#.#..", "%": "#.#..#.#.#..#.#",
+    "/": "..#..#.#.#..#..", "-": "......###......", "_": "............###",
+    "+": "....#.###.#....", "=": "...###...###...", "*": "...#.#.#.#.#...",
+    "(": ".#.#..#..#...#.", ")": ".#...#..#..#.#.", "[": "##.#..#..#..##.",
+    "]": ".##..#..#..#.##", "<": "..#.#.#...#...#", ">": "#...#...#.#.#..",
+    "!": ".#..#..#.....#.", "?": "##...#.#.....#.", "'": ".#..#..........",
+    '"': "#.##.#.........", "#": "#.#####.#####.#", "&": ".#.#.#.#.#.#.##",
+    "@": ".#.#.#####...##",
+}
+GLYPH_PITCH = 8
+unknown_glyph = "###" * 5
+
+
+def glyph_runs(char):
+    """[(row, first column, run length)] of the set pixels of char"""
+    rows = font_rows.get(char)
+    if rows is None:
+        rows = font_rows.get(char.upper(), unknown_glyph)
+    runs = []
+    for row in range(5):
+        col = 0
+        while col < 3:
+            if rows[row * 3 + col] == "#":
+                start = col
+                while col < 3 and rows[row * 3 + col] == "#":
+                    col += 1
+                runs.append((row, start, col - start))
+            else:
+                col += 1
+    return runs
+
+
+glyph_cache = {}
+
+
+def to_rgb565(color):
+    """(r, g, b) tuples like the image functions take, or an RGB565 int
+    like the lcd color constants"""
+    if isinstance(color, int):
+        return color & 0xffff
+    r, g, b = color[0], color[1], color[2]
+    return ((r & 0xf8) << 8) | ((g & 0xfc) << 3) | (b >> 3)
+
+
+def pixel_bytes(color):
+    return struct.pack("<H", to_rgb565(color))
+
+
+def to_rgb888(value):
+    r = (value >> 11) & 0x1f
+    g = (value >> 5) & 0x3f
+    b = value & 0x1f
+    return ((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2))
+
+
+class Image:
+    def __init__(self, path=None, size=None, copy_to_fb=False, **kwargs):
+        self.path = path
+        if path is not None:
+            self.w, self.h, self.buf = decode_file(path)
+        else:
+            if size is None:
+                fb = get_device().framebuffer
+                size = (fb.w, fb.h) if fb is not None else (320, 240)
+            self.w, self.h = size
+            self.buf = bytearray(self.w * self.h * 2)
+
+    def __repr__(self):
+        return "{\"w\":%d, \"h\":%d, \"type\":\"rgb565\", \"size\":%d}" % (
+            self.w, self.h, len(self.buf))
+
+    def width(self):
+        return self.w
+
+    def height(self):
+        return self.h
+
+    def size(self):
+        return len(self.buf)
+
+    def format(self):
+        return RGB565
+
+    def bytearray(self):
+        """the pixel buffer itself, writes to it change the image"""
+        return self.buf
+
+    def get_pixel(self, x, y):
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return None
+        i = (y * self.w + x) * 2
+        return to_rgb888(self.buf[i] | (self.buf[i + 1] << 8))
+
+    def set_pixel(self, x, y, color):
+        if 0 <= x < self.w and 0 <= y < self.h:
+            i = (y * self.w + x) * 2
+            self.buf[i:i + 2] = pixel_bytes(color)
+        return self
+
+    def clear(self):
+        self.buf[:] = bytes(len(self.buf))
+        get_device().spend_ns(self.w * self.h * get_device().costs["fill_ns_per_pixel"])
+        return self
+
+    def fill(self, x, y, w, h, pixel):
+        """fill the clipped rect with the 2 byte pixel, returns the pixel count"""
+        left = max(x, 0)
+        top = max(y, 0)
+        right = min(x + w, self.w)
+        bottom = min(y + h, self.h)
+        if right <= left or bottom <= top:
+            return 0
+        row = pixel * (right - left)
+        stride = self.w * 2
+        buf = self.buf
+        start = top * stride + left * 2
+        end = start + len(row)
+        for _ in range(bottom - top):
+            buf[start:end] = row
+            start += stride
+            end += stride
+        return (right - left) * (bottom - top)
+
+    def blit(self, src, x, y, roi=None):
+        """copy roi of src to (x, y), clipped on both images, returns the
+        pixel count"""
+        rx, ry, rw, rh = roi if roi is not None else (0, 0, src.w, src.h)
+        # clip the roi to the source
+        if rx < 0:
+            x -= rx
+            rw += rx
+            rx = 0
+        if ry < 0:
+            y -= ry
+            rh += ry
+            ry = 0
+        rw = min(rw, src.w - rx)
+        rh = min(rh, src.h - ry)
+        # clip the destination
+        if x < 0:
+            rx -= x
+            rw += x
+            x = 0
+        if y < 0:
+            ry -= y
+            rh += y
+            y = 0
+        rw = min(rw, self.w - x)
+        rh = min(rh, self.h - y)
+        if rw <= 0 or rh <= 0:
+            return 0
+        src_buf = src.buf
+        dst_buf = self.buf
+        src_stride = src.w * 2
+        dst_stride = self.w * 2
+        s = ry * src_stride + rx * 2
+        d = y * dst_stride + x * 2
+        n = rw * 2
+        for _ in range(rh):
+            dst_buf[d:d + n] = src_buf[s:s + n]
+            s += src_stride
+            d += dst_stride
+        return rw * rh
+
+    def draw_rectangle(self, x, y=None, w=None, h=None, color=(255, 255, 255), thickness=1,
+                       fill=False):
+        if isinstance(x, tuple):
+            if y is not None and not isinstance(y, int):
+                color = y
+            x, y, w, h = x
+        pixel = pixel_bytes(color)
+        if fill:
+            pixels = self.fill(x, y, w, h, pixel)
+        else:
+            t = max(min(thickness, w // 2, h // 2), 1)
+            pixels = self.fill(x, y, w, t, pixel) + self.fill(x, y + h - t, w, t, pixel)
+            pixels += self.fill(x, y + t, t, h - 2 * t, pixel)
+            pixels += self.fill(x + w - t, y + t, t, h - 2 * t, pixel)
+        device = get_device()
+        device.spend_ns(pixels * device.costs["fill_ns_per_pixel"])
+        return self
+
+    def draw_glyphs(self, x, y, text, color, scale=1):
+        """3x5 glyphs scaled by 2 * scale at an 8 * scale pitch"""
+        pixel = pixel_bytes(color)
+        dot = 2 * scale
+        for char in text:
+            if char != " ":
+                runs = glyph_cache.get(char)
+                if runs is None:
+                    runs = glyph_runs(char)
+                    glyph_cache[char] = runs
+                for row, col, length in runs:
+                    self.fill(x + scale + col * dot, y + row * dot, length * dot, dot, pixel)
+            x += GLYPH_PITCH * scale
+        device = get_device()
+        device.spend_us(len(text) * device.costs["glyph_us"] * scale)
+
+    def draw_string(self, x, y, text, color=(255, 255, 255), scale=1, x_spacing=0, y_spacing=0,
+                    mono_space=True):
+        line_y = y
+        for line in str(text).split("\n"):
+            self.draw_glyphs(x, line_y, line, color, int(scale))
+            line_y += int(12 * scale) + y_spacing
+        return self
+
+    def draw_image(self, img, x, y, x_scale=1.0, y_scale=1.0, mask=None, alpha=256):
+        """scale, mask and alpha are not emulated, the image is copied 1:1"""
+        pixels = self.blit(img, x, y)
+        device = get_device()
+        device.spend_ns(pixels * device.costs["blit_ns_per_pixel"])
+        return self
+
+    def draw_line(self, x0, y0, x1, y1, color=(255, 255, 255), thickness=1):
+        pixel = pixel_bytes(color)
+        steps = max(abs(x1 - x0), abs(y1 - y0), 1)
+        for i in range(steps + 1):
+            self.fill(x0 + (x1 - x0) * i // steps, y0 + (y1 - y0) * i // steps,
+                      thickness, thickness, pixel)
+        return self
+
+    def compress(self, quality=90):
+        """JPEG of the emulated size, the bytes are not a decodable picture"""
+        device = get_device()
+        device.counters.jpeg_encodes += 1
+        device.spend_ns(self.w * self.h * device.costs["jpeg_encode_ns_per_pixel"])
+        return JpegImage(self.w, self.h, max(self.w * self.h * 2 * quality // 1000, 600))
+
+
+class JpegImage:
+    def __init__(self, w, h, nbytes):
+        self.w = w
+        self.h = h
+        data = bytearray(nbytes)
+        data[0:2] = b"\xff\xd8"
+        data[-2:] = b"\xff\xd9"
+        self.buf = data
+
+    def width(self):
+        return self.w
+
+    def height(self):
+        return self.h
+
+    def size(self):
+        return len(self.buf)
+
+    def format(self):
+        return JPEG
+
+    def bytearray(self):
+        return self.buf
+
+
+def jpeg_size(data):
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xff:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xff or marker == 0x01 or 0xd0 <= marker <= 0xd8:
+            i += 2 if marker != 0xff else 1
+            continue
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    raise ValueError("no JPEG frame header")
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def image_size(data):
+    if data[:2] == b"\xff\xd8":
+        return jpeg_size(data)
+    if data[:8] == PNG_SIGNATURE:
+        return struct.unpack(">II", data[16:24])
+    raise ValueError("unsupported image format")
+
+
+pil_image = None
+
+
+def decode_pixels(data, width, height):
+    """RGB565 bytes of the picture, Pillow when installed, otherwise a
+    flat color taken from the crc of the file"""
+    global pil_image
+    if pil_image is None:
+        try:
+            from PIL import Image as pil_image
+        except ImportError:
+            pil_image = False
+    if pil_image:
+        import io
+        with pil_image.open(io.BytesIO(bytes(data))) as img:
+            rgb = img.convert("RGB")
+            out = bytearray()
+            for r, g, b in rgb.getdata():
+                out += struct.pack("<H", ((r & 0xf8) << 8) | ((g & 0xfc) << 3) | (b >> 3))
+            return out
+    crc = zlib.crc32(bytes(data))
+    return bytearray(struct.pack("<H", (crc & 0xffff) | 0x0821) * (width * height))
+
+
+def decode_file(path):
+    device = get_device()
+    f = device.vfs.open(path, "rb")
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    width, height = image_size(data)
+    device.counters.image_decodes += 1
+    device.counters.decode_bytes += len(data)
+    device.spend_ns(width * height * device.costs["jpeg_decode_ns_per_pixel"])
+    return width, height, decode_pixels(data, width, height)
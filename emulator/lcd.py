@@ -0,0 +1,112 @@
+"""MaixPy `lcd` module drawing into the framebuffer of the device.
+
+Every call that reaches the panel counts one transfer and its bytes and
+costs the SPI time of the ST7789, see Device.lcd_transfer().
+"""
+from emulator.device import get_device
+from emulator.image import Image, pixel_bytes
+
+BLACK = 0x0000
+NAVY = 0x000F
+DARKGREEN = 0x03E0
+DARKCYAN = 0x03EF
+MAROON = 0x7800
+PURPLE = 0x780F
+OLIVE = 0x7BE0
+LIGHTGREY = 0xC618
+DARKGREY = 0x7BEF
+BLUE = 0x001F
+GREEN = 0x07E0
+CYAN = 0x07FF
+RED = 0xF800
+MAGENTA = 0xF81F
+YELLOW = 0xFFE0
+WHITE = 0xFFFF
+ORANGE = 0xFD20
+GREENYELLOW = 0xAFE5
+PINK = 0xF81F
+
+# the M5StickV panel, rotation 0 and 2 are landscape
+panel_size = (240, 135)
+
+
+def framebuffer():
+    device = get_device()
+    if device.framebuffer is None:
+        init()
+    return device.framebuffer
+
+
+def init(type=1, freq=15000000, color=BLACK, **kwargs):
+    device = get_device()
+    if device.framebuffer is None:
+        w, h = panel_size if device.lcd_rotation % 2 == 0 else panel_size[::-1]
+        device.framebuffer = Image(size=(w, h))
+    clear(color)
+
+
+def deinit():
+    pass
+
+
+def width():
+    return framebuffer().w
+
+
+def height():
+    return framebuffer().h
+
+
+def rotation(dir=None):
+    device = get_device()
+    if dir is None:
+        return device.lcd_rotation
+    if dir % 2 != device.lcd_rotation % 2 and device.framebuffer is not None:
+        fb = device.framebuffer
+        device.framebuffer = Image(size=(fb.h, fb.w))
+    device.lcd_rotation = dir % 4
+    return device.lcd_rotation
+
+
+def mirror(invert=None):
+    return False
+
+
+def set_backlight(value):
+    get_device().brightness = value
+
+
+def get_backlight():
+    return get_device().brightness
+
+
+def clear(color=BLACK):
+    fb = framebuffer()
+    pixels = fb.fill(0, 0, fb.w, fb.h, pixel_bytes(color))
+    get_device().lcd_transfer(pixels)
+
+
+def fill_rectangle(x, y, w, h, color):
+    pixels = framebuffer().fill(x, y, w, h, pixel_bytes(color))
+    get_device().lcd_transfer(pixels)
+
+
+def draw_string(x, y, text, color=WHITE, bg_color=BLACK):
+    """8x16 cells with the background, like the firmware font"""
+    fb = framebuffer()
+    text = str(text)
+    pixels = fb.fill(x, y, len(text) * 8, 16, pixel_bytes(bg_color))
+    fb.draw_glyphs(x, y + 3, text, color)
+    get_device().lcd_transfer(pixels)
+
+
+def display(img, roi=None, oft=None):
+    """push roi of img to oft, an image without oft is centered"""
+    fb = framebuffer()
+    if roi is None:
+        roi = (0, 0, img.width(), img.height())
+    if oft is None:
+        oft = ((fb.w - roi[2]) // 2, (fb.h - roi[3]) // 2)
+    pixels = fb.blit(img, oft[0], oft[1], roi)
+    get_device().lcd_transfer(pixels)
+
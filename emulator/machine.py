@@ -0,0 +1,153 @@
+"""MaixPy `machine` module: I2C on the bus of the device, Timer on the
+virtual clock, reset() ends the run"""
+from emulator.clock import Reset
+from emulator.device import get_device
+
+
+class I2C:
+    I2C0 = 0
+    I2C1 = 1
+    I2C2 = 2
+    MODE_MASTER = 0
+    MODE_SLAVE = 1
+
+    def __init__(self, id, mode=MODE_MASTER, scl=None, sda=None, freq=400000, timeout=1000,
+                 addr=0, addr_size=7):
+        self.id = id
+        self.freq = freq
+
+    def target(self, addr):
+        chip = get_device().i2c_devices.get(addr)
+        if chip is None:
+            # the K210 port reports a missing ACK as EIO
+            raise OSError(5, "EIO")
+        return chip
+
+    def scan(self):
+        device = get_device()
+        device.i2c_transaction(0)
+        return sorted(device.i2c_devices.keys())
+
+    def writeto(self, addr, buf, stop=True):
+        chip = self.target(addr)
+        get_device().i2c_transaction(len(buf))
+        if len(buf) > 0:
+            chip.pointer = buf[0]
+            chip.write(buf[0], bytes(buf[1:]))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        chip = self.target(addr)
+        get_device().i2c_transaction(nbytes)
+        return chip.read(chip.pointer, nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, mem_size=8):
+        chip = self.target(addr)
+        if isinstance(buf, int):
+            buf = bytes([buf & 0xff])
+        get_device().i2c_transaction(1 + len(buf))
+        chip.write(memaddr, bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, mem_size=8):
+        chip = self.target(addr)
+        get_device().i2c_transaction(1 + nbytes)
+        return chip.read(memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, mem_size=8):
+        chip = self.target(addr)
+        get_device().i2c_transaction(1 + len(buf))
+        buf[:] = chip.read(memaddr, len(buf))
+
+    def deinit(self):
+        pass
+
+
+class Timer:
+    TIMER0 = 0
+    TIMER1 = 1
+    TIMER2 = 2
+    CHANNEL0 = 0
+    CHANNEL1 = 1
+    CHANNEL2 = 2
+    CHANNEL3 = 3
+    MODE_ONE_SHOT = 0
+    MODE_PERIODIC = 1
+    MODE_PWM = 2
+    UNIT_S = 0
+    UNIT_MS = 1
+    UNIT_US = 2
+    UNIT_NS = 3
+
+    def __init__(self, id, channel, mode=MODE_ONE_SHOT, period=1000, unit=UNIT_MS, callback=None,
+                 arg=None, start=True, priority=1, div=0):
+        self.id = id
+        self.channel = channel
+        self.timer_mode = mode
+        self.period_us = period * (1000000, 1000, 1, 0.001)[unit]
+        self.cb = callback
+        self.cb_arg = arg
+        self.event = None
+        if start:
+            self.start()
+
+    def fire(self):
+        self.event = None
+        if self.timer_mode == Timer.MODE_PERIODIC:
+            self.start()
+        if self.cb is not None:
+            get_device().counters.timer_callbacks += 1
+            self.cb(self)
+
+    def start(self):
+        self.stop()
+        self.event = get_device().clock.call_later(max(int(self.period_us), 1), self.fire)
+
+    def restart(self):
+        self.start()
+
+    def stop(self):
+        if self.event is not None:
+            get_device().clock.cancel(self.event)
+            self.event = None
+
+    def deinit(self):
+        self.stop()
+        self.cb = None
+
+    def callback(self, callback=None):
+        if callback is not None:
+            self.cb = callback
+        return self.cb
+
+    def callback_arg(self):
+        return self.cb_arg
+
+    def period(self, period=None):
+        if period is not None:
+            self.period_us = period * 1000
+            if self.event is not None:
+                self.start()
+        return int(self.period_us // 1000)
+
+
+def reset():
+    raise Reset("machine.reset()")
+
+
+def soft_reset():
+    raise Reset("machine.soft_reset()")
+
+
+def unique_id():
+    return b"\x4d\x35\x53\x56\x45\x4d\x55\x00" + bytes(24)
+
+
+def freq():
+    return 400000000
+
+
+def idle():
+    get_device().clock.advance(1)
@@ -0,0 +1,54 @@
+"""MicroPython `micropython` module"""
+from emulator.device import get_device
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def schedule(func, arg):
+    """runs func(arg) at the next event of the virtual clock, like a
+    scheduled callback runs between bytecodes on the device"""
+    get_device().clock.call_later(0, lambda: func(arg))
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def opt_level(level=None):
+    return 0
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def kbd_intr(chr):
+    pass
+
+
+def stack_use():
+    return 0
+
+
+def mem_info(verbose=False):
+    device = get_device()
+    print("stack: 0 out of 15360\nGC: total: %d, used: %d, free: %d" %
+          (device.heap_bytes, device.heap_alloc(), device.heap_free()))
+
+
+def qstr_info(verbose=False):
+    print("qstr pool: not emulated")
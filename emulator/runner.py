@@ -0,0 +1,198 @@
+"""Run boot.py on the emulated M5StickV
+
+The script is a list of "<ms> <action> [args]" entries separated by ";"
+or new lines, "+<ms>" is relative to the previous entry:
+
+    home press|release|click     button A (home), click holds it 100ms
+    top press|release|click      button B (top)
+    power short|long             power key IRQ of the AXP192
+    battery <mv> [charge_ma]     battery voltage seen by the ADC
+    usb on|off                   USB power plugged in or not
+    png <path>                   save the screen
+    stats                        print the counters
+    stop                         end the run
+
+The first button press dismisses the start screen of M5StickVSystem,
+e.g. "300 home click; +500 top click; +500 home click; +2000 png explorer.png"
+opens the explorer and saves its screen.
+"""
+import argparse
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import zlib
+
+import emulator
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+click_ms = 100
+
+
+def parse_script(text):
+    """[(ms, action, args)] in time order"""
+    entries = []
+    last_ms = 0
+    for item in text.replace("\n", ";").split(";"):
+        words = item.split()
+        if len(words) == 0 or words[0].startswith("#"):
+            continue
+        if len(words) < 2:
+            raise ValueError("script entry needs a time and an action: %r" % item)
+        at = words[0]
+        last_ms = last_ms + int(at[1:]) if at.startswith("+") else int(at)
+        entries.append((last_ms, words[1], words[2:]))
+    return sorted(entries, key=lambda entry: entry[0])
+
+
+class ScriptRunner:
+    def __init__(self, device, entries, out):
+        self.device = device
+        self.out = out
+        self.buttons = {"home": emulator.board.board_info.BUTTON_A,
+                        "top": emulator.board.board_info.BUTTON_B}
+        for at_ms, action, args in entries:
+            device.schedule(at_ms, self.action(action, args))
+
+    def action(self, action, args):
+        device = self.device
+        if action in self.buttons:
+            pin = self.buttons[action]
+            kind = args[0] if args else "click"
+            if kind == "press":
+                return lambda: device.set_pin(pin, 0)
+            if kind == "release":
+                return lambda: device.set_pin(pin, 1)
+            if kind == "click":
+                def click():
+                    device.set_pin(pin, 0)
+                    device.clock.call_later(click_ms * 1000, lambda: device.set_pin(pin, 1))
+                return click
+        elif action == "power":
+            long_press = len(args) > 0 and args[0] == "long"
+            return lambda: device.axp192.press_power_key(long_press)
+        elif action == "battery":
+            charge_ma = int(args[1]) if len(args) > 1 else 0
+            return lambda: device.axp192.set_battery(int(args[0]), charge_ma=charge_ma,
+                                                     discharge_ma=0 if charge_ma else 60)
+        elif action == "usb":
+            return lambda: device.axp192.set_usb(args[0] == "on")
+        elif action == "png":
+            return lambda: emulator.save_png(args[0])
+        elif action == "stats":
+            return lambda: self.out.write("emulator %dms: %s\n" % (
+                device.clock.elapsed_ms(), json.dumps(device.counters.snapshot())))
+        elif action == "stop":
+            def stop():
+                raise emulator.StopEmulation("script stop")
+            return stop
+        raise ValueError("unknown script action: %s %s" % (action, " ".join(args)))
+
+
+def prepare_root(root, config_overrides):
+    """the res/ of the repo is copied to /sd/res and its sample wav to
+    /sd once, config overrides are merged into /sd/config.json"""
+    sd = os.path.join(root, "sd")
+    if not os.path.isdir(os.path.join(sd, "res")):
+        shutil.copytree(os.path.join(repo_root, "res"), os.path.join(sd, "res"))
+    # the music app plays the .wav files of /sd
+    if not os.path.exists(os.path.join(sd, "super_mario.wav")):
+        shutil.copy(os.path.join(repo_root, "super_mario.wav"), sd)
+    if config_overrides:
+        path = os.path.join(sd, "config.json")
+        conf = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                conf = json.load(f)
+        conf.update(config_overrides)
+        with open(path, "w") as f:
+            json.dump(conf, f)
+
+
+def parse_config(items):
+    conf = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        try:
+            conf[key] = json.loads(value)
+        except ValueError:
+            conf[key] = value
+    return conf
+
+
+def run(boot_path, root, run_ms, script="", start_ms=0, track_heap=True, out=sys.stdout):
+    """run boot_path until the deadline, the script or the app stops it,
+    returns (device, reason)"""
+    device = emulator.install(root, start_ms=start_ms, track_heap=track_heap)
+    device.clock.deadline_us = device.clock.start_us + run_ms * 1000
+    ScriptRunner(device, parse_script(script), out)
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    try:
+        runpy.run_path(boot_path, run_name="__main__")
+        reason = "boot.py returned"
+    except emulator.StopEmulation as e:
+        reason = e.reason
+    except SystemExit as e:
+        reason = "sys.exit(%s)" % ("" if e.code is None else e.code)
+    return device, reason
+
+
+def result(device, reason):
+    fb = device.framebuffer
+    return {"stopped": reason, "virtual_ms": device.clock.elapsed_ms(),
+            "brightness": device.brightness, "heap_alloc": device.heap_alloc(),
+            "framebuffer_crc32": zlib.crc32(bytes(fb.buf)) if fb is not None else None,
+            "counters": device.counters.snapshot()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m emulator",
+                                     description=__doc__.split("\n")[0])
+    parser.add_argument("boot", nargs="?", default=os.path.join(repo_root, "boot.py"))
+    parser.add_argument("--root", help="host directory of /flash and /sd, a temporary one "
+                                       "is used and removed by default")
+    parser.add_argument("--ms", type=int, default=10000, help="virtual run time")
+    parser.add_argument("--script", default="", help="input script, see above")
+    parser.add_argument("--script-file")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=JSON",
+                        help="merged into /sd/config.json before boot")
+    parser.add_argument("--png", help="save the screen at the end of the run")
+    parser.add_argument("--start-ms", type=int, default=0,
+                        help="initial ticks_ms(), e.g. close to the 2**30 wrap")
+    parser.add_argument("--no-heap", action="store_true",
+                        help="skip tracemalloc, gc.mem_alloc() stays 0 and the run is faster")
+    parser.add_argument("--json", action="store_true", help="print the result as one JSON line")
+    parser.add_argument("--quiet", action="store_true", help="drop the output of the app")
+    args = parser.parse_args(argv)
+    script = args.script
+    if args.script_file:
+        with open(args.script_file) as f:
+            script += "\n" + f.read()
+    root = args.root or tempfile.mkdtemp(prefix="emulator_")
+    out = sys.stdout
+    try:
+        prepare_root(root, parse_config(args.config))
+        if args.quiet:
+            sys.stdout = open(os.devnull, "w")
+        try:
+            device, reason = run(args.boot, root, args.ms, script, args.start_ms,
+                                 not args.no_heap, out)
+        finally:
+            sys.stdout = out
+        if args.png:
+            emulator.save_png(args.png)
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+    summary = result(device, reason)
+    if args.json:
+        out.write(json.dumps(summary, sort_keys=True) + "\n")
+    else:
+        out.write("emulator: %s after %dms\n" % (reason, summary["virtual_ms"]))
+        for name, value in summary["counters"].items():
+            if value:
+                out.write("  %-20s %d\n" % (name, value))
+    return 0
@@ -0,0 +1,107 @@
+"""MaixPy `sensor` module: synthetic frames of a box moving over a gradient
+
+After run(1) the DVP produces a frame every 1 / sensor_fps seconds of
+virtual time, snapshot() waits for the next one. box_at() is the scene,
+KPU.run_yolo2() detects the same box.
+"""
+from emulator.device import get_device
+from emulator.image import Image, pixel_bytes
+
+RGB565 = 2
+GRAYSCALE = 1
+YUV422 = 3
+QQVGA = 5
+QVGA = 8
+VGA = 10
+frame_sizes = {QQVGA: (160, 120), QVGA: (320, 240), VGA: (640, 480)}
+BOX_SIZE = 48
+
+state = {"framesize": QVGA, "frame": 0, "start_us": None, "background": None,
+         "image": None}
+
+
+def box_at(frame):
+    """(x, y, w, h) of the moving box in frame, a triangle wave in x and y"""
+    w, h = frame_sizes[state["framesize"]]
+    span_x = w - BOX_SIZE
+    span_y = h - BOX_SIZE
+    x = frame * 6 % (2 * span_x)
+    y = frame * 4 % (2 * span_y)
+    return (x if x < span_x else 2 * span_x - x, y if y < span_y else 2 * span_y - y,
+            BOX_SIZE, BOX_SIZE)
+
+
+def reset(freq=None, set_regs=True, dual_buff=False):
+    # snapshot() waits for the next frame either way, dual_buff only
+    # has to be accepted
+    state["frame"] = 0
+    state["start_us"] = None
+    state["image"] = None
+
+
+def set_pixformat(pixformat):
+    pass
+
+
+def set_framesize(framesize):
+    state["framesize"] = framesize
+    state["background"] = None
+    state["image"] = None
+
+
+def set_hmirror(enable):
+    pass
+
+
+def set_vflip(enable):
+    pass
+
+
+def width():
+    return frame_sizes[state["framesize"]][0]
+
+
+def height():
+    return frame_sizes[state["framesize"]][1]
+
+
+def run(enable):
+    device = get_device()
+    device.sensor_running = bool(enable)
+    state["start_us"] = device.clock.now_us if enable else None
+
+
+def background():
+    bg = state["background"]
+    if bg is None:
+        w, h = frame_sizes[state["framesize"]]
+        bg = bytearray()
+        for y in range(h):
+            bg += pixel_bytes((y * 255 // h, 96, 255 - y * 255 // h)) * w
+        state["background"] = bg
+    return bg
+
+
+def snapshot():
+    device = get_device()
+    if state["start_us"] is None:
+        raise RuntimeError("Capture Failed: sensor.run(1) was not called")
+    interval_us = 1000000 // device.costs["sensor_fps"]
+    clock = device.clock
+    frame = max(state["frame"] + 1, (clock.now_us - state["start_us"]) // interval_us + 1)
+    clock.advance_to(state["start_us"] + frame * interval_us)
+    state["frame"] = frame
+    device.counters.sensor_frames += 1
+    img = state["image"]
+    if img is None:
+        img = Image(size=frame_sizes[state["framesize"]])
+        state["image"] = img
+    # the frame buffer of the DVP is reused like on the device
+    img.buf[:] = background()
+    img.fill(*box_at(frame), pixel=pixel_bytes((255, 255, 255)))
+    return img
+
+
+def skip_frames(n=10, time=None):
+    for _ in range(n):
+        snapshot()
@@ -0,0 +1,235 @@
+"""MicroPython `uasyncio` on the virtual clock
+
+Tasks run one at a time in FIFO order. When no task is ready the loop
+advances the clock to the earliest sleeper, firing the timers and IRQs
+due on the way, so sleep_ms(500) costs no host time. Tasks that keep
+yielding without the clock moving are reported instead of hanging.
+"""
+import heapq
+import sys
+from collections import deque
+
+from emulator.device import get_device
+
+# task steps without the virtual clock moving before the loop gives up
+max_spins = 100000
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class Sleep:
+    __slots__ = ("us",)
+
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+class EventWait:
+    __slots__ = ("event",)
+
+    def __init__(self, event):
+        self.event = event
+
+    def __await__(self):
+        yield self
+
+
+def sleep_ms(ms):
+    return Sleep(max(int(ms), 0) * 1000)
+
+
+def sleep(seconds):
+    return Sleep(max(int(seconds * 1000000), 0))
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        loop = current_loop
+        for task in self.waiting:
+            if loop is not None:
+                loop.ready.append(task)
+        self.waiting = []
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await EventWait(self)
+        return True
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.finished = False
+        self.result = None
+        self.exception = None
+        self.waiting = []
+        # thrown into the coroutine at its next step
+        self.pending = None
+
+    def done(self):
+        return self.finished
+
+    def cancel(self):
+        if self.finished:
+            return False
+        self.pending = CancelledError()
+        loop = current_loop
+        if loop is not None:
+            loop.wake(self)
+        return True
+
+    def __await__(self):
+        if not self.finished:
+            yield self
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class Loop:
+    def __init__(self):
+        self.clock = get_device().clock
+        self.ready = deque()
+        # heap of (due_us, seq, task)
+        self.sleepers = []
+        self.seq = 0
+
+    def create_task(self, coro):
+        task = Task(coro)
+        self.ready.append(task)
+        return task
+
+    def wake(self, task):
+        """make a sleeping or waiting task ready, used by cancel()"""
+        for i in range(len(self.sleepers)):
+            if self.sleepers[i][2] is task:
+                self.sleepers.pop(i)
+                heapq.heapify(self.sleepers)
+                break
+        if task not in self.ready:
+            self.ready.append(task)
+
+    def finish(self, task, result=None, exception=None):
+        task.finished = True
+        task.result = result
+        task.exception = exception
+        for waiter in task.waiting:
+            self.ready.append(waiter)
+        if exception is not None and len(task.waiting) == 0 and \
+                not isinstance(exception, CancelledError):
+            print("Task exception wasn't retrieved:", repr(exception))
+            sys.print_exception(exception)
+
+    def step(self, task):
+        try:
+            if task.pending is not None:
+                error = task.pending
+                task.pending = None
+                value = task.coro.throw(error)
+            else:
+                value = task.coro.send(None)
+        except StopIteration as e:
+            self.finish(task, e.value)
+            return
+        except CancelledError as e:
+            self.finish(task, exception=e)
+            return
+        except Exception as e:
+            self.finish(task, exception=e)
+            return
+        if isinstance(value, Sleep):
+            self.seq += 1
+            heapq.heappush(self.sleepers, (self.clock.now_us + value.us, self.seq, task))
+        elif isinstance(value, EventWait):
+            if value.event.state:
+                self.ready.append(task)
+            else:
+                value.event.waiting.append(task)
+        elif isinstance(value, Task):
+            if value.finished:
+                self.ready.append(task)
+            else:
+                value.waiting.append(task)
+        else:
+            self.ready.append(task)
+
+    def run_until_complete(self, main):
+        if not isinstance(main, Task):
+            main = self.create_task(main)
+        spins = 0
+        last_us = self.clock.now_us
+        while not main.finished:
+            if len(self.ready) == 0:
+                if len(self.sleepers) == 0:
+                    raise RuntimeError("uasyncio: no task is ready or sleeping")
+                self.clock.advance_to(self.sleepers[0][0])
+                while len(self.sleepers) > 0 and self.sleepers[0][0] <= self.clock.now_us:
+                    self.ready.append(heapq.heappop(self.sleepers)[2])
+                continue
+            self.step(self.ready.popleft())
+            if self.clock.now_us != last_us:
+                last_us = self.clock.now_us
+                spins = 0
+            else:
+                spins += 1
+                if spins > max_spins:
+                    raise RuntimeError("uasyncio: tasks keep running without the virtual clock "
+                                       "advancing, a loop never sleeps")
+        if main.exception is not None:
+            raise main.exception
+        return main.result
+
+    def run_forever(self):
+        self.run_until_complete(Event().wait())
+
+
+current_loop = None
+
+
+def get_event_loop():
+    global current_loop
+    if current_loop is None:
+        current_loop = Loop()
+    return current_loop
+
+
+def new_event_loop():
+    global current_loop
+    current_loop = Loop()
+    return current_loop
+
+
+def create_task(coro):
+    return get_event_loop().create_task(coro)
+
+
+def run(coro):
+    return new_event_loop().run_until_complete(coro)
+
+
+async def gather(*awaitables):
+    tasks = [a if isinstance(a, Task) else create_task(a) for a in awaitables]
+    results = []
+    for task in tasks:
+        results.append(await task)
+    return results
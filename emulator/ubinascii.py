@@ -0,0 +1,9 @@
+"""MicroPython `ubinascii` module"""
+from binascii import a2b_base64, b2a_base64, crc32, unhexlify  # noqa: F401
+import binascii
+
+
+def hexlify(data, sep=None):
+    if sep is None:
+        return binascii.hexlify(data)
+    return binascii.hexlify(data, sep)
@@ -0,0 +1,3 @@
+"""MicroPython `uio` module"""
+from io import BytesIO, StringIO  # noqa: F401
+from io import open  # noqa: F401
@@ -0,0 +1,2 @@
+"""MicroPython `ujson` module"""
+from json import dump, dumps, load, loads  # noqa: F401
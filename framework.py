@@ -1,15 +1,81 @@
+import logger
+
+log = logger.get_logger("framework")
+
+
 class NeedRebootException(Exception):
     pass
 
 
+def rect_intersects(a, b):
+    """rects are (x, y, w, h) tuples, same as the roi of lcd/image"""
+    return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and
+            a[1] < b[1] + b[3] and b[1] < a[1] + a[3])
+
+
+def rect_contains(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            inner[0] + inner[2] <= outer[0] + outer[2] and
+            inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+def rect_union(a, b):
+    left = min(a[0], b[0])
+    top = min(a[1], b[1])
+    right = max(a[0] + a[2], b[0] + b[2])
+    bottom = max(a[1] + a[3], b[1] + b[3])
+    return (left, top, right - left, bottom - top)
+
+
+def merge_rect(rects, rect):
+    """add rect to the dirty list, merging it with every rect it overlaps"""
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            if rect_intersects(rects[i], rect):
+                rect = rect_union(rects.pop(i), rect)
+                merged = True
+                break
+    rects.append(rect)
+    return rects
+
+
 class BaseApp:
+    # bytes one on_draw_rects or app_periodic_task may allocate, None is
+    # unchecked. full redraws also run lazy init, they are only measured
+    alloc_budget = None
+
     def __init__(self, system):
-        print("BaseApp.__init__ called")
+        if log.debug_on:
+            log.debug("BaseApp.__init__", self)
         self.system = system
 
+    def on_create(self):
+        """called once by the app registry after the instance is created"""
+        pass
+
+    def on_resume(self):
+        """the app became the foreground app, a full redraw follows"""
+        pass
+
+    def on_pause(self):
+        """the app left the foreground, by back or by another app on top
+        of it. release the sensor, KPU and large buffers here"""
+        pass
+
+    def on_destroy(self):
+        """the registry dropped the instance, it is never resumed again"""
+        pass
+
     def on_draw(self):
         pass
 
+    def on_draw_rects(self, rects):
+        """repaint only the dirty rects, apps without partial redraw
+        support simply draw the whole screen again"""
+        self.on_draw()
+
     def on_back_pressed(self):
         # not handled by default
         return False
@@ -23,6 +89,14 @@ class BaseApp:
     def invalidate_drawing(self):
         self.system.invalidate_drawing()
 
+    def invalidate_rect(self, x, y, w, h):
+        self.system.invalidate_rect(x, y, w, h)
+
+    def start_task(self, name, step, interval_ms=0):
+        """run step() as a cooperative task owned by this app, it is
+        cancelled when the app is navigated away from"""
+        return self.system.add_app_task(self, name, step, interval_ms)
+
     def get_system(self):
         return self.system
 
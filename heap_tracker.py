@@ -0,0 +1,112 @@
+import gc
+import time
+
+import logger
+
+log = logger.get_logger("heap")
+
+
+class HeapTracker:
+    """gc.mem_alloc() deltas of on_draw and the periodic tasks per app
+
+    A delta is a lower bound, a collection that runs inside the measured
+    section frees memory and is clipped to zero."""
+
+    def __init__(self):
+        # app class -> {kind: [runs, total_bytes, max_bytes, over_budget]}
+        self.app_stats = {}
+        self.high_water = 0
+        self.over_budget = 0
+
+    def begin(self):
+        return gc.mem_alloc()
+
+    def end(self, app, kind, start_alloc, budget=None):
+        now = gc.mem_alloc()
+        delta = max(now - start_alloc, 0)
+        if now > self.high_water:
+            self.high_water = now
+        app_class = type(app)
+        kinds = self.app_stats.get(app_class)
+        if kinds is None:
+            kinds = {}
+            self.app_stats[app_class] = kinds
+        stats = kinds.get(kind)
+        if stats is None:
+            stats = [0, 0, 0, 0]
+            kinds[kind] = stats
+        stats[0] += 1
+        stats[1] += delta
+        if delta > stats[2]:
+            stats[2] = delta
+        if budget is not None and delta > budget:
+            stats[3] += 1
+            self.over_budget += 1
+            if log.warn_on:
+                log.warn("%s %s allocated %d bytes, budget %d" %
+                         (app_class.__name__, kind, delta, budget))
+        return delta
+
+    def rows(self):
+        """(app name, kind, runs, avg bytes, max bytes, over budget)"""
+        rows = []
+        for app_class in self.app_stats:
+            kinds = self.app_stats[app_class]
+            for kind in kinds:
+                runs, total, max_bytes, over = kinds[kind]
+                rows.append((app_class.__name__, kind, runs, total // max(runs, 1),
+                             max_bytes, over))
+        return rows
+
+    def report(self):
+        for row in self.rows():
+            log.info("heap %s.%s: runs=%d avg=%dB max=%dB over_budget=%d" % row)
+        log.info("heap: high_water=%dB free=%dB" % (self.high_water, gc.mem_free()))
+
+
+class GcPolicy:
+    """replaces ad-hoc gc.collect() calls: the heap threshold makes the
+    allocator collect early, and idle time is used for a collection once
+    enough garbage may have piled up, so it rarely lands inside a frame"""
+
+    def __init__(self, idle_collect_bytes=16 * 1024, min_interval_ms=1000):
+        self.idle_collect_bytes = idle_collect_bytes
+        self.min_interval_ms = min_interval_ms
+        self.last_collect_ms = time.ticks_ms()
+        self.alloc_after_collect = gc.mem_alloc()
+        self.collections = 0
+        self.collect_us = 0
+        self.max_collect_us = 0
+        if hasattr(gc, "threshold"):
+            # the threshold counts bytes allocated since the last
+            # collection: collect once a quarter of the free heap is used up
+            gc.threshold(gc.mem_free() // 4)
+
+    def collect(self):
+        start = time.ticks_us()
+        gc.collect()
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        self.collections += 1
+        self.collect_us += elapsed
+        if elapsed > self.max_collect_us:
+            self.max_collect_us = elapsed
+        self.last_collect_ms = time.ticks_ms()
+        self.alloc_after_collect = gc.mem_alloc()
+
+    def on_idle(self):
+        """called by the main loop when there is nothing to do"""
+        alloc = gc.mem_alloc()
+        if alloc < self.alloc_after_collect:
+            # the threshold triggered a collection meanwhile
+            self.alloc_after_collect = alloc
+        if alloc - self.alloc_after_collect < self.idle_collect_bytes:
+            return False
+        if time.ticks_diff(time.ticks_ms(), self.last_collect_ms) < self.min_interval_ms:
+            return False
+        self.collect()
+        return True
+
+    def report(self):
+        log.info("gc: idle collections=%d avg=%dus max=%dus" %
+                 (self.collections, self.collect_us // max(self.collections, 1),
+                  self.max_collect_us))
@@ -0,0 +1,66 @@
+import config
+import asset_bundle
+import logger
+from lru_cache import LruCache, configured_budget
+
+log = logger.get_logger("image_cache")
+
+# decoded icons are RGB565, 64x60 launcher icon is 7.5KB
+default_budget_bytes = 64 * 1024
+
+
+def image_size_bytes(img):
+    try:
+        return img.size()
+    except Exception:
+        return img.width() * img.height() * 2
+
+
+class ImageCache(LruCache):
+    """decoded images keyed by path, least recently used ones are evicted
+    once the byte budget is exceeded"""
+
+    def __init__(self, budget_bytes=default_budget_bytes):
+        super(ImageCache, self).__init__(budget_bytes)
+
+    def get(self, path):
+        entry = self.lookup(path)
+        if entry is not None:
+            return entry[0]
+        img = asset_bundle.load_image(path)
+        self.add(path, img, image_size_bytes(img))
+        return img
+
+    def preload(self, paths):
+        for path in paths:
+            if self.has(path):
+                continue
+            try:
+                self.get(path)
+            except Exception as e:
+                log.warn("cannot preload image:", path, e)
+
+
+shared_cache = None
+
+
+def get_shared_cache():
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = ImageCache(configured_budget("image_cache_budget", default_budget_bytes))
+    return shared_cache
+
+
+def get_image(path):
+    return get_shared_cache().get(path)
+
+
+def preload(paths):
+    if config.get_config_by_key("image_cache_preload") is False:
+        return
+    get_shared_cache().preload(paths)
+
+
+def release_memory():
+    """called by memory hungry apps such as the camera"""
+    get_shared_cache().release_memory("image_cache")
@@ -0,0 +1,71 @@
+import time
+from array import array
+
+SOURCE_HOME = 0
+SOURCE_TOP = 1
+SOURCE_COUNT = 2
+
+STATE_RELEASED = 0
+STATE_PRESSED = 1
+state_names = ("released", "pressed")
+
+
+class InputEventQueue:
+    """fixed-size ring buffer of timestamped button events
+
+    push() is called from GPIO IRQs so it never allocates, every buffer is
+    created up front. On Linux events can be injected by calling push()
+    from a stand-in GPIO."""
+
+    def __init__(self, capacity=16, debounce_ms=20):
+        self.capacity = capacity
+        self.debounce_ms = debounce_ms
+        self.sources = bytearray(capacity)
+        self.states = bytearray(capacity)
+        self.ticks = array('i', [0] * capacity)
+        self.head = 0
+        self.count = 0
+        # last accepted state and its time for every source
+        self.last_states = bytearray(SOURCE_COUNT)
+        self.last_ticks = array('i', [0] * SOURCE_COUNT)
+        self.dropped = 0
+        self.bounces = 0
+
+    def push(self, source, state, ticks_ms):
+        if state == self.last_states[source]:
+            # no edge, e.g. a level sampled by poll or a repeated IRQ
+            return False
+        # a negative diff is an edge more than half a ticks period after the
+        # last one, e.g. the first edge when the ticks counter is past 2**29
+        if 0 <= time.ticks_diff(ticks_ms, self.last_ticks[source]) < self.debounce_ms:
+            # contact bounce, the settled level is picked up by a later poll
+            self.bounces += 1
+            return False
+        if self.count == self.capacity:
+            self.dropped += 1
+            return False
+        self.last_states[source] = state
+        self.last_ticks[source] = ticks_ms
+        tail = (self.head + self.count) % self.capacity
+        self.sources[tail] = source
+        self.states[tail] = state
+        self.ticks[tail] = ticks_ms
+        self.count += 1
+        return True
+
+    def pop(self):
+        """returns (source, state, ticks_ms) or None when empty"""
+        if self.count == 0:
+            return None
+        head = self.head
+        event = (self.sources[head], self.states[head], self.ticks[head])
+        self.head = (head + 1) % self.capacity
+        self.count -= 1
+        return event
+
+    def is_empty(self):
+        return self.count == 0
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
@@ -0,0 +1,46 @@
+"""the firmware lcd module with a count of the pixels pushed to the panel
+
+Everything that draws imports it as lcd, the system reads pushed() before
+and after a frame to get what the frame cost on the SPI bus. Only the
+pushing calls are wrapped, the rest is the firmware module itself."""
+from lcd import *  # noqa: F401,F403
+import lcd as firmware_lcd
+
+# every draw_string cell is 8x16 with its background
+GLYPH_PIXELS = 8 * 16
+
+pushed_pixels = 0
+
+
+def pushed():
+    return pushed_pixels
+
+
+def display(img, **kwargs):
+    global pushed_pixels
+    roi = kwargs.get("roi")
+    if roi is not None:
+        w, h = roi[2], roi[3]
+    else:
+        w, h = img.width(), img.height()
+    # the panel clips what does not fit, e.g. a QVGA camera frame
+    pushed_pixels += min(w, firmware_lcd.width()) * min(h, firmware_lcd.height())
+    firmware_lcd.display(img, **kwargs)
+
+
+def draw_string(x, y, text, *args):
+    global pushed_pixels
+    pushed_pixels += len(text) * GLYPH_PIXELS
+    firmware_lcd.draw_string(x, y, text, *args)
+
+
+def fill_rectangle(x, y, w, h, *args):
+    global pushed_pixels
+    pushed_pixels += w * h
+    firmware_lcd.fill_rectangle(x, y, w, h, *args)
+
+
+def clear(*args):
+    global pushed_pixels
+    pushed_pixels += firmware_lcd.width() * firmware_lcd.height()
+    firmware_lcd.clear(*args)
@@ -0,0 +1,187 @@
+import time
+
+import config
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+level_names = {DEBUG: "D", INFO: "I", WARN: "W", ERROR: "E"}
+level_by_name = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+
+default_level = INFO
+default_console_level = INFO
+default_ring_size = 4096
+default_path = "/sd/log.txt"
+# unflushed bytes that make flush_if_needed() append to the log file
+flush_batch_bytes = 1024
+
+
+class LogRing:
+    """preallocated byte ring of the latest records, the part not written
+    to the log file yet is appended by flush() in one batch"""
+
+    def __init__(self, size=default_ring_size, path=default_path):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.path = path
+        self.pos = 0
+        # bytes written since boot and bytes appended to the file
+        self.total = 0
+        self.flushed = 0
+        self.lost = 0
+        self.flushes = 0
+
+    def write(self, data):
+        n = len(data)
+        if n > self.size:
+            data = data[n - self.size:]
+            n = self.size
+        end = self.pos + n
+        if end <= self.size:
+            self.buffer[self.pos:end] = data
+        else:
+            first = self.size - self.pos
+            self.buffer[self.pos:] = data[:first]
+            self.buffer[:n - first] = data[first:]
+        self.pos = end % self.size
+        self.total += len(data)
+
+    def tail(self, n):
+        """the latest n bytes, n is clamped to the ring size"""
+        n = min(n, self.total, self.size)
+        start = (self.pos - n) % self.size
+        if start + n <= self.size:
+            return bytes(self.buffer[start:start + n])
+        return bytes(self.buffer[start:]) + bytes(self.buffer[:self.pos])
+
+    def unflushed(self):
+        return self.total - self.flushed
+
+    def flush(self):
+        pending = self.unflushed()
+        if pending == 0 or self.path is None:
+            return
+        if pending > self.size:
+            # overwritten before a flush came around
+            self.lost += pending - self.size
+        try:
+            with open(self.path, "ab") as f:
+                f.write(self.tail(pending))
+            self.flushes += 1
+        except OSError as e:
+            print("log flush failed:", e)
+        # even when the write failed, do not retry the same bytes forever
+        self.flushed = self.total
+
+    def flush_if_needed(self):
+        if self.unflushed() >= flush_batch_bytes:
+            self.flush()
+
+    def dump(self, path=None):
+        """print the whole ring, and save it to path when given"""
+        data = self.tail(self.size)
+        if self.total > self.size:
+            # the oldest record was cut by the ring, start at the next one
+            data = data[data.find(b"\n") + 1:]
+        try:
+            print(data.decode())
+        except UnicodeError:
+            print(data)
+        if path is not None:
+            try:
+                with open(path, "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                print("log dump failed:", e)
+
+
+ring = None
+console_level = default_console_level
+loggers = {}
+
+
+def get_ring():
+    global ring, console_level
+    if ring is None:
+        size = config.get_config_by_key("log_ring_size")
+        path = config.get_config_by_key("log_path")
+        ring = LogRing(size if size else default_ring_size,
+                       path if path is not None else default_path)
+        level = config.get_config_by_key("log_console_level")
+        console_level = level_by_name.get(level, default_console_level)
+    return ring
+
+
+class Logger:
+    """per module logger, hot paths check the flag before building the
+    arguments so a disabled call costs one attribute lookup:
+
+        if log.debug_on:
+            log.debug("button event:", source, state)
+    """
+
+    def __init__(self, name, level=default_level):
+        self.name = name
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = level
+        self.debug_on = level <= DEBUG
+        self.info_on = level <= INFO
+        self.warn_on = level <= WARN
+
+    def log(self, level, args):
+        if level < self.level:
+            return
+        msg = " ".join([str(arg) for arg in args])
+        line = "%d %s %s: %s\n" % (time.ticks_ms(), level_names[level], self.name, msg)
+        get_ring().write(line.encode())
+        if level >= console_level:
+            print(line, end="")
+
+    def debug(self, *args):
+        if self.debug_on:
+            self.log(DEBUG, args)
+
+    def info(self, *args):
+        if self.info_on:
+            self.log(INFO, args)
+
+    def warn(self, *args):
+        if self.warn_on:
+            self.log(WARN, args)
+
+    def error(self, *args):
+        self.log(ERROR, args)
+
+
+def get_logger(name):
+    """levels come from config: "log_level" for every module and the
+    "log_levels" dict for single modules, e.g. {"system": "debug"}"""
+    log = loggers.get(name)
+    if log is None:
+        level = level_by_name.get(config.get_config_by_key("log_level"), default_level)
+        module_levels = config.get_config_by_key("log_levels")
+        if type(module_levels) is dict and name in module_levels:
+            level = level_by_name.get(module_levels[name], level)
+        log = Logger(name, level)
+        loggers[name] = log
+    return log
+
+
+def flush():
+    if ring is not None:
+        ring.flush()
+
+
+def flush_if_needed():
+    if ring is not None:
+        ring.flush_if_needed()
+
+
+def dump(path="/sd/crash_log.txt"):
+    """called by the blue screen handler, the ring holds what led there"""
+    if ring is not None:
+        ring.flush()
+        ring.dump(path)
@@ -0,0 +1,79 @@
+import gc
+
+import config
+import logger
+
+log = logger.get_logger("cache")
+
+
+def configured_budget(key, default_bytes):
+    budget = config.get_config_by_key(key)
+    return budget if budget is not None else default_bytes
+
+
+class LruCache:
+    """byte budgeted cache, least recently used entries are evicted once
+    the budget is exceeded. the image and text caches subclass it and
+    keep their own keys and loading
+
+    An entry is [value, size_bytes, last_used, cost], cost is whatever
+    the subclass wants to remember per entry, e.g. the render time."""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.key_to_entry = {}
+        self.use_counter = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """the entry of key marked as used, None counts a miss"""
+        self.use_counter += 1
+        entry = self.key_to_entry.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[2] = self.use_counter
+        return entry
+
+    def has(self, key):
+        return key in self.key_to_entry
+
+    def add(self, key, value, size_bytes, cost=0):
+        """values bigger than the whole budget are not kept"""
+        if size_bytes > self.budget_bytes:
+            return
+        self.trim(self.budget_bytes - size_bytes)
+        self.key_to_entry[key] = [value, size_bytes, self.use_counter, cost]
+        self.used_bytes += size_bytes
+
+    def trim(self, target_bytes):
+        """evict least recently used entries until used_bytes <= target_bytes"""
+        while self.used_bytes > target_bytes and len(self.key_to_entry) > 0:
+            lru_key = None
+            lru_used = 0
+            for key in self.key_to_entry:
+                last_used = self.key_to_entry[key][2]
+                if lru_key is None or last_used < lru_used:
+                    lru_key = key
+                    lru_used = last_used
+            self.used_bytes -= self.key_to_entry.pop(lru_key)[1]
+            self.evictions += 1
+
+    def release(self):
+        self.trim(0)
+        gc.collect()
+
+    def release_memory(self, name):
+        """called by memory hungry apps such as the camera"""
+        if log.debug_on:
+            log.debug(name, "release_memory:", self.stats())
+        self.release()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self.key_to_entry),
+                "used_bytes": self.used_bytes, "budget_bytes": self.budget_bytes}
@@ -1,4 +1,4 @@
-import lcd
+import lcd_meter as lcd
 import machine
 import sys
 
@@ -6,25 +6,44 @@ from Maix import GPIO
 from board import board_info
 from fpioa_manager import fm
 
-import image
-# import gc
+import gc
 import time
 import resource
 import config
+import logger
 
 from my_pmu import AXP192
+from input_queue import InputEventQueue, SOURCE_HOME, SOURCE_TOP, STATE_PRESSED, STATE_RELEASED, \
+    state_names
 from app_launcher import LauncherApp
-from framework import NeedRebootException
+from app_registry import AppRegistry
+from framework import NeedRebootException, merge_rect, rect_intersects
+from scheduler import Scheduler, sleep_ms
+from deferred import DeferredQueue
+from power_telemetry import PowerTelemetry
+from profiler import Profiler
+from heap_tracker import HeapTracker, GcPolicy
+import asset_bundle
+
+log = logger.get_logger("system")
 
 
 class M5StickVSystem:
     def __init__(self):
-        self.pmu = AXP192()
+        self.boot_start_ms = time.ticks_ms()
+        # work posted by the PMU timer IRQ, drained by the main loop
+        self.deferred_queue = DeferredQueue()
+        self.pmu = AXP192(deferred_queue=self.deferred_queue)
         self.pmu.setScreenBrightness(0)
         self.pmu.set_on_pressed_listener(self.on_pek_button_pressed)
         self.pmu.set_on_long_pressed_listener(self.on_pek_button_long_pressed)
+        self.power_telemetry = None
+        if config.get_config_by_key("power_telemetry") is not False:
+            self.power_telemetry = PowerTelemetry()
         self.pmu.set_system_periodic_task(self.system_periodic_task)
         self.app_stack = []
+        # launcher apps are imported and created on their first launch
+        self.app_registry = AppRegistry(self)
 
         lcd.init()
         self.pmu.setScreenBrightness(0)
@@ -39,16 +58,43 @@ class M5StickVSystem:
         self.led_g = None
         self.led_b = None
         self.spk_sd = None
+        # background audio that outlives the app which started it
+        self.music_player = None
+        # draw time, input latency and periodic task histograms
+        self.profiler = None
+        if config.get_config_by_key("profiler") is not False:
+            self.profiler = Profiler()
+        self.heap_tracker = None
+        if config.get_config_by_key("heap_tracker") is not False:
+            self.heap_tracker = HeapTracker()
+        self.gc_policy = GcPolicy()
+        # home pressed while top is held toggles the profiler HUD
+        self.is_top_held = False
+        self.is_swallowing_home = False
         self.is_handling_irq = False
+        self.input_queue = InputEventQueue()
+        # sleep between polls of an idle main loop instead of spinning
+        self.idle_sleep_ms = 10
+        self.scheduler = Scheduler()
+        # ~30fps cap for the render task
+        self.frame_interval_ms = 33
+        self.periodic_interval_ms = 500
+        self.task_report_interval_ms = 60000
         self.init_fm()
 
         self.is_drawing_dirty = False
+        self.is_full_redraw = False
+        self.dirty_rects = []
+        # pixels pushed to the lcd by the last frame and since boot
+        self.last_draw_pixels = 0
+        self.total_draw_pixels = 0
         self.is_boot_complete_first_draw = True
         self.show_provision()
         self.navigate(LauncherApp(self))
 
     def show_provision(self):
-        img = image.Image(resource.provision_image_path)
+        # raw RGB565 from the asset bundle when present, no JPEG decode
+        img = asset_bundle.load_image(resource.provision_image_path)
         lcd.display(img)
         del img
         lcd.draw_string(54, 6,
@@ -63,23 +109,30 @@ class M5StickVSystem:
         self.wait_event()
 
     def button_irq(self, gpio, optional_pin_num=None):
-        print("button_irq start:", gpio, optional_pin_num)
         # Notice: optional_pin_num exist in older firmware
+        # runs in IRQ context: no print, no allocation, just queue the edge
         if self.is_handling_irq:
-            print("is_handing_irq, ignore")
             return
-        self.is_handing_irq = True
-        value = gpio.value()
-        state = "released" if value else "pressed"
-        # msg = {"type": "key_event", "gpio": gpio, "state": state}
-        print("button_irq:", gpio, optional_pin_num, state)
+        self.is_handling_irq = True
+        state = STATE_RELEASED if gpio.value() else STATE_PRESSED
         if self.home_button is gpio:
-            self.on_home_button_changed(state)
+            self.input_queue.push(SOURCE_HOME, state, time.ticks_ms())
         elif self.top_button is gpio:
-            self.on_top_button_changed(state)
-        self.is_handing_irq = False
-        print("button_irq end:", gpio, optional_pin_num, state)
-        #gpio.irq(self.button_irq, GPIO.IRQ_BOTH, GPIO.WAKEUP_NOT_SUPPORT, 7)
+            self.input_queue.push(SOURCE_TOP, state, time.ticks_ms())
+        self.is_handling_irq = False
+
+    def poll_buttons(self):
+        """sample the button levels, catches edges the IRQ missed or
+        rejected as bounce, and is the only input source without IRQs"""
+        # keep button_irq out of the queue while this pushes, an edge it
+        # would have queued is sampled right here instead
+        self.is_handling_irq = True
+        now = time.ticks_ms()
+        self.input_queue.push(SOURCE_HOME, STATE_RELEASED if self.home_button.value()
+                              else STATE_PRESSED, now)
+        self.input_queue.push(SOURCE_TOP, STATE_RELEASED if self.top_button.value()
+                              else STATE_PRESSED, now)
+        self.is_handling_irq = False
 
     # noinspection SpellCheckingInspection
     def init_fm(self):
@@ -87,8 +140,8 @@ class M5StickVSystem:
         fm.register(board_info.BUTTON_A, fm.fpioa.GPIOHS21)
         # PULL_UP is required here!
         self.home_button = GPIO(GPIO.GPIOHS21, GPIO.IN, GPIO.PULL_UP)
-        # self.home_button.irq(self.button_irq, GPIO.IRQ_BOTH,
-        #                      GPIO.WAKEUP_NOT_SUPPORT, 7)
+        self.home_button.irq(self.button_irq, GPIO.IRQ_BOTH,
+                             GPIO.WAKEUP_NOT_SUPPORT, 7)
 
         if self.home_button.value() == 0:  # If don't want to run the demo
             sys.exit()
@@ -97,8 +150,8 @@ class M5StickVSystem:
         fm.register(board_info.BUTTON_B, fm.fpioa.GPIOHS22)
         # PULL_UP is required here!
         self.top_button = GPIO(GPIO.GPIOHS22, GPIO.IN, GPIO.PULL_UP)
-        # self.top_button.irq(self.button_irq, GPIO.IRQ_BOTH,
-        #                     GPIO.WAKEUP_NOT_SUPPORT, 7)
+        self.top_button.irq(self.button_irq, GPIO.IRQ_BOTH,
+                            GPIO.WAKEUP_NOT_SUPPORT, 7)
         return  # TODO: fix me
         fm.register(board_info.LED_W, fm.fpioa.GPIO3)
         self.led_w = GPIO(GPIO.GPIO3, GPIO.OUT)
@@ -116,6 +169,10 @@ class M5StickVSystem:
         self.led_b = GPIO(GPIO.GPIO6, GPIO.OUT)
         self.led_b.value(1)  # RGBW LEDs are Active Low
 
+    def init_speaker(self):
+        """route I2S0 to the speaker amplifier, called by the apps that play audio"""
+        if self.spk_sd is not None:
+            return
         fm.register(board_info.SPK_SD, fm.fpioa.GPIO0)
         self.spk_sd = GPIO(GPIO.GPIO0, GPIO.OUT)
         self.spk_sd.value(1)  # Enable the SPK output
@@ -125,9 +182,65 @@ class M5StickVSystem:
         fm.register(board_info.SPK_LRCLK, fm.fpioa.I2S0_WS)
 
     def invalidate_drawing(self):
-        print("invalidate_drawing")
+        if log.debug_on:
+            log.debug("invalidate_drawing")
+        self.is_full_redraw = True
+        self.dirty_rects = []
         self.is_drawing_dirty = True
 
+    def invalidate_rect(self, x, y, w, h):
+        # clip to the screen, a full redraw already covers everything
+        left = max(x, 0)
+        top = max(y, 0)
+        right = min(x + w, lcd.width())
+        bottom = min(y + h, lcd.height())
+        if right <= left or bottom <= top:
+            return
+        if not self.is_full_redraw:
+            merge_rect(self.dirty_rects,
+                       (left, top, right - left, bottom - top))
+        self.is_drawing_dirty = True
+
+    def draw_current_app(self):
+        is_full_redraw = self.is_full_redraw
+        rects = self.dirty_rects
+        self.is_full_redraw = False
+        self.dirty_rects = []
+        current_app = self.get_current_app()
+        if log.debug_on:
+            log.debug("on_draw start:", current_app)
+        heap_tracker = self.heap_tracker
+        if heap_tracker is not None:
+            alloc_start = heap_tracker.begin()
+        start_us = time.ticks_us()
+        pushed_start = lcd.pushed()
+        if is_full_redraw:
+            current_app.on_draw()
+        else:
+            current_app.on_draw_rects(rects)
+        # what went over the bus, an app may repaint more than the rects
+        pixels = lcd.pushed() - pushed_start
+        if log.debug_on:
+            log.debug("on_draw end, pixels:", pixels)
+        if heap_tracker is not None:
+            if is_full_redraw:
+                heap_tracker.end(current_app, "draw", alloc_start)
+            else:
+                heap_tracker.end(current_app, "draw_rects", alloc_start,
+                                 current_app.alloc_budget)
+        self.last_draw_pixels = pixels
+        self.total_draw_pixels += pixels
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.record_draw(current_app, start_us)
+            profiler.frame_shown()
+            if profiler.hud_on:
+                hud_overdrawn = is_full_redraw
+                for rect in rects:
+                    if rect_intersects(rect, profiler.hud_rect):
+                        hud_overdrawn = True
+                profiler.draw_hud(hud_overdrawn)
+
     def run(self):
         try:
             self.run_inner()
@@ -136,7 +249,11 @@ class M5StickVSystem:
             string_io = uio.StringIO()
             sys.print_exception(e, string_io)
             s = string_io.getvalue()
-            print("showing blue screen:", s)
+            log.error("showing blue screen:", s)
+            try:
+                logger.dump()
+            except Exception as dump_error:
+                print("cannot dump log:", dump_error)
             lcd.clear(lcd.BLUE)
             msg = "** " + str(e)
             chunks, chunk_size = len(msg), 29
@@ -156,72 +273,155 @@ class M5StickVSystem:
             lcd.draw_string(1, current_y, s, lcd.WHITE, lcd.BLUE)
             lcd.draw_string(
                 1, lcd.height() - 17, "Will reboot after 10 seconds..", lcd.WHITE, lcd.BLUE)
+            self.prepare_power_off()
             time.sleep(10)
             machine.reset()
 
     def wait_event(self):
-        """key event or view invalidate event"""
-        print("wait for all key release")
-        while self.home_button.value() == 0 or self.top_button.value() == 0:
-            pass
-        print("key released, now wait for a event")
-        while self.home_button.value() == 1 and self.top_button.value() == 1 and not self.is_drawing_dirty:
-            pass
-        print("some event arrived")
-        if self.is_drawing_dirty:
-            print("drawing dirty event")
-            return ("drawing", "dirty")
-        elif self.home_button.value() == 0:
-            print("home_button pressed")
-            return (self.home_button, "pressed")
-            self.on_home_button_changed("pressed")
-        elif self.top_button.value() == 0:
-            print("top_button pressed")
-            return (self.top_button, "pressed")
-            self.on_top_button_changed("pressed")
-        else:
-            return None
+        """key event or view invalidate event, sleeps while idle"""
+        while True:
+            self.deferred_queue.run_pending()
+            if self.is_drawing_dirty:
+                return ("drawing", "dirty")
+            event = self.input_queue.pop()
+            if event is not None:
+                source, state, _ = event
+                button = self.home_button if source == SOURCE_HOME else self.top_button
+                if log.debug_on:
+                    log.debug("button event:", source, state_names[state])
+                return (button, state_names[state])
+            self.poll_buttons()
+            if self.input_queue.is_empty():
+                time.sleep_ms(self.idle_sleep_ms)
 
     def check_restore_brightness(self):
         if self.is_boot_complete_first_draw:
             self.is_boot_complete_first_draw = False
+            log.info("boot: first frame at %dms, %dms after system init, heap %d bytes used %d free" %
+                     (time.ticks_ms(), time.ticks_diff(time.ticks_ms(), self.boot_start_ms),
+                      gc.mem_alloc(), gc.mem_free()))
+            if config.get_config_by_key("asset_timing"):
+                paths = [resource.provision_image_path, resource.arrow_icon_path]
+                paths += [app["icon"] for app in resource.app_list]
+                paths += resource.battery_icon_list + resource.battery_charging_icon_list
+                asset_bundle.report_timing(paths)
             self.pmu.setScreenBrightness(
                 config.get_brightness())  # 7-15 is ok, normally 8
 
     def run_inner(self):
+        self.scheduler.run([
+            ("input", self.input_loop()),
+            ("render", self.render_loop()),
+            ("periodic", self.periodic_loop()),
+        ])
+
+    def dispatch_event(self, event_info):
+        button, state = event_info
+        if button == self.home_button:
+            self.on_home_button_changed(state)
+        elif button == self.top_button:
+            self.on_top_button_changed(state)
+
+    async def input_loop(self):
         while True:
+            if self.deferred_queue.depth() > 0:
+                start_us = time.ticks_us()
+                self.deferred_queue.run_pending()
+                self.scheduler.account("deferred", start_us)
+            event = self.input_queue.pop()
+            if event is None:
+                self.poll_buttons()
+                event = self.input_queue.pop()
+            if event is None:
+                if not self.is_drawing_dirty:
+                    self.gc_policy.on_idle()
+                await sleep_ms(self.idle_sleep_ms)
+                continue
+            start_us = time.ticks_us()
+            source, state, event_ms = event
+            if self.handle_hud_chord(source, state):
+                continue
+            button = self.home_button if source == SOURCE_HOME else self.top_button
+            if log.debug_on:
+                log.debug("button event:", source, state_names[state])
+            self.dispatch_event((button, state_names[state]))
+            if self.profiler is not None:
+                self.profiler.event_dispatched(event_ms, self.is_drawing_dirty)
+            self.scheduler.account("input", start_us)
+            # let the render task show the result before the next event
+            await sleep_ms(0)
+
+    async def render_loop(self):
+        while True:
+            frame_start = time.ticks_ms()
             if self.is_drawing_dirty:
-                print("drawing is dirty")
                 self.is_drawing_dirty = False
-                current_app = self.get_current_app()
-                # print("before on_draw() of", current_app, "free memory:", gc.mem_free())
-                print("current_app.on_draw() start")
-                current_app.on_draw()
-                print("current_app.on_draw() end")
-                # print("on_draw() of", current_app, "called, free memory:", gc.mem_free())
-                # this gc is to avoid: "core dump: misaligned load" error
-                # print("after gc.collect(), free memory:", gc.mem_free())
+                start_us = time.ticks_us()
+                self.draw_current_app()
                 self.check_restore_brightness()
-                # print("sleep_ms for 1ms")
-                # time.sleep_ms(1)
-                # print("sleep_ms for 1ms end")
-            else:
-                event_info = self.wait_event()
-                if event_info is not None and len(event_info) == 2:
-                    event = event_info[0]
-                    state = event_info[1]
-                    if event == self.home_button:
-                        self.on_home_button_changed(state)
-                    elif event == self.top_button:
-                        self.on_top_button_changed(state)
+                self.scheduler.account("render", start_us)
+            # frame pacing: at most one frame per frame_interval_ms
+            elapsed = time.ticks_diff(time.ticks_ms(), frame_start)
+            await sleep_ms(max(self.frame_interval_ms - elapsed, 0))
+
+    async def periodic_loop(self):
+        last_report = time.ticks_ms()
+        while True:
+            await sleep_ms(self.periodic_interval_ms)
+            # log records reach the sd card in batches, never per record
+            logger.flush_if_needed()
+            # settings are written once they stopped changing
+            config.flush_config()
+            if time.ticks_diff(time.ticks_ms(), last_report) >= self.task_report_interval_ms:
+                last_report = time.ticks_ms()
+                self.scheduler.report()
+                self.deferred_queue.report()
+                if self.profiler is not None:
+                    self.profiler.export_csv()
+                if self.heap_tracker is not None:
+                    self.heap_tracker.report()
+                self.gc_policy.report()
+
+    def handle_hud_chord(self, source, state):
+        """home pressed while top is held toggles the profiler HUD, that
+        home press and its release never reach the app"""
+        if source == SOURCE_TOP:
+            self.is_top_held = state == STATE_PRESSED
+            return False
+        if self.is_swallowing_home:
+            if state == STATE_RELEASED:
+                self.is_swallowing_home = False
+            return True
+        if state == STATE_PRESSED and self.is_top_held and self.profiler is not None:
+            self.is_swallowing_home = True
+            log.info("profiler HUD", "on" if self.profiler.toggle_hud() else "off")
+            # full redraw paints the HUD or wipes it
+            self.invalidate_drawing()
+            return True
+        return False
+
+    def add_app_task(self, app, name, step, interval_ms=0):
+        return self.scheduler.add_app_task(app, name, step, interval_ms)
 
     def navigate(self, app):
+        current = self.get_current_app()
+        if current is app:
+            return
+        if current is not None:
+            current.on_pause()
         self.app_stack.append(app)
+        app.on_resume()
         self.invalidate_drawing()
 
     def navigate_back(self):
-        if len(self.app_stack) > 0:
-            self.app_stack.pop()
+        # the launcher at the bottom of the stack is never popped
+        if len(self.app_stack) > 1:
+            app = self.app_stack.pop()
+            self.scheduler.cancel_app_tasks(app)
+            app.on_pause()
+            self.get_current_app().on_resume()
+            # the registry may destroy it now that it left the stack
+            self.app_registry.trim()
         self.invalidate_drawing()
 
     def get_current_app(self):
@@ -229,32 +429,61 @@ class M5StickVSystem:
 
     def on_pek_button_pressed(self, axp):
         # treat short press as navigate back
-        print("on_pek_button_pressed", axp)
+        log.info("on_pek_button_pressed")
         handled = False
         current_app = self.get_current_app()
         if current_app:
             try:
                 handled = current_app.on_back_pressed()
             except NeedRebootException:
+                self.prepare_power_off()
                 machine.reset()
         if not handled:
-            print("on_back_pressed() not handled, exit current app")
+            log.debug("on_back_pressed() not handled, exit current app")
             self.navigate_back()
 
+    def prepare_power_off(self):
+        """write what is still pending before a reset or sleep"""
+        try:
+            config.flush_config(True)
+            if self.power_telemetry is not None:
+                # the pending batch holds up to 32 minute and ten minute records
+                self.power_telemetry.flush()
+            logger.flush()
+        except Exception as e:
+            log.error("cannot flush before power off:", e)
+
     def system_periodic_task(self, axp):
+        profiler = self.profiler
+        if self.power_telemetry is not None:
+            start_us = time.ticks_us()
+            self.power_telemetry.tick(axp)
+            if profiler is not None:
+                profiler.record("periodic:telemetry", start_us)
         current = self.get_current_app()
         if current:
+            heap_tracker = self.heap_tracker
+            if heap_tracker is not None:
+                alloc_start = heap_tracker.begin()
+            start_us = time.ticks_us()
             current.app_periodic_task()
+            if profiler is not None:
+                profiler.record("periodic:app", start_us)
+            if heap_tracker is not None:
+                heap_tracker.end(current, "periodic", alloc_start, current.alloc_budget)
 
     # noinspection PyMethodMayBeStatic
     def on_pek_button_long_pressed(self, axp):
-        print("on_pek_button_long_pressed", axp)
+        log.info("on_pek_button_long_pressed")
+        self.prepare_power_off()
         axp.setEnterSleepMode()
 
     def on_home_button_changed(self, state):
-        print("on_home_button_changed", state)
+        if log.debug_on:
+            log.debug("on_home_button_changed", state)
         self.get_current_app().on_home_button_changed(state)
 
     def on_top_button_changed(self, state):
-        print("on_top_button_changed", state)
+        if log.debug_on:
+            log.debug("on_top_button_changed", state)
         self.get_current_app().on_top_button_changed(state)
@@ -1,8 +1,17 @@
 
 
 # start of pmu.py
+import time
 from machine import I2C, Timer
 
+import logger
+
+log = logger.get_logger("pmu")
+
+# ADC data registers fetched by AXP192.snapshot()
+ADC_FIRST_REG = 0x56
+ADC_LAST_REG = 0x7D
+
 
 class PMUError(Exception):
     pass
@@ -17,7 +26,7 @@ class OutOfRange(PMUError):
 
 
 class AXP192:
-    def __init__(self, i2c_dev=None):
+    def __init__(self, i2c_dev=None, deferred_queue=None, snapshot_ttl_ms=200):
         if i2c_dev is None:
             try:
                 self.i2cDev = I2C(I2C.I2C0, freq=400000, scl=28, sda=29)
@@ -28,10 +37,23 @@ class AXP192:
 
         self.axp192Addr = 52
 
+        # reused buffers, the getters are served from the last snapshot
+        # until it is older than snapshot_ttl_ms
+        self.read_buf = bytearray(8)
+        self.read_mv = memoryview(self.read_buf)
+        self.adc_buf = bytearray(ADC_LAST_REG - ADC_FIRST_REG + 1)
+        self.status_buf = bytearray(2)
+        self.snapshot_ttl_ms = snapshot_ttl_ms
+        self.snapshot_ticks = None
+
         self.__preButPressed__ = -1
         self.onPressedListener = None
         self.onLongPressedListener = None
         self.system_periodic_task = None
+        # the timer callback only posts this bound method, the I2C reads
+        # and listeners run later from the main loop
+        self.deferred_queue = deferred_queue
+        self.check_power_key_ref = self.check_power_key
         scan_list = self.i2cDev.scan()
         if self.axp192Addr not in scan_list:
             raise NotFoundError
@@ -47,27 +69,32 @@ class AXP192:
     def set_system_periodic_task(self, task):
         self.system_periodic_task = task
 
+    def set_deferred_queue(self, queue):
+        self.deferred_queue = queue
+
     def __chkPwrKeyWaitForSleep__(self, timer):
+        if self.deferred_queue is None:
+            self.check_power_key()
+        else:
+            self.deferred_queue.post(self.check_power_key_ref, None)
+
+    def check_power_key(self, arg=None):
         if self.system_periodic_task:
             self.system_periodic_task(self)
-        self.i2cDev.writeto(52, bytes([0x46]))
-        pek_stu = (self.i2cDev.readfrom(52, 1))[0]
+        pek_stu = self.read_regs(0x46, 1)[0]
         self.i2cDev.writeto_mem(52, 0x46, 0xFF, mem_size=8)  # Clear IRQ
 
         # Prevent loop in restart, wait for release
         if self.__preButPressed__ == -1 and ((pek_stu & (0x01 << 1)) or (pek_stu & 0x01)):
-            # print("return")
             return
 
         if self.__preButPressed__ == -1 and ((pek_stu & (0x01 << 1)) == False and (pek_stu & 0x01) == False):
             self.__preButPressed__ = 0
-            print("self.__preButPressed__ == 0")
+            log.debug("power key released after boot")
 
         if pek_stu & 0x01:
-            print("before enter sleep")
             if self.onLongPressedListener:
                 self.onLongPressedListener(self)
-            print("after enter sleep is never called")
 
         if pek_stu & (0x01 << 1):
             if self.onPressedListener:
@@ -81,6 +108,35 @@ class AXP192:
         self.i2cDev.writeto(self.axp192Addr, bytes([reg_address]))
         return (self.i2cDev.readfrom(self.axp192Addr, 1))[0]
 
+    def read_regs(self, start, n):
+        """burst read n registers in one transaction, the result is a view
+        into a reused buffer and is only valid until the next call"""
+        if n > len(self.read_buf):
+            raise OutOfRange("Burst read is limited to %d registers" % len(self.read_buf))
+        buf = self.read_mv[:n]
+        self.i2cDev.readfrom_mem_into(self.axp192Addr, start, buf, mem_size=8)
+        return buf
+
+    def snapshot(self):
+        """fetch the power status and all ADC registers in two transfers"""
+        self.i2cDev.readfrom_mem_into(
+            self.axp192Addr, 0x00, self.status_buf, mem_size=8)
+        self.i2cDev.readfrom_mem_into(
+            self.axp192Addr, ADC_FIRST_REG, self.adc_buf, mem_size=8)
+        self.snapshot_ticks = time.ticks_ms()
+
+    def __fresh_snapshot(self):
+        if self.snapshot_ticks is None or \
+                time.ticks_diff(time.ticks_ms(), self.snapshot_ticks) >= self.snapshot_ttl_ms:
+            self.snapshot()
+
+    def get_adc_raw(self, high_reg, low_bits=4):
+        """raw ADC count, high_reg holds the upper 8 bits and the next
+        register the lower low_bits"""
+        self.__fresh_snapshot()
+        offset = high_reg - ADC_FIRST_REG
+        return (self.adc_buf[offset] << low_bits) + self.adc_buf[offset + 1]
+
     def __is_bit_set(self, byte_data, bit_index):
         return byte_data & (1 << bit_index) != 0
 
@@ -102,89 +158,57 @@ class AXP192:
     def clear_coulomb_counter(self):
         self.__write_reg(0xB8, 0xA0)
 
-    def __get_coulomb_charge_data(self):
-        CoulombCounter_LSB = self.__read_reg(0xB0)
-        CoulombCounter_B1 = self.__read_reg(0xB1)
-        CoulombCounter_B2 = self.__read_reg(0xB2)
-        CoulombCounter_MSB = self.__read_reg(0xB3)
-
-        return ((CoulombCounter_LSB << 24) + (CoulombCounter_B1 << 16) +
-                (CoulombCounter_B2 << 8) + CoulombCounter_MSB)
-
-    def __get_coulomb_discharge_data(self):
-        CoulombCounter_LSB = self.__read_reg(0xB4)
-        CoulombCounter_B1 = self.__read_reg(0xB5)
-        CoulombCounter_B2 = self.__read_reg(0xB6)
-        CoulombCounter_MSB = self.__read_reg(0xB7)
-
-        return ((CoulombCounter_LSB << 24) + (CoulombCounter_B1 << 16) +
-                (CoulombCounter_B2 << 8) + CoulombCounter_MSB)
+    def get_coulomb_raw(self):
+        """(charge, discharge) counters read in one burst"""
+        data = self.read_regs(0xB0, 8)
+        charge = (data[0] << 24) + (data[1] << 16) + (data[2] << 8) + data[3]
+        discharge = (data[4] << 24) + (data[5] << 16) + (data[6] << 8) + data[7]
+        return charge, discharge
 
     def get_coulomb_counter_data(self):
-        return 65536 * 0.5 * (self.__get_coulomb_charge_data() -
-                              self.__get_coulomb_discharge_data) / 3600.0 / 25.0
+        charge, discharge = self.get_coulomb_raw()
+        return 65536 * 0.5 * (charge - discharge) / 3600.0 / 25.0
 
     def getVbatVoltage(self):
-        Vbat_LSB = self.__read_reg(0x78)
-        Vbat_MSB = self.__read_reg(0x79)
-
-        return ((Vbat_LSB << 4) + Vbat_MSB) * 1.1  # AXP192-DS PG26 1.1mV/div
+        return self.get_adc_raw(0x78) * 1.1  # AXP192-DS PG26 1.1mV/div
 
     def is_usb_plugged_in(self):
-        power_data = self.__read_reg(0x00)
+        self.__fresh_snapshot()
+        power_data = self.status_buf[0]
         return self.__is_bit_set(power_data, 6) and self.__is_bit_set(power_data, 7)
 
     def getUSBVoltage(self):
-        Vin_LSB = self.__read_reg(0x56)
-        Vin_MSB = self.__read_reg(0x57)
-
-        return ((Vin_LSB << 4) + Vin_MSB) * 1.7  # AXP192-DS PG26 1.7mV/div
+        return self.get_adc_raw(0x56) * 1.7  # AXP192-DS PG26 1.7mV/div
 
     def getUSBInputCurrent(self):
-        Iin_LSB = self.__read_reg(0x58)
-        Iin_MSB = self.__read_reg(0x59)
-
-        return ((Iin_LSB << 4) + Iin_MSB) * 0.625  # AXP192-DS PG26 0.625mA/div
+        return self.get_adc_raw(0x58) * 0.625  # AXP192-DS PG26 0.625mA/div
 
     def getConnextVoltage(self):
-        Vcnx_LSB = self.__read_reg(0x5A)
-        Vcnx_MSB = self.__read_reg(0x5B)
-
-        return ((Vcnx_LSB << 4) + Vcnx_MSB) * 1.7  # AXP192-DS PG26 1.7mV/div
+        return self.get_adc_raw(0x5A) * 1.7  # AXP192-DS PG26 1.7mV/div
 
     def getConnextInputCurrent(self):
-        IinCnx_LSB = self.__read_reg(0x5C)
-        IinCnx_MSB = self.__read_reg(0x5D)
-
         # AXP192-DS PG26 0.625mA/div
-        return ((IinCnx_LSB << 4) + IinCnx_MSB) * 0.625
+        return self.get_adc_raw(0x5C) * 0.625
 
     def getBatteryChargeCurrent(self):
-        Ichg_LSB = self.__read_reg(0x7A)
-        Ichg_MSB = self.__read_reg(0x7B)
-
-        return ((Ichg_LSB << 5) + Ichg_MSB) * 0.5  # AXP192-DS PG27 0.5mA/div
+        return self.get_adc_raw(0x7A, 5) * 0.5  # AXP192-DS PG27 0.5mA/div
 
     def getBatteryDischargeCurrent(self):
-        Idcg_LSB = self.__read_reg(0x7C)
-        Idcg_MSB = self.__read_reg(0x7D)
-
-        return ((Idcg_LSB << 5) + Idcg_MSB) * 0.5  # AXP192-DS PG27 0.5mA/div
+        return self.get_adc_raw(0x7C, 5) * 0.5  # AXP192-DS PG27 0.5mA/div
 
     def getBatteryInstantWatts(self):
-        Iinswat_LSB = self.__read_reg(0x70)
-        Iinswat_B2 = self.__read_reg(0x71)
-        Iinswat_MSB = self.__read_reg(0x72)
+        self.__fresh_snapshot()
+        offset = 0x70 - ADC_FIRST_REG
+        Iinswat_LSB = self.adc_buf[offset]
+        Iinswat_B2 = self.adc_buf[offset + 1]
+        Iinswat_MSB = self.adc_buf[offset + 2]
 
         # AXP192-DS PG32 0.5mA*1.1mV/1000/mW
         return ((Iinswat_LSB << 16) + (Iinswat_B2 << 8) + Iinswat_MSB) * 1.1 * 0.5 / 1000
 
     def getTemperature(self):
-        Temp_LSB = self.__read_reg(0x5E)
-        Temp_MSB = self.__read_reg(0x5F)
-
         # AXP192-DS PG26 0.1degC/div -144.7degC Biased
-        return (((Temp_LSB << 4) + Temp_MSB) * 0.1) - 144.7
+        return (self.get_adc_raw(0x5E) * 0.1) - 144.7
 
     def setK210Vcore(self, vol):
         if vol > 1.05 or vol < 0.8:
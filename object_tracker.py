@@ -0,0 +1,129 @@
+def iou(a, b):
+    """intersection over union of two (x, y, w, h) boxes"""
+    left = max(a[0], b[0])
+    top = max(a[1], b[1])
+    right = min(a[0] + a[2], b[0] + b[2])
+    bottom = min(a[1] + a[3], b[1] + b[3])
+    if right <= left or bottom <= top:
+        return 0.0
+    inter = (right - left) * (bottom - top)
+    return inter / (a[2] * a[3] + b[2] * b[3] - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, confidence, frame):
+        self.id = track_id
+        self.x = float(box[0])
+        self.y = float(box[1])
+        self.w = box[2]
+        self.h = box[3]
+        self.vx = 0.0
+        self.vy = 0.0
+        self.confidence = confidence
+        self.misses = 0
+        # position and frame of the last detection, velocity is measured
+        # between detections
+        self.detected_x = self.x
+        self.detected_y = self.y
+        self.detected_frame = frame
+
+    def rect(self):
+        return (int(self.x), int(self.y), self.w, self.h)
+
+    def predict(self):
+        self.x += self.vx
+        self.y += self.vy
+
+    def correct(self, box, confidence, frame):
+        frames = frame - self.detected_frame
+        if frames > 0:
+            self.vx = (box[0] - self.detected_x) / frames
+            self.vy = (box[1] - self.detected_y) / frames
+        self.x = self.detected_x = float(box[0])
+        self.y = self.detected_y = float(box[1])
+        self.w = box[2]
+        self.h = box[3]
+        self.detected_frame = frame
+        self.confidence = confidence
+        self.misses = 0
+
+
+class ObjectTracker:
+    """runs the detector only every detect_interval frames, or sooner when
+    confidence drops or nothing is tracked, and moves the tracked boxes
+    by their velocity on the frames in between
+
+    Detections are (x, y, w, h, confidence) tuples, tracks keep stable ids
+    by greedy IoU matching."""
+
+    def __init__(self, detect_interval=3, min_confidence=0.6, iou_threshold=0.3, max_misses=2):
+        self.detect_interval = detect_interval
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 1
+        self.frame = 0
+        self.last_detect_frame = None
+        self.detections_run = 0
+
+    def need_detection(self):
+        if self.last_detect_frame is None or len(self.tracks) == 0:
+            return True
+        if self.frame - self.last_detect_frame >= self.detect_interval:
+            return True
+        for track in self.tracks:
+            if track.confidence < self.min_confidence:
+                return True
+        return False
+
+    def step(self, detect, arg):
+        """advance one frame, detect(arg) is only called when needed and
+        returns a list of detections. Returns the current tracks"""
+        self.frame += 1
+        if self.need_detection():
+            self.update(detect(arg))
+        else:
+            for track in self.tracks:
+                track.predict()
+        return self.tracks
+
+    def update(self, detections):
+        self.detections_run += 1
+        self.last_detect_frame = self.frame
+        for track in self.tracks:
+            track.predict()
+        unmatched = list(range(len(detections)))
+        matched_tracks = []
+        # best IoU pairs first
+        pairs = []
+        for t in range(len(self.tracks)):
+            rect = self.tracks[t].rect()
+            for d in range(len(detections)):
+                overlap = iou(rect, detections[d])
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, t, d))
+        pairs.sort(reverse=True)
+        for _, t, d in pairs:
+            if t in matched_tracks or d not in unmatched:
+                continue
+            detection = detections[d]
+            self.tracks[t].correct(detection, detection[4], self.frame)
+            matched_tracks.append(t)
+            unmatched.remove(d)
+        kept = []
+        for t in range(len(self.tracks)):
+            track = self.tracks[t]
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            kept.append(track)
+        for d in unmatched:
+            detection = detections[d]
+            kept.append(Track(self.next_id, detection, detection[4], self.frame))
+            self.next_id += 1
+        self.tracks = kept
+
+    def detections_saved(self):
+        return self.frame - self.detections_run
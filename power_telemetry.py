@@ -0,0 +1,144 @@
+import struct
+import time
+from array import array
+
+import logger
+
+log = logger.get_logger("power")
+
+# (name, high register, low bits) of every recorded AXP192 ADC channel
+channels = (
+    ("vbat", 0x78, 4),
+    ("charge_current", 0x7A, 5),
+    ("discharge_current", 0x7C, 5),
+    ("vbus", 0x56, 4),
+    ("temperature", 0x5E, 4),
+)
+CHANNEL_COUNT = len(channels)
+
+# tier 0 holds 1 s samples, tier 1 averages 60 of them, tier 2 averages
+# 10 tier 1 samples: (samples per entry from the tier below, ring capacity)
+tiers = ((1, 300), (60, 240), (10, 288))
+TIER_SECONDS = (1, 60, 600)
+
+log_path = "/sd/power_log.bin"
+FILE_MAGIC = b"PWRT"
+FILE_VERSION = 1
+# magic, version, channel count, record size
+HEADER_FORMAT = "<4sBBH"
+# tier, flags, seconds since start, one raw ADC count per channel
+RECORD_FORMAT = "<BBI" + "H" * CHANNEL_COUNT
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+# flags: the first record written since boot, seconds restart from 0 there
+FLAG_BOOT = 0x01
+
+
+class PowerTelemetry:
+    """samples the PMU once per second into array('H') rings, downsamples
+    them into minute and ten minute tiers and appends the coarse tiers to
+    the SD card in batches. Nothing is allocated per sample."""
+
+    def __init__(self, path=log_path, persist_min_tier=1, batch_records=32):
+        self.path = path
+        self.persist_min_tier = persist_min_tier
+        self.rings = []
+        self.heads = array('H', [0] * len(tiers))
+        self.counts = array('H', [0] * len(tiers))
+        for _, capacity in tiers:
+            self.rings.append(array('H', [0] * (capacity * CHANNEL_COUNT)))
+        # running sums feeding the tier above, and how many samples they hold
+        self.sums = array('I', [0] * (len(tiers) * CHANNEL_COUNT))
+        self.sum_counts = array('H', [0] * len(tiers))
+        self.sample = array('H', [0] * CHANNEL_COUNT)
+        self.seconds = 0
+        self.last_sample_ticks = None
+        self.batch = bytearray(RECORD_SIZE * batch_records)
+        self.batch_records = batch_records
+        self.batch_count = 0
+        self.records_written = 0
+        # the next record is the first one of this boot
+        self.flags = FLAG_BOOT
+
+    def tick(self, axp):
+        """called from the system periodic task, samples at most once per second"""
+        now = time.ticks_ms()
+        if self.last_sample_ticks is not None and \
+                time.ticks_diff(now, self.last_sample_ticks) < 1000:
+            return
+        self.last_sample_ticks = now
+        sample = self.sample
+        for i in range(CHANNEL_COUNT):
+            _, reg, low_bits = channels[i]
+            sample[i] = axp.get_adc_raw(reg, low_bits)
+        self.seconds += 1
+        self.add(0, sample)
+
+    def add(self, tier, sample):
+        capacity = tiers[tier][1]
+        ring = self.rings[tier]
+        base = self.heads[tier] * CHANNEL_COUNT
+        for i in range(CHANNEL_COUNT):
+            ring[base + i] = sample[i]
+        self.heads[tier] = (self.heads[tier] + 1) % capacity
+        if self.counts[tier] < capacity:
+            self.counts[tier] += 1
+        if tier >= self.persist_min_tier:
+            self.append_record(tier, sample)
+        upper = tier + 1
+        if upper >= len(tiers):
+            return
+        sums_base = upper * CHANNEL_COUNT
+        for i in range(CHANNEL_COUNT):
+            self.sums[sums_base + i] += sample[i]
+        self.sum_counts[upper] += 1
+        n = tiers[upper][0]
+        if self.sum_counts[upper] < n:
+            return
+        # the sample buffer of this tier is free again, reuse it for the average
+        for i in range(CHANNEL_COUNT):
+            sample[i] = self.sums[sums_base + i] // n
+            self.sums[sums_base + i] = 0
+        self.sum_counts[upper] = 0
+        self.add(upper, sample)
+
+    def latest(self, tier, channel):
+        if self.counts[tier] == 0:
+            return None
+        index = (self.heads[tier] - 1) % tiers[tier][1]
+        return self.rings[tier][index * CHANNEL_COUNT + channel]
+
+    def history(self, tier, channel):
+        """oldest first"""
+        capacity = tiers[tier][1]
+        count = self.counts[tier]
+        start = (self.heads[tier] - count) % capacity
+        ring = self.rings[tier]
+        for i in range(count):
+            yield ring[((start + i) % capacity) * CHANNEL_COUNT + channel]
+
+    def append_record(self, tier, sample):
+        s = sample
+        struct.pack_into(RECORD_FORMAT, self.batch, self.batch_count * RECORD_SIZE,
+                         tier, self.flags, self.seconds, s[0], s[1], s[2], s[3], s[4])
+        self.flags = 0
+        self.batch_count += 1
+        if self.batch_count == self.batch_records:
+            self.flush()
+
+    def flush(self):
+        if self.batch_count == 0:
+            return
+        try:
+            f = open(self.path, "ab")
+            if f.tell() == 0:
+                f.write(struct.pack(HEADER_FORMAT, FILE_MAGIC, FILE_VERSION,
+                                    CHANNEL_COUNT, RECORD_SIZE))
+            if self.batch_count == self.batch_records:
+                f.write(self.batch)
+            else:
+                f.write(memoryview(self.batch)[:self.batch_count * RECORD_SIZE])
+            f.close()
+            self.records_written += self.batch_count
+        except OSError as e:
+            log.warn("flush failed:", e)
+        self.batch_count = 0
@@ -0,0 +1,151 @@
+import time
+from array import array
+
+import lcd_meter as lcd
+import logger
+from text_cache import TextField
+
+log = logger.get_logger("profiler")
+
+# bucket i counts samples of [2^i, 2^(i+1)) us, the last one is open ended
+BUCKET_COUNT = 24
+default_csv_path = "/sd/profile.csv"
+
+
+def bucket_of(us):
+    bucket = 0
+    while us > 1 and bucket < BUCKET_COUNT - 1:
+        us >>= 1
+        bucket += 1
+    return bucket
+
+
+class Histogram:
+    """fixed log2 buckets, add() never allocates"""
+
+    def __init__(self):
+        self.buckets = array('I', [0] * BUCKET_COUNT)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def add(self, us):
+        if us < 0:
+            us = 0
+        self.buckets[bucket_of(us)] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def percentile(self, percent):
+        """upper bound of the bucket holding the given percentile"""
+        if self.count == 0:
+            return 0
+        target = (self.count * percent + 99) // 100
+        seen = 0
+        for i in range(BUCKET_COUNT):
+            seen += self.buckets[i]
+            if seen >= target:
+                return min(1 << (i + 1), self.max_us)
+        return self.max_us
+
+    def average(self):
+        return self.total_us // max(self.count, 1)
+
+
+class Profiler:
+    """histograms of draw time per app, input to photon latency and
+    periodic task time, shown by a small HUD and exported as CSV"""
+
+    def __init__(self, csv_path=default_csv_path):
+        self.csv_path = csv_path
+        # name -> Histogram, "draw:<App>", "latency", "periodic:<task>"
+        self.histograms = {}
+        # app class -> its draw histogram, no string building per frame
+        self.draw_histograms = {}
+        self.latency = self.histogram("latency")
+        # ticks_ms of the oldest event whose redraw is not on screen yet
+        self.pending_event_ms = None
+        self.hud_on = False
+        self.hud_lines = None
+        self.hud_rect = (0, lcd.height() - 32, lcd.width(), 32)
+        self.last_draw_histogram = None
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = Histogram()
+            self.histograms[name] = hist
+        return hist
+
+    def record(self, name, start_us):
+        elapsed = time.ticks_diff(time.ticks_us(), start_us)
+        self.histogram(name).add(elapsed)
+        return elapsed
+
+    def record_draw(self, app, start_us):
+        elapsed = time.ticks_diff(time.ticks_us(), start_us)
+        app_class = type(app)
+        hist = self.draw_histograms.get(app_class)
+        if hist is None:
+            hist = self.histogram("draw:" + app_class.__name__)
+            self.draw_histograms[app_class] = hist
+        hist.add(elapsed)
+        self.last_draw_histogram = hist
+        return elapsed
+
+    def event_dispatched(self, event_ms, needs_redraw):
+        """an input event was handled, its latency ends with the next frame"""
+        if needs_redraw and self.pending_event_ms is None:
+            self.pending_event_ms = event_ms
+
+    def frame_shown(self):
+        if self.pending_event_ms is not None:
+            self.latency.add(time.ticks_diff(time.ticks_ms(), self.pending_event_ms) * 1000)
+            self.pending_event_ms = None
+
+    def toggle_hud(self):
+        self.hud_on = not self.hud_on
+        if self.hud_lines is None:
+            y = self.hud_rect[1]
+            self.hud_lines = (TextField(0, y, 30, (255, 255, 0), (0, 0, 0)),
+                              TextField(0, y + 16, 30, (255, 255, 0), (0, 0, 0)))
+        for line in self.hud_lines:
+            line.reset()
+        return self.hud_on
+
+    def draw_hud(self, repaint):
+        """repaint when the app drew over the HUD, otherwise only the
+        changed cells are pushed"""
+        if not self.hud_on:
+            return
+        draw = self.last_draw_histogram
+        lat = self.latency
+        if repaint:
+            for line in self.hud_lines:
+                line.reset()
+        if draw is not None:
+            self.hud_lines[0].set("draw p50 %dus p95 %dus" %
+                                  (draw.percentile(50), draw.percentile(95)))
+        self.hud_lines[1].set("lat p50 %dms p95 %dms n%d" %
+                              (lat.percentile(50) // 1000, lat.percentile(95) // 1000, lat.count))
+
+    def export_csv(self, path=None):
+        path = path if path is not None else self.csv_path
+        try:
+            with open(path, "w") as f:
+                f.write("name,count,avg_us,max_us,p50_us,p95_us,p99_us")
+                for i in range(BUCKET_COUNT):
+                    f.write(",lt_%dus" % (1 << (i + 1)))
+                f.write("\n")
+                for name in sorted(self.histograms.keys()):
+                    hist = self.histograms[name]
+                    f.write("%s,%d,%d,%d,%d,%d,%d" %
+                            (name, hist.count, hist.average(), hist.max_us,
+                             hist.percentile(50), hist.percentile(95), hist.percentile(99)))
+                    for count in hist.buckets:
+                        f.write(",%d" % count)
+                    f.write("\n")
+        except OSError as e:
+            log.warn("profiler export failed:", e)
@@ -0,0 +1,110 @@
+try:
+    import uasyncio as asyncio
+except ImportError:
+    # CPython stand-in for running on the host
+    import asyncio
+import time
+
+import logger
+
+log = logger.get_logger("scheduler")
+
+if hasattr(asyncio, "sleep_ms"):
+    sleep_ms = asyncio.sleep_ms
+else:
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+
+class Scheduler:
+    """cooperative scheduler for the system main loop
+
+    Every task body reports its runtime through account(), so a task
+    hogging the CPU shows up in the stats instead of silently starving
+    input handling."""
+
+    def __init__(self):
+        # name -> [runs, total_us, max_us, slow_runs]
+        self.task_stats = {}
+        # [name, owner, step, interval_ms, alive] of app-owned tasks
+        self.app_tasks = []
+        self.slow_task_us = 50000
+        self.error = None
+        self.error_event = None
+
+    def account(self, name, start_us):
+        elapsed = time.ticks_diff(time.ticks_us(), start_us)
+        stats = self.task_stats.get(name)
+        if stats is None:
+            stats = [0, 0, 0, 0]
+            self.task_stats[name] = stats
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        if elapsed > self.slow_task_us:
+            # counted only, a camera frame is a slow slice on every frame
+            stats[3] += 1
+            if log.debug_on:
+                log.debug("slow task", name, elapsed, "us")
+        return elapsed
+
+    def report(self):
+        if not log.debug_on:
+            return
+        for name in self.task_stats:
+            runs, total_us, max_us, slow_runs = self.task_stats[name]
+            log.debug("task %s: runs=%d total=%dus avg=%dus max=%dus slow=%d" %
+                      (name, runs, total_us, total_us // max(runs, 1), max_us, slow_runs))
+
+    def fail(self, e):
+        if self.error is None:
+            self.error = e
+            self.error_event.set()
+
+    async def guard(self, name, coro):
+        try:
+            await coro
+        except Exception as e:
+            log.error("task", name, "failed:", e)
+            self.fail(e)
+
+    def spawn(self, name, coro):
+        return asyncio.create_task(self.guard(name, coro))
+
+    async def run_app_task(self, task):
+        name, _, step, interval_ms, _ = task
+        while task[4]:
+            start_us = time.ticks_us()
+            delay_ms = step()
+            self.account(name, start_us)
+            if delay_ms is None:
+                break
+            await sleep_ms(delay_ms if delay_ms > interval_ms else interval_ms)
+        task[4] = False
+        if task in self.app_tasks:
+            self.app_tasks.remove(task)
+
+    def add_app_task(self, owner, name, step, interval_ms=0):
+        """step() runs one slice of work and returns the delay in ms until
+        the next slice, or None when the task is done"""
+        task = [name, owner, step, interval_ms, True]
+        self.app_tasks.append(task)
+        self.spawn(name, self.run_app_task(task))
+        return task
+
+    def cancel_app_tasks(self, owner):
+        for task in self.app_tasks:
+            if task[1] is owner:
+                task[4] = False
+
+    async def main(self, coros):
+        self.error_event = asyncio.Event()
+        for name, coro in coros:
+            self.spawn(name, coro)
+        await self.error_event.wait()
+        raise self.error
+
+    def run(self, coros):
+        """coros is a list of (name, coroutine), raises the first error"""
+        asyncio.run(self.main(coros))
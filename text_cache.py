@@ -0,0 +1,124 @@
+import time
+import image
+import lcd_meter as lcd
+
+from lru_cache import LruCache, configured_budget
+
+# one glyph cell of a cached text bitmap, RGB565 so 256 bytes per character
+GLYPH_WIDTH = 8
+GLYPH_HEIGHT = 16
+GLYPH_TOP = 3
+default_budget_bytes = 32 * 1024
+
+
+class TextCache(LruCache):
+    """rendered text bitmaps keyed by (text, fg, bg), least recently used
+    ones are evicted once the byte budget is exceeded. colors are (r, g, b)
+    tuples like the image drawing functions take. the cost of an entry is
+    its render time in us"""
+
+    def __init__(self, budget_bytes=default_budget_bytes):
+        super(TextCache, self).__init__(budget_bytes)
+        self.render_us = 0
+        # render time of the cached bitmaps that were blitted instead
+        self.saved_us = 0
+
+    def render(self, text, fg, bg):
+        img = image.Image(size=(max(len(text), 1) * GLYPH_WIDTH, GLYPH_HEIGHT))
+        img.draw_rectangle(0, 0, img.width(), img.height(), color=bg, fill=True)
+        img.draw_string(0, GLYPH_TOP, text, color=fg)
+        return img
+
+    def get(self, text, fg, bg):
+        key = (text, fg, bg)
+        entry = self.lookup(key)
+        if entry is not None:
+            self.saved_us += entry[3]
+            return entry[0]
+        start = time.ticks_us()
+        img = self.render(text, fg, bg)
+        render_us = time.ticks_diff(time.ticks_us(), start)
+        self.render_us += render_us
+        self.add(key, img, img.width() * img.height() * 2, render_us)
+        return img
+
+    def draw(self, x, y, text, fg, bg, canvas=None):
+        """blit text at (x, y) of canvas, straight to the lcd when canvas
+        is None. returns the width in pixels"""
+        img = self.get(text, fg, bg)
+        if canvas is None:
+            # clip text that runs past the right edge of the screen
+            w = min(img.width(), lcd.width() - x)
+            if w > 0:
+                lcd.display(img, roi=(0, 0, w, img.height()), oft=(x, y))
+        else:
+            canvas.draw_image(img, x, y)
+        return img.width()
+
+    def stats(self):
+        stats = super(TextCache, self).stats()
+        lookups = self.hits + self.misses
+        stats["hit_rate"] = self.hits * 100 // lookups if lookups > 0 else 0
+        stats["render_us"] = self.render_us
+        stats["saved_us"] = self.saved_us
+        return stats
+
+
+class TextField:
+    """fixed width text at (x, y), set() redraws only the glyph cells that
+    differ from the text on screen, 3.98V -> 3.97V pushes a single cell"""
+
+    def __init__(self, x, y, width, fg, bg, cache=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.fg = fg
+        self.bg = bg
+        self.cache = cache
+        self.text = None
+        self.cells_drawn = 0
+
+    def reset(self):
+        """the field was painted over, the next set() draws every cell"""
+        self.text = None
+
+    def set(self, text, canvas=None):
+        text = (text + " " * self.width)[:self.width]
+        old = self.text
+        if old == text:
+            return False
+        cache = self.cache if self.cache is not None else get_shared_cache()
+        i = 0
+        while i < self.width:
+            if old is not None and text[i] == old[i]:
+                i += 1
+                continue
+            # draw each run of changed cells with one blit
+            end = i + 1
+            while end < self.width and (old is None or text[end] != old[end]):
+                end += 1
+            cache.draw(self.x + i * GLYPH_WIDTH, self.y, text[i:end],
+                       self.fg, self.bg, canvas)
+            self.cells_drawn += end - i
+            i = end
+        self.text = text
+        return True
+
+
+shared_cache = None
+
+
+def get_shared_cache():
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = TextCache(configured_budget("text_cache_budget", default_budget_bytes))
+    return shared_cache
+
+
+def draw_text(x, y, text, fg, bg, canvas=None):
+    return get_shared_cache().draw(x, y, text, fg, bg, canvas)
+
+
+def release_memory():
+    """called by memory hungry apps such as the camera"""
+    get_shared_cache().release_memory("text_cache")
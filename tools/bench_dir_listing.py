@@ -0,0 +1,68 @@
+"""Time to first explorer screen for a large directory, eager vs lazy.
+
+Creates a synthetic directory of N files (10000 by default) and compares
+the old ExplorerApp start (listdir + stat of every entry) with
+dir_listing.DirListing, which reads one screenful of names and stats only
+the visible rows.
+
+usage: python3 tools/bench_dir_listing.py [file_count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+
+host_stubs.install()
+
+from dir_listing import DirListing  # noqa: E402
+
+SCREEN_ROWS = 8
+
+
+def make_directory(count):
+    path = tempfile.mkdtemp(prefix="explorer_bench_")
+    for i in range(count):
+        with open(os.path.join(path, "file_%05d.txt" % i), "wb") as f:
+            f.write(b"x" * (i % 1000))
+    return path
+
+
+def eager_first_screen(path):
+    infos = []
+    for name in os.listdir(path):
+        infos.append((name, os.stat(os.path.join(path, name))))
+    return infos[:SCREEN_ROWS], len(infos)
+
+
+def lazy_first_screen(path):
+    listing = DirListing(path)
+    count = listing.ensure(SCREEN_ROWS)
+    rows = [(listing.name(i), listing.stat(i)) for i in range(count)]
+    return rows, listing.stat_calls
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = make_directory(count)
+    try:
+        start = time.perf_counter()
+        _, stats = eager_first_screen(path)
+        eager = time.perf_counter() - start
+        start = time.perf_counter()
+        _, lazy_stats = lazy_first_screen(path)
+        lazy = time.perf_counter() - start
+        print("files: %d" % count)
+        print("eager: %8.2f ms, %d stat calls" % (eager * 1000, stats))
+        print("lazy:  %8.2f ms, %d stat calls" % (lazy * 1000, lazy_stats))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""lcd calls per top button press in the explorer, full vs row redraw.
+
+Runs ExplorerApp against stand-in lcd and image modules that only count
+calls and pushed pixels, presses top N times (50 by default) on a
+synthetic directory and compares the old full screen redraw (clear plus
+two draw_string calls per row) with the row bitmaps of ExplorerApp.
+
+usage: python3 tools/bench_explorer_draw.py [presses] [file_count]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+
+host_stubs.install()
+counter = host_stubs.counter
+WIDTH = host_stubs.WIDTH
+HEIGHT = host_stubs.HEIGHT
+
+import lcd  # noqa: E402
+import dir_index  # noqa: E402
+import text_cache  # noqa: E402
+from app_explorer import ExplorerApp  # noqa: E402
+from host_stubs import StubSystem  # noqa: E402
+
+
+def legacy_draw(app):
+    y_offset = 6
+    lcd.clear()
+    listing = app.listing
+    count = listing.ensure(app.current_offset + app.visible_rows + 1)
+    for i in range(app.current_offset, count):
+        is_dir, size = listing.stat(i)
+        lcd.draw_string(WIDTH - 50, y_offset, "%.1fB" % size, lcd.WHITE, lcd.BLUE)
+        lcd.draw_string(4, y_offset, "   %d %s" % (i, listing.name(i)), lcd.WHITE, lcd.RED)
+        y_offset += 18
+        if y_offset > HEIGHT:
+            break
+
+
+def run(path, presses, legacy):
+    system = StubSystem()
+    app = ExplorerApp(system)
+    system.app = app
+    app.current_dir = path
+    app.on_draw()
+    counter.reset()
+    app.rows_rendered = app.rows_pushed = 0
+    for _ in range(presses):
+        app.on_top_button_changed("pressed")
+        if legacy:
+            # the legacy app repainted everything, whatever was invalidated
+            system.full = False
+            system.rects = []
+            legacy_draw(app)
+        else:
+            system.draw()
+    return app
+
+
+def main():
+    presses = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    path = tempfile.mkdtemp(prefix="explorer_draw_")
+    dir_index.index_dir = tempfile.mkdtemp(prefix="explorer_index_")
+    for i in range(count):
+        with open(os.path.join(path, "file_%05d.txt" % i), "wb") as f:
+            f.write(b"x" * (i % 1000))
+    try:
+        print("presses: %d, files: %d" % (presses, count))
+        run(path, presses, True)
+        print("full redraw: %5d lcd calls %9d pixels  %s" %
+              (counter.total(), counter.pixels, counter.calls))
+        app = run(path, presses, False)
+        print("row redraw:  %5d lcd calls %9d pixels  %s" %
+              (counter.total(), counter.pixels, counter.calls))
+        print("rows rendered: %d, rows pushed: %d" %
+              (app.rows_rendered, app.rows_pushed))
+        print("text cache:", text_cache.get_shared_cache().stats())
+    finally:
+        shutil.rmtree(path)
+        shutil.rmtree(dir_index.index_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""I2C transactions per periodic PMU tick, byte reads vs snapshot.
+
+Runs my_pmu.AXP192 on the host against a counting I2C stand-in with an
+AXP192 register file. Every tick does what the 500ms power key timer
+does with the launcher in front: read and clear the key IRQ, sample the
+power telemetry channels once per second, and refresh the battery gauge
+(voltage, USB and the coulomb counters) every two seconds. The same
+work is replayed through the per-register reads the driver used before
+the snapshot, a register address write plus a one byte read per
+register. Both paths must read the same values.
+
+Exits with status 1 when the values differ or the snapshot path does
+not save transactions.
+
+usage: python3 tools/bench_pmu_i2c.py [ticks]
+"""
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+
+host_stubs.install()
+
+clock = [0]
+time.ticks_ms = lambda: clock[0]
+time.ticks_diff = lambda a, b: a - b
+
+tick_ms = 500
+gauge_interval_ms = 2000
+
+
+class CountingI2C(object):
+    """AXP192 at address 52, one register pointer, every call is one
+    transaction on the bus"""
+    I2C0 = 0
+
+    def __init__(self, *args, **kwargs):
+        self.regs = bytearray(256)
+        self.pointer = 0
+        self.transactions = 0
+        self.bytes = 0
+
+    def count(self, nbytes):
+        self.transactions += 1
+        self.bytes += nbytes
+
+    def scan(self):
+        return [52]
+
+    def writeto(self, addr, data):
+        self.count(len(data))
+        self.pointer = data[0]
+
+    def readfrom(self, addr, n):
+        self.count(n)
+        data = bytes(self.regs[self.pointer:self.pointer + n])
+        self.pointer += n
+        return data
+
+    def readfrom_mem_into(self, addr, reg, buf, mem_size=8):
+        self.count(1 + len(buf))
+        buf[:] = self.regs[reg:reg + len(buf)]
+
+    def writeto_mem(self, addr, reg, value, mem_size=8):
+        self.count(2)
+        if reg == 0x46:
+            # IRQ status, write 1 to clear
+            self.regs[reg] &= ~value & 0xff
+        else:
+            self.regs[reg] = value
+
+
+class StubTimer(object):
+    TIMER2 = 2
+    CHANNEL0 = 0
+    MODE_PERIODIC = 1
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def stop(self):
+        pass
+
+
+sys.modules["machine"] = types.SimpleNamespace(I2C=CountingI2C, Timer=StubTimer)
+
+import my_pmu  # noqa: E402
+import power_telemetry  # noqa: E402
+from battery_gauge import BatteryGauge  # noqa: E402
+
+
+class LegacyReads(object):
+    """the register reads of the driver before the snapshot"""
+
+    def __init__(self, i2c):
+        self.i2c = i2c
+
+    def read_reg(self, reg):
+        self.i2c.writeto(52, bytes([reg]))
+        return self.i2c.readfrom(52, 1)[0]
+
+    def check_power_key(self):
+        status = self.read_reg(0x46)
+        self.i2c.writeto_mem(52, 0x46, 0xFF, mem_size=8)
+        return status
+
+    def get_adc_raw(self, high_reg, low_bits=4):
+        return (self.read_reg(high_reg) << low_bits) + self.read_reg(high_reg + 1)
+
+    def is_usb_plugged_in(self):
+        power_data = self.read_reg(0x00)
+        return power_data & 0xc0 == 0xc0
+
+    def get_coulomb_raw(self):
+        values = []
+        for start in (0xB0, 0xB4):
+            value = 0
+            for reg in range(start, start + 4):
+                value = (value << 8) + self.read_reg(reg)
+            values.append(value)
+        return values[0], values[1]
+
+
+def fill_registers(regs, tick):
+    """battery at about 3.9V, slowly draining, USB unplugged"""
+    vbat = 3545 - tick // 20
+    regs[0x78], regs[0x79] = vbat >> 4, vbat & 0x0f
+    regs[0x7C], regs[0x7D] = 120 >> 5, 120 & 0x1f
+    regs[0x56], regs[0x57] = 0, 0
+    regs[0x5E], regs[0x5F] = 1800 >> 4, 1800 & 0x0f
+    regs[0xB4:0xB8] = (tick * 3).to_bytes(4, "big")
+
+
+def run(ticks, legacy):
+    """returns (i2c, values read) after ticks periodic ticks"""
+    i2c = CountingI2C()
+    pmu = my_pmu.AXP192(i2c_dev=i2c)
+    reads = LegacyReads(i2c) if legacy else pmu
+    values = []
+    channels = power_telemetry.channels
+    last_sample_ms = None
+    last_gauge_ms = None
+    clock[0] = 0
+    i2c.transactions = i2c.bytes = 0
+    for tick in range(ticks):
+        clock[0] += tick_ms
+        fill_registers(i2c.regs, tick)
+        if legacy:
+            reads.check_power_key()
+        else:
+            pmu.check_power_key()
+        if last_sample_ms is None or clock[0] - last_sample_ms >= 1000:
+            last_sample_ms = clock[0]
+            values.append([reads.get_adc_raw(reg, low_bits) for _, reg, low_bits in channels])
+        if last_gauge_ms is None or clock[0] - last_gauge_ms >= gauge_interval_ms:
+            last_gauge_ms = clock[0]
+            values.append([reads.get_adc_raw(0x78), reads.is_usb_plugged_in(),
+                           reads.get_coulomb_raw()])
+    return i2c, values
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    legacy_i2c, legacy_values = run(ticks, True)
+    i2c, values = run(ticks, False)
+    print("ticks: %d of %dms" % (ticks, tick_ms))
+    print("byte reads: %5d transactions %6d bytes  %.1f per tick" %
+          (legacy_i2c.transactions, legacy_i2c.bytes, legacy_i2c.transactions / float(ticks)))
+    print("snapshot:   %5d transactions %6d bytes  %.1f per tick" %
+          (i2c.transactions, i2c.bytes, i2c.transactions / float(ticks)))
+    gauge = BatteryGauge()
+    gauge.update(values[-1][0])
+    print("last battery reading: %dmV %d%%" % (gauge.millivolts, gauge.percent))
+    failures = 0
+    if values != legacy_values:
+        print("FAIL the snapshot getters read other values than the byte reads")
+        failures += 1
+    if i2c.transactions >= legacy_i2c.transactions:
+        print("FAIL the snapshot does not save transactions")
+        failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Replay recorded KPU detections through object_tracker.ObjectTracker.
+
+The recording has one line per frame with the detections of that frame
+as [[x, y, w, h, confidence], ...], as written by CameraPipeline with
+camera_record_boxes set and camera_detect_interval 1. Every frame of the
+recording is treated as ground truth, the tracker only sees a detection
+when it asks for one, and the centre error of the boxes it shows on the
+other frames is measured against the recording.
+
+usage: python3 tools/bench_tracker.py [recording.txt] [--interval N ...]
+       without a recording a synthetic sequence of moving boxes is used
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from object_tracker import ObjectTracker, iou  # noqa: E402
+
+
+def synthetic_sequence(frames=600):
+    sequence = []
+    for f in range(frames):
+        boxes = [[40 + f % 200, 60, 48, 56, 0.8],
+                 [260 - (f * 2) % 220, 100 + (f // 3) % 60, 40, 40, 0.7]]
+        sequence.append(boxes)
+    return sequence
+
+
+def load_sequence(path):
+    sequence = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                sequence.append(json.loads(line))
+    return sequence
+
+
+def centre(box):
+    return (box[0] + box[2] / 2.0, box[1] + box[3] / 2.0)
+
+
+def replay(sequence, interval):
+    tracker = ObjectTracker(detect_interval=interval)
+    error_sum = 0.0
+    error_count = 0
+    lost = 0
+    for truth in sequence:
+        tracks = tracker.step(lambda frame: [tuple(d) for d in frame], truth)
+        for box in truth:
+            best = None
+            best_iou = 0.0
+            for track in tracks:
+                overlap = iou(track.rect(), box)
+                if overlap > best_iou:
+                    best = track
+                    best_iou = overlap
+            if best is None:
+                lost += 1
+                continue
+            tx, ty = centre(best.rect())
+            bx, by = centre(box)
+            error_sum += ((tx - bx) ** 2 + (ty - by) ** 2) ** 0.5
+            error_count += 1
+    frames = len(sequence)
+    return {
+        "interval": interval,
+        "frames": frames,
+        "kpu_runs": tracker.detections_run,
+        "saved": tracker.detections_saved(),
+        "saved_percent": 100.0 * tracker.detections_saved() / max(frames, 1),
+        "mean_error_px": error_sum / max(error_count, 1),
+        "lost_boxes": lost,
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    intervals = [1, 2, 3, 5, 8]
+    if "--interval" in args:
+        i = args.index("--interval")
+        intervals = [int(v) for v in args[i + 1:]]
+        args = args[:i]
+    sequence = load_sequence(args[0]) if args else synthetic_sequence()
+    print("interval  frames  kpu_runs  saved   mean_err_px  lost")
+    for interval in intervals:
+        r = replay(sequence, interval)
+        print("%8d  %6d  %8d  %5.1f%%  %11.2f  %4d" % (
+            r["interval"], r["frames"], r["kpu_runs"], r["saved_percent"],
+            r["mean_error_px"], r["lost_boxes"]))
+
+
+if __name__ == "__main__":
+    main()
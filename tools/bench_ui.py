@@ -0,0 +1,77 @@
+"""device cost of the UI paths, measured on the host emulator.
+
+Every scenario boots boot.py in a fresh emulator process, plays its
+button script and prints what the run cost in virtual milliseconds, LCD
+bytes, I2C transactions, image decodes and file system calls. The
+numbers come from the modelled costs in emulator/device.py, compare
+them run against run rather than with the device.
+
+The first press of every script dismisses the start screen.
+
+usage: python3 tools/bench_ui.py [scenario ...]
+"""
+import json
+import os
+import subprocess
+import sys
+
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def tops(count, gap_ms=300):
+    return "".join("; +%d top click" % gap_ms for _ in range(count))
+
+
+# name -> (run ms, script), the launcher cursor starts on the camera
+scenarios = {
+    "boot": (2000, "1500 stop"),
+    "carousel": (6000, "300 home click" + tops(14) + "; +1000 stop"),
+    "explorer": (6000, "300 home click" + tops(1) + "; +300 home click" + tops(10) +
+             "; +500 power short; +500 stop"),
+    "camera": (5000, "300 home click; +300 home click; +3000 power short; +500 stop"),
+    "music": (6000, "300 home click" + tops(3) + "; +300 home click; +500 home click; "
+                    "+2500 power short; +500 stop"),
+    "video": (6000, "300 home click" + tops(4) + "; +300 home click; +500 home click; "
+                    "+2000 home click; +500 power short; +500 stop"),
+    "microphone": (6000, "300 home click" + tops(5) + "; +300 home click; +500 home click; "
+                         "+2000 home click; +500 power short; +500 stop"),
+    "brightness": (5000, "300 home click" + tops(7) + "; +300 home click; +300 home click; "
+                         "+300 home click; +1000 stop"),
+    "system_info": (9000, "300 home click" + tops(13) + "; +300 home click; +3000 power short; "
+                          "+500 stop"),
+    "battery": (4000, "300 home click; +300 battery 3600; +1000 usb on; +300 battery 4100 400; "
+                      "+1500 stop"),
+}
+
+columns = (("virtual_ms", None), ("lcd_bytes", "lcd_bytes"), ("lcd", "lcd_transfers"),
+           ("i2c", "i2c_transactions"), ("decodes", "image_decodes"), ("fs_reads", "fs_reads"),
+           ("fs_writes", "fs_writes"), ("syncs", "fs_syncs"), ("audio", "audio_samples_out"),
+           ("errors", "exceptions_printed"))
+
+
+def run_scenario(name):
+    run_ms, script = scenarios[name]
+    output = subprocess.check_output([sys.executable, "-m", "emulator", "--json", "--quiet",
+                                      "--ms", str(run_ms), "--script", script], cwd=repo_root)
+    return json.loads(output.decode().strip().split("\n")[-1])
+
+
+def main():
+    names = sys.argv[1:] or list(scenarios)
+    for name in names:
+        if name not in scenarios:
+            print("unknown scenario %s, one of: %s" % (name, ", ".join(scenarios)))
+            return 2
+    print("%-12s" % "scenario" + "".join("%11s" % title for title, _ in columns))
+    for name in names:
+        result = run_scenario(name)
+        counters = result["counters"]
+        row = "%-12s" % name
+        for title, key in columns:
+            row += "%11d" % (result["virtual_ms"] if key is None else counters[key])
+        print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
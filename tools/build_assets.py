@@ -0,0 +1,160 @@
+"""Compile the res/ images into the RGB565 asset bundle read by asset_bundle.py.
+
+Every .jpg/.png below the resource directory is decoded once on the host
+and stored as raw RGB565, or RLE when --rle is given and it saves at
+least a quarter of the raw size. The device then reads the pixels with
+readinto() instead of decoding JPEG. Copy the output to /sd/res/assets.bin,
+without it the device keeps decoding the JPEG files.
+
+Pixels are little-endian RGB565 like the image buffers of MaixPy,
+--big-endian writes them byte swapped for firmware that keeps them so.
+Decoding the source images needs Pillow (pip install Pillow).
+
+usage: python3 tools/build_assets.py [--rle] [--big-endian] [res_dir] [output]
+"""
+import os
+import struct
+import sys
+
+BUNDLE_MAGIC = b"ASTB"
+BUNDLE_VERSION = 1
+HEADER_FORMAT = "<4sBBHI"
+ENTRY_FORMAT = "<IIHHBBH"
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+# pixel data starts on a word boundary, readinto() lands aligned
+DATA_ALIGN = 4
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def load_rgb(path):
+    try:
+        from PIL import Image
+    except ImportError:
+        sys.exit("build_assets.py needs Pillow to decode %s: pip install Pillow" % path)
+    with Image.open(path) as img:
+        rgb = img.convert("RGB")
+        return rgb.size, list(rgb.getdata())
+
+
+def to_rgb565(pixels, big_endian=False):
+    fmt = ">H" if big_endian else "<H"
+    out = bytearray()
+    for r, g, b in pixels:
+        out += struct.pack(fmt, ((r & 0xf8) << 8) | ((g & 0xfc) << 3) | (b >> 3))
+    return bytes(out)
+
+
+def rle_encode(data):
+    """same scheme as asset_bundle.rle_decode_into(), runs of up to 128
+    pixels of 2 bytes"""
+    pixels = [data[i:i + 2] for i in range(0, len(data), 2)]
+    out = bytearray()
+    literal = []
+
+    def flush_literal():
+        while literal:
+            chunk = literal[:128]
+            del literal[:128]
+            out.append(len(chunk) - 1)
+            for p in chunk:
+                out.extend(p)
+    i = 0
+    while i < len(pixels):
+        run = 1
+        while i + run < len(pixels) and run < 128 and pixels[i + run] == pixels[i]:
+            run += 1
+        if run >= 3:
+            flush_literal()
+            out.append(0x80 | (run - 1))
+            out += pixels[i]
+        else:
+            literal.extend(pixels[i:i + run])
+        i += run
+    flush_literal()
+    return bytes(out)
+
+
+def rle_decode(data, size):
+    out = bytearray()
+    src = 0
+    while src < len(data):
+        c = data[src]
+        src += 1
+        n = (c & 0x7f) + 1
+        if c & 0x80:
+            out += data[src:src + 2] * n
+            src += 2
+        else:
+            out += data[src:src + 2 * n]
+            src += 2 * n
+    if len(out) != size:
+        raise ValueError("rle round trip size %d != %d" % (len(out), size))
+    return bytes(out)
+
+
+def find_images(res_dir):
+    names = []
+    for root, _, files in os.walk(res_dir):
+        for name in files:
+            if name.lower().endswith(IMAGE_SUFFIXES):
+                rel = os.path.relpath(os.path.join(root, name), res_dir)
+                names.append(rel.replace(os.sep, "/"))
+    return sorted(names)
+
+
+def build_bundle(assets, use_rle=False):
+    """assets: list of (name, width, height, rgb565 bytes), returns the
+    bundle bytes and (name, raw size, stored size, encoding) rows"""
+    names = b""
+    name_offsets = []
+    for name, _, _, _ in assets:
+        name_offsets.append(len(names))
+        names += name.encode()
+    header_size = struct.calcsize(HEADER_FORMAT)
+    table_size = struct.calcsize(ENTRY_FORMAT) * len(assets)
+    offset = header_size + table_size + len(names)
+    table = b""
+    blobs = b""
+    rows = []
+    for i, (name, width, height, raw) in enumerate(assets):
+        encoding = ENCODING_RAW
+        data = raw
+        if use_rle:
+            packed = rle_encode(raw)
+            if len(packed) * 4 <= len(raw) * 3:
+                rle_decode(packed, len(raw))
+                encoding = ENCODING_RLE
+                data = packed
+        pad = (-(offset + len(blobs))) % DATA_ALIGN
+        blobs += b"\0" * pad
+        table += struct.pack(ENTRY_FORMAT, offset + len(blobs), len(data), width, height,
+                             encoding, len(name.encode()), name_offsets[i])
+        blobs += data
+        rows.append((name, len(raw), len(data), encoding))
+    header = struct.pack(HEADER_FORMAT, BUNDLE_MAGIC, BUNDLE_VERSION, 0, len(assets), len(names))
+    return header + table + names + blobs, rows
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    use_rle = "--rle" in sys.argv
+    big_endian = "--big-endian" in sys.argv
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    res_dir = args[0] if len(args) > 0 else os.path.join(root, "res")
+    output = args[1] if len(args) > 1 else os.path.join(res_dir, "assets.bin")
+    assets = []
+    for name in find_images(res_dir):
+        (width, height), pixels = load_rgb(os.path.join(res_dir, name))
+        assets.append((name, width, height, to_rgb565(pixels, big_endian)))
+    bundle, rows = build_bundle(assets, use_rle)
+    with open(output, "wb") as f:
+        f.write(bundle)
+    for name, raw_size, stored_size, encoding in rows:
+        print("%-40s %7d -> %7d %s" % (name, raw_size, stored_size,
+                                       "rle" if encoding == ENCODING_RLE else "raw"))
+    print("%d assets, %d bytes: %s" % (len(rows), len(bundle), output))
+
+
+if __name__ == "__main__":
+    main()
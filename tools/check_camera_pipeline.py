@@ -0,0 +1,203 @@
+"""Frame pacing, capture overlap and detection checks of CameraPipeline.
+
+Runs camera_pipeline.CameraPipeline on the host against a stand-in
+sensor, KPU and lcd on a virtual microsecond clock. The sensor yields
+synthetic frames with a moving box at 30fps, the KPU finds that box and
+costs the time of a YOLO run, the lcd costs the time of a full screen
+push. The checks:
+- the sensor is reset with dual_buff=True, with the DVP double buffered
+  snapshot() picks up the frame captured during the last step;
+- firmware that rejects dual_buff gets a plain reset, capture then
+  waits for a whole frame and the frame rate drops;
+- the KPU runs once per detect interval and the tracked box stays on the
+  synthetic one;
+- step() paces to the target fps, stop() releases the model and the sensor.
+
+Exits with status 1 when a check fails.
+
+usage: python3 tools/check_camera_pipeline.py [frames]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+from host_stubs import check, clock  # noqa: E402
+
+host_stubs.install()
+host_stubs.use_virtual_clock()
+
+import camera_pipeline  # noqa: E402
+from object_tracker import iou  # noqa: E402
+
+sensor_fps = 30
+frame_us = 1000000 // sensor_fps
+kpu_us = 22000
+display_us = 10000
+box_size = 48
+
+
+def box_at(frame):
+    return (20 + (frame * 3) % 240, 90, box_size, box_size)
+
+
+class StandInImage(object):
+    def __init__(self, frame):
+        self.frame = frame
+
+    def draw_rectangle(self, *args, **kwargs):
+        pass
+
+    def draw_string(self, *args, **kwargs):
+        pass
+
+
+class StandInSensor(object):
+    """frames start every frame_us once run(1) was called. double
+    buffered, snapshot() returns the last finished frame at once unless
+    it was already handed out; single buffered, capture starts at the
+    call and snapshot() waits for the whole frame"""
+    RGB565 = 0
+    QVGA = 0
+
+    def __init__(self, dual_buff_supported=True):
+        self.dual_buff_supported = dual_buff_supported
+        self.dual_buff = False
+        self.running = False
+        self.start_us = 0
+        self.last_frame = -1
+        self.resets = 0
+
+    def reset(self, **kwargs):
+        if kwargs and not self.dual_buff_supported:
+            raise TypeError("unexpected keyword argument")
+        self.dual_buff = kwargs.get("dual_buff", False)
+        self.resets += 1
+
+    def set_pixformat(self, pixformat):
+        pass
+
+    def set_framesize(self, framesize):
+        pass
+
+    def run(self, on):
+        self.running = bool(on)
+        self.start_us = clock[0]
+
+    def snapshot(self):
+        if self.dual_buff:
+            # the frame that finished last, or wait for the next one
+            frame = (clock[0] - self.start_us) // frame_us - 1
+            if frame <= self.last_frame:
+                frame = self.last_frame + 1
+                clock[0] = self.start_us + (frame + 1) * frame_us
+        else:
+            # capture starts at the next frame boundary after the call
+            frame = (clock[0] - self.start_us + frame_us - 1) // frame_us
+            clock[0] = self.start_us + (frame + 1) * frame_us
+        self.last_frame = frame
+        return StandInImage(frame)
+
+
+class StandInObject(object):
+    def __init__(self, box):
+        self.box = box
+
+    def rect(self):
+        return self.box
+
+    def value(self):
+        return 0.9
+
+
+class StandInKpu(object):
+    def __init__(self):
+        self.runs = 0
+        self.loaded = False
+
+    def load(self, address):
+        self.loaded = True
+        return "model"
+
+    def init_yolo2(self, task, *args):
+        pass
+
+    def run_yolo2(self, task, img):
+        self.runs += 1
+        clock[0] += kpu_us
+        return [StandInObject(box_at(img.frame))]
+
+    def deinit(self, task):
+        self.loaded = False
+
+
+class StandInLcd(object):
+    WHITE = 0xFFFF
+    RED = 0xF800
+
+    def width(self):
+        return 240
+
+    def height(self):
+        return 135
+
+    def draw_string(self, *args):
+        pass
+
+    def display(self, img):
+        clock[0] += display_us
+
+
+def run(sensor, frames, target_fps=30):
+    """runs frames steps, sleeping the returned delays, returns
+    (pipeline, kpu, fps, track overlap of the last frame)"""
+    kpu = StandInKpu()
+    pipeline = camera_pipeline.CameraPipeline(sensor, kpu, StandInLcd(), target_fps)
+    pipeline.start()
+    start_us = clock[0]
+    overlap = 0.0
+    for _ in range(frames):
+        delay_ms = pipeline.step()
+        clock[0] += delay_ms * 1000
+    fps = frames * 1000000 // max(clock[0] - start_us, 1)
+    tracks = pipeline.tracker.tracks
+    if tracks:
+        overlap = iou(tracks[0].rect(), box_at(sensor.last_frame))
+    return pipeline, kpu, fps, overlap
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    sensor = StandInSensor()
+    pipeline, kpu, fps, overlap = run(sensor, frames)
+    interval = pipeline.tracker.detect_interval
+    print("dual_buff: %dfps, avg capture %dus, kpu runs %d" %
+          (fps, pipeline.total_capture_us // pipeline.frames, kpu.runs))
+    check(sensor.dual_buff, "the sensor is reset with dual_buff=True")
+    check(fps >= 24, "double buffered capture runs at 24fps or more (%dfps)" % fps)
+    check(kpu.runs == (frames + interval - 1) // interval,
+          "the KPU runs once every %d frames (%d runs)" % (interval, kpu.runs))
+    check(overlap > 0.5, "the tracked box stays on the synthetic box (iou %.2f)" % overlap)
+    pipeline.stop()
+    check(not kpu.loaded and not sensor.running, "stop() releases the model and the sensor")
+
+    single = StandInSensor(dual_buff_supported=False)
+    pipeline, kpu, single_fps, _ = run(single, frames)
+    print("single buffer: %dfps, avg capture %dus" %
+          (single_fps, pipeline.total_capture_us // pipeline.frames))
+    check(single.resets == 1 and not single.dual_buff,
+          "firmware without dual_buff gets one plain reset")
+    check(single_fps < fps, "capture without double buffering is slower (%dfps)" % single_fps)
+    pipeline.stop()
+
+    paced = StandInSensor()
+    pipeline, kpu, paced_fps, _ = run(paced, frames, target_fps=10)
+    check(9 <= paced_fps <= 10, "step() paces to a 10fps target (%dfps)" % paced_fps)
+    pipeline.stop()
+    return host_stubs.status()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
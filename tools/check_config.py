@@ -0,0 +1,103 @@
+"""Write count, latency and power-loss checks of the config store.
+
+Runs config.py on the host in a temporary directory with a virtual
+millisecond clock:
+- twelve brightness presses within the flush delay end in one write;
+- saving an unchanged value does not make the config dirty;
+- a save that lost power between its renames is recovered from the
+  complete .tmp, or from .bak when the .tmp is truncated;
+- prints the average and maximum write latency of forced writes.
+
+Exits with status 1 when a check fails.
+
+usage: python3 tools/check_config.py [forced_writes]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+from host_stubs import check  # noqa: E402
+
+host_stubs.install()
+
+import config  # noqa: E402
+
+# virtual milliseconds, the write latency is measured with the real ticks_us
+clock = [0]
+time.ticks_ms = lambda: clock[0]
+
+
+def reset(path):
+    config.config_path = path
+    config.config_cache = None
+    config.dirty_keys.clear()
+    config.write_count = 0
+    config.coalesced_count = 0
+
+
+def check_coalescing(path):
+    reset(path)
+    for i in range(12):
+        config.save_config("brightness", 7 + i % 9)
+        clock[0] += 300
+        config.flush_config()
+    check(config.write_count == 0, "no write while presses keep coming")
+    clock[0] += config.flush_delay_ms
+    config.flush_config()
+    check(config.write_count == 1, "12 presses -> %d write" % config.write_count)
+    config.save_config("brightness", config.get_brightness())
+    check(not config.is_dirty(), "unchanged value is not dirty")
+    reset(path)
+    check(config.get_brightness() == 7 + 11 % 9, "saved value read back")
+
+
+def check_recovery(path):
+    reset(path)
+    config.save_config("volume", 10)
+    config.flush_config(True)
+    config.save_config("volume", 20)
+    config.flush_config(True)
+    # power lost after config was renamed to .bak, before .tmp took its place
+    os.remove(path + ".bak")
+    os.rename(path, path + ".bak")
+    with open(path + ".tmp", "w") as f:
+        f.write('{"volume": 30}')
+    reset(path)
+    check(config.get_config_by_key("volume") == 30, "recovered from complete .tmp")
+    os.remove(path + ".tmp")
+    with open(path + ".tmp", "w") as f:
+        f.write('{"volu')
+    reset(path)
+    check(config.get_config_by_key("volume") == 20, "recovered from .bak when .tmp is truncated")
+
+
+def check_latency(path, writes):
+    reset(path)
+    for i in range(writes):
+        config.save_config("brightness", i)
+        config.flush_config(True)
+    stats = config.stats()
+    check(stats["writes"] == writes, "%d forced writes" % stats["writes"])
+    print("write latency: avg=%dus max=%dus" % (stats["avg_write_us"], stats["max_write_us"]))
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    directory = tempfile.mkdtemp(prefix="config_check_")
+    try:
+        check_coalescing(os.path.join(directory, "coalescing.json"))
+        check_recovery(os.path.join(directory, "recovery.json"))
+        check_latency(os.path.join(directory, "latency.json"), writes)
+    finally:
+        shutil.rmtree(directory)
+    return host_stubs.status()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Reuse checks of the saved explorer directory index.
+
+Builds dir_index.DirIndex files for synthetic directories in a temporary
+index dir and loads them back. The checks:
+- an unchanged directory loads its saved index;
+- a file that grows in place, which changes neither the directory mtime
+  nor the entry count, shows its new size once its row is stat'ed, and
+  the saved index is removed so the size order is rebuilt;
+- the directory that holds the index dir does not list it, and saving
+  its own index keeps it valid;
+- two directories whose index file names collide do not load each
+  other's index.
+
+Exits with status 1 when a check fails.
+
+usage: python3 tools/check_dir_index.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+from host_stubs import check  # noqa: E402
+
+host_stubs.install()
+
+import dir_index  # noqa: E402
+from dir_index import DirIndex, IndexBuilder, ORDER_SIZE  # noqa: E402
+from dir_listing import DirListing  # noqa: E402
+
+
+def make_directory(root, name, count):
+    path = os.path.join(root, name)
+    os.mkdir(path)
+    for i in range(count):
+        with open(os.path.join(path, "file_%02d.txt" % i), "wb") as f:
+            f.write(b"x" * (10 + i))
+    return path
+
+
+def build(path):
+    builder = IndexBuilder(DirListing(path), batch=4)
+    while builder.step() is not None:
+        pass
+    return builder.index
+
+
+def entry(index, name):
+    for i in range(index.count()):
+        if index.name(i) == name:
+            return i
+    return None
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="dir_index_check_")
+    dir_index.index_dir = os.path.join(root, ".explorer")
+    try:
+        dir_index.ensure_index_dir()
+        path = make_directory(root, "music", 8)
+        built = build(path)
+        loaded = DirIndex.load(path)
+        check(loaded is not None and loaded.count() == built.count(),
+              "an unchanged directory loads its saved index")
+
+        # grow a file in place, keeping the directory mtime
+        dir_mtime = os.stat(path).st_mtime
+        with open(os.path.join(path, "file_00.txt"), "ab") as f:
+            f.write(b"y" * 1000)
+        os.utime(path, (dir_mtime, dir_mtime))
+        loaded = DirIndex.load(path)
+        check(loaded is not None, "a file written in place keeps the index valid")
+        i = entry(loaded, "file_00.txt")
+        _, size = loaded.stat(i)
+        check(size == 1010, "the grown file shows its new size (%s bytes)" % size)
+        _, size = loaded.stat(i)
+        check(loaded.stat_calls == 1, "the size is stat'ed once per entry")
+        check(not os.path.exists(dir_index.index_path(path)),
+              "the index with an outdated size order is removed")
+        rebuilt = build(path)
+        check(entry(rebuilt, "file_00.txt") == rebuilt.order(ORDER_SIZE)[0],
+              "the rebuilt size order puts the grown file first")
+        check(rebuilt.stat(0) is not None and rebuilt.stat_calls == 0,
+              "a freshly built index does not stat its sizes again")
+
+        # root holds the .explorer index dir, its index is saved in there
+        root_index = build(root)
+        names = [root_index.name(i) for i in range(root_index.count())]
+        check(".explorer" not in names, "the index dir is not listed (%s)" % ", ".join(names))
+        check(DirIndex.load(root) is not None,
+              "saving the index of the dir that holds the index dir keeps it valid")
+
+        # a second directory whose index file name collides with the first
+        other = make_directory(root, "video", 8)
+        dir_mtime = os.stat(path).st_mtime
+        os.utime(other, (dir_mtime, dir_mtime))
+        dir_index.index_path = lambda dir_path: os.path.join(dir_index.index_dir, "same.idx")
+        build(path)
+        check(DirIndex.load(other) is None,
+              "a directory with a colliding index name does not load the other index")
+        check(DirIndex.load(path) is not None, "the directory that saved it still loads it")
+    finally:
+        shutil.rmtree(root)
+    return host_stubs.status()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Pixels pushed per frame by the launcher, full vs partial redraws.
+
+Boots M5StickVSystem with the launcher on the emulator, changes the
+battery reading and steps the carousel. Every frame is drawn by
+M5StickVSystem.draw_current_app(), after the system clipped and merged
+the rects the app invalidated. The checks:
+- last_draw_pixels of every frame equals what the emulated lcd counted
+  on its own, clipped to the panel;
+- a full frame pushes the screen once, and every partial frame pushes
+  no more than the area the app invalidated;
+- a battery readout change, a battery icon change and a carousel step
+  each push less than a full frame, the readout less than the status
+  bar with its icon.
+
+Exits with status 1 when a check fails.
+
+usage: python3 tools/check_draw_pixels.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import emulator  # noqa: E402
+from emulator import runner  # noqa: E402
+from host_stubs import check, status  # noqa: E402
+
+frame_ms = 33
+
+
+def press_home(device, at_ms):
+    """a home click at at_ms dismisses the start screen, M5StickVSystem
+    exits when home is held during its init so it has to come later"""
+    pin = emulator.board.board_info.BUTTON_A
+    device.schedule(at_ms, lambda: device.set_pin(pin, 0))
+    device.schedule(at_ms + runner.click_ms, lambda: device.set_pin(pin, 1))
+
+
+def frames(system, device, name, results, limit=20):
+    """draws until nothing is dirty like the render task, returns the
+    pixels pushed"""
+    total = 0
+    count = 0
+    while system.is_drawing_dirty and count < limit:
+        system.is_drawing_dirty = False
+        full = system.is_full_redraw
+        if full:
+            area = device.framebuffer.w * device.framebuffer.h
+        else:
+            area = sum(rect[2] * rect[3] for rect in system.dirty_rects)
+        lcd_bytes = device.counters.lcd_bytes
+        system.draw_current_app()
+        pushed = system.last_draw_pixels
+        results.append((name, full, pushed, area, (device.counters.lcd_bytes - lcd_bytes) // 2))
+        print("%-14s frame %2d: pushed %6d pixels, invalidated %6d" % (name, count, pushed, area))
+        total += pushed
+        count += 1
+        device.clock.advance(frame_ms * 1000)
+    return total
+
+
+def periodic(system, device):
+    # past the 2s battery refresh of the launcher
+    device.clock.advance(2001 * 1000)
+    system.get_current_app().app_periodic_task()
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="draw_pixels_")
+    try:
+        runner.prepare_root(root, {})
+        device = emulator.install(root)
+        press_home(device, 3000)
+        from m5stickv_system import M5StickVSystem
+        system = M5StickVSystem()
+        results = []
+        full = frames(system, device, "full", results)
+        periodic(system, device)
+        # the filtered reading settles a few millivolts lower, only the text changes
+        device.axp192.set_battery(3500)
+        periodic(system, device)
+        readout = frames(system, device, "battery text", results)
+        device.axp192.set_usb(True)
+        periodic(system, device)
+        icon = frames(system, device, "battery icon", results)
+        system.on_top_button_changed("pressed")
+        carousel = frames(system, device, "carousel step", results)
+    finally:
+        shutil.rmtree(root)
+    screen = device.framebuffer.w * device.framebuffer.h
+    check(all(pushed == seen for _, _, pushed, _, seen in results),
+          "last_draw_pixels of every frame equals the emulated lcd count")
+    check(full == screen, "the first frame pushes the screen once (%d pixels)" % full)
+    over = [(name, pushed, area) for name, is_full, pushed, area, _ in results
+            if not is_full and pushed > area]
+    check(len(over) == 0, "no partial frame pushes more than it invalidated %s" % over)
+    check(0 < readout < full, "a battery readout change pushes %d of %d pixels" % (readout, full))
+    check(readout < icon < full, "a battery icon change pushes the status bar, %d pixels" % icon)
+    frame_count = len([r for r in results if r[0] == "carousel step"])
+    check(0 < carousel < full * frame_count,
+          "the %d carousel frames push %d pixels, less than %d full frames" %
+          (frame_count, carousel, frame_count))
+    return status()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
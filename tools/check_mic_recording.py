@@ -0,0 +1,175 @@
+"""Sample loss check of the microphone recorder at 16kHz and 44.1kHz.
+
+Runs MicrophoneApp on the host with a stand-in I2S on a virtual
+microsecond clock. The stand-in captures a counting sample sequence at
+the sample rate into a DMA ring and drops the oldest samples when the
+app does not fetch them in time. SD writes cost a modelled time with a
+long stall every few blocks, and a render task takes a slice of the
+loop. After each recording the wav file must hold the whole sequence:
+no sample lost, none repeated, header sizes patched.
+
+Exits with status 1 when a check fails.
+
+usage: python3 tools/check_mic_recording.py [seconds]
+"""
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+from host_stubs import StubSystem, check, clock  # noqa: E402
+
+host_stubs.install()
+host_stubs.use_virtual_clock()
+
+# SD block write: fixed cost, transfer time and a stall on every
+# stall_every block, e.g. a FAT cluster allocation
+write_us = 2000
+write_ns_per_byte = 600
+stall_us = 80000
+stall_every = 8
+# another task drawing the screen between the recorder steps
+render_us = 15000
+render_interval_ms = 100
+# samples the I2S DMA ring holds before the oldest are overwritten
+dma_points = 8192
+
+
+class StandInAudio(object):
+    def __init__(self, data):
+        self.data = data
+
+    def to_bytes(self):
+        return self.data
+
+
+class StandInI2S(object):
+    DEVICE_2 = 2
+    CHANNEL_0 = 0
+    RECEIVER = 2
+    STANDARD_MODE = 1
+
+    def __init__(self, device_num):
+        self.sample_rate = 16000
+        self.start_us = 0
+        self.read_pos = 0
+        self.lost = 0
+
+    def channel_config(self, *args, **kwargs):
+        pass
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.start_us = clock[0]
+        self.read_pos = 0
+        self.lost = 0
+
+    def captured(self):
+        return (clock[0] - self.start_us) * self.sample_rate // 1000000
+
+    def record(self, points):
+        backlog = self.captured() - self.read_pos
+        if backlog > dma_points:
+            self.lost += backlog - dma_points
+            self.read_pos += backlog - dma_points
+        end = self.read_pos + points
+        if self.captured() < end:
+            # blocks until the DMA captured the samples
+            clock[0] = self.start_us + (end * 1000000 + self.sample_rate - 1) // self.sample_rate
+        data = struct.pack("<%dh" % points, *[(i & 0xffff) - 0x8000
+                                               for i in range(self.read_pos, end)])
+        self.read_pos = end
+        return StandInAudio(data)
+
+
+class TimedFile(object):
+    """the recorder file, block writes advance the virtual clock"""
+
+    def __init__(self, f):
+        self.f = f
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        clock[0] += write_us + len(data) * write_ns_per_byte // 1000
+        if self.writes % stall_every == 0:
+            clock[0] += stall_us
+        return self.f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+def render_step():
+    clock[0] += render_us
+    return render_interval_ms
+
+
+def install_firmware():
+    sys.modules["Maix"] = types.SimpleNamespace(I2S=StandInI2S)
+    sys.modules["board"] = types.SimpleNamespace(board_info=types.SimpleNamespace(
+        MIC_LRCLK=10, MIC_DAT=12, MIC_CLK=13))
+    fm = types.SimpleNamespace(register=lambda *args: None, fpioa=types.SimpleNamespace(
+        I2S2_WS=0, I2S2_IN_D0=1, I2S2_SCLK=2))
+    sys.modules["fpioa_manager"] = types.SimpleNamespace(fm=fm)
+
+
+def read_samples(path):
+    with open(path, "rb") as f:
+        channels, sample_rate, bits, data_offset, data_size = wav_file.parse(f)
+        f.seek(data_offset)
+        data = f.read()
+    return sample_rate, data_size, data
+
+
+def check_rate(directory, sample_rate, seconds):
+    path = os.path.join(directory, "REC%d.wav" % sample_rate)
+    app_microphone.next_recording_path = lambda: path
+    system = StubSystem()
+    app = app_microphone.MicrophoneApp(system)
+    app.sample_rate = sample_rate
+    app.on_draw()
+    app.start_recording()
+    app.recorder.f = TimedFile(app.recorder.f)
+    system.add_app_task(app, "render", render_step)
+    system.run_tasks(clock[0] + seconds * 1000000)
+    recorder = app.recorder
+    app.stop_recording()
+    rx = app.rx
+    rate, data_size, data = read_samples(path)
+    samples = len(data) // 2
+    expected = struct.pack("<%dh" % samples, *[(i & 0xffff) - 0x8000 for i in range(samples)])
+    print("%dHz: %d samples in %ds, %d overruns, max write %dus" %
+          (sample_rate, samples, seconds, recorder.overruns, recorder.max_write_us))
+    check(rx.lost == 0, "%dHz: the I2S ring never overflowed (%d samples lost)" %
+          (sample_rate, rx.lost))
+    check(samples == rx.read_pos, "%dHz: every fetched sample is in the file" % sample_rate)
+    check(data == expected, "%dHz: the file holds the captured sequence in order" % sample_rate)
+    check(rate == sample_rate and data_size == len(data),
+          "%dHz: the header has the rate and the data size" % sample_rate)
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    directory = tempfile.mkdtemp(prefix="mic_check_")
+    try:
+        for sample_rate in app_microphone.sample_rates:
+            check_rate(directory, sample_rate, seconds)
+    finally:
+        shutil.rmtree(directory)
+    return host_stubs.status()
+
+
+install_firmware()
+
+import app_microphone  # noqa: E402
+import wav_file  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
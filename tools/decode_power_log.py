@@ -0,0 +1,61 @@
+"""Decode the power_log.bin written by power_telemetry.py into CSV.
+
+seconds restart from 0 on every boot, the boot column numbers the boots
+in the file from 1, records of logs written before the boot flag get 0.
+
+usage: python3 tools/decode_power_log.py power_log.bin > power_log.csv
+"""
+import struct
+import sys
+
+HEADER_FORMAT = "<4sBBH"
+FILE_MAGIC = b"PWRT"
+TIER_NAMES = ("1s", "1min", "10min")
+FLAG_BOOT = 0x01
+# AXP192-DS PG26/27 scale of every channel, in recording order
+CHANNELS = (
+    ("vbat_mv", 1.1, 0.0),
+    ("charge_ma", 0.5, 0.0),
+    ("discharge_ma", 0.5, 0.0),
+    ("vbus_mv", 1.7, 0.0),
+    ("temperature_c", 0.1, -144.7),
+)
+
+
+def decode(f, out):
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, version, channel_count, record_size = struct.unpack(
+        HEADER_FORMAT, f.read(header_size))
+    if magic != FILE_MAGIC:
+        raise ValueError("not a power telemetry log")
+    record_format = "<BBI" + "H" * channel_count
+    if struct.calcsize(record_format) != record_size:
+        raise ValueError("unsupported record size %d" % record_size)
+    names = [c[0] for c in CHANNELS[:channel_count]]
+    out.write("boot,tier,seconds," + ",".join(names) + "\n")
+    boot = 0
+    while True:
+        data = f.read(record_size)
+        if len(data) < record_size:
+            break
+        fields = struct.unpack(record_format, data)
+        tier, flags, seconds = fields[:3]
+        if flags & FLAG_BOOT:
+            boot += 1
+        values = []
+        for i, raw in enumerate(fields[3:]):
+            _, scale, bias = CHANNELS[i]
+            values.append("%.1f" % (raw * scale + bias))
+        out.write("%d,%s,%d,%s\n" % (boot, TIER_NAMES[tier], seconds, ",".join(values)))
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], "rb") as f:
+        decode(f, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
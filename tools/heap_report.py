@@ -0,0 +1,108 @@
+"""Per-app heap allocation report on the host, with the budget check.
+
+Drives ExplorerApp and SystemInfoApp through their draws and periodic
+tasks against the stand-in firmware modules of host_stubs, measures every
+call with heap_tracker.HeapTracker and prints runs, average and maximum
+bytes per app. Exits with status 1 when a partial redraw or periodic
+task went over the alloc_budget of its app, or when GcPolicy does not
+set the gc threshold to a quarter of the free heap, so it can run as a
+check before a release.
+
+usage: python3 tools/heap_report.py [presses]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import host_stubs  # noqa: E402
+
+host_stubs.install()
+
+import gc  # noqa: E402
+
+import dir_index  # noqa: E402
+from app_explorer import ExplorerApp  # noqa: E402
+from app_system_info import SystemInfoApp  # noqa: E402
+from heap_tracker import GcPolicy, HeapTracker  # noqa: E402
+from host_stubs import StubSystem, check  # noqa: E402
+
+
+def draw(system, tracker):
+    app = system.app
+    start = tracker.begin()
+    kind = system.draw()
+    if kind == "draw":
+        tracker.end(app, kind, start)
+    elif kind == "draw_rects":
+        tracker.end(app, kind, start, app.alloc_budget)
+
+
+def periodic(system, tracker):
+    app = system.app
+    start = tracker.begin()
+    app.app_periodic_task()
+    tracker.end(app, "periodic", start, app.alloc_budget)
+
+
+def run_app(tracker, app_class, presses, setup=None):
+    system = StubSystem()
+    app = app_class(system)
+    system.app = app
+    if setup is not None:
+        setup(app)
+    system.invalidate_drawing()
+    draw(system, tracker)
+    for _ in range(presses):
+        app.on_top_button_changed("pressed")
+        draw(system, tracker)
+        periodic(system, tracker)
+
+
+def check_gc_threshold():
+    """gc.threshold() counts the bytes allocated since the last
+    collection, it must not include what is already allocated"""
+    values = []
+    mem_free, mem_alloc = gc.mem_free, gc.mem_alloc
+    gc.threshold = values.append
+    gc.mem_free = lambda: 400 * 1024
+    gc.mem_alloc = lambda: 100 * 1024
+    try:
+        GcPolicy()
+    finally:
+        del gc.threshold
+        gc.mem_free, gc.mem_alloc = mem_free, mem_alloc
+    check(values == [100 * 1024],
+          "GcPolicy sets the gc threshold to a quarter of the free heap (%s)" % values)
+
+
+def main():
+    presses = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    path = tempfile.mkdtemp(prefix="heap_report_")
+    dir_index.index_dir = tempfile.mkdtemp(prefix="heap_report_index_")
+    for i in range(200):
+        with open(os.path.join(path, "file_%05d.txt" % i), "wb") as f:
+            f.write(b"x" * i)
+    tracker = HeapTracker()
+    try:
+        def open_explorer(app):
+            app.current_dir = path
+        run_app(tracker, ExplorerApp, presses, open_explorer)
+        run_app(tracker, SystemInfoApp, presses)
+    finally:
+        shutil.rmtree(path)
+        shutil.rmtree(dir_index.index_dir)
+    print("%-16s %-9s %6s %9s %9s %7s" % ("app", "kind", "runs", "avg B", "max B", "over"))
+    for row in tracker.rows():
+        print("%-16s %-9s %6d %9d %9d %7d" % row)
+    print("high water: %d bytes, over budget: %d" % (tracker.high_water, tracker.over_budget))
+    check(tracker.over_budget == 0, "no partial redraw or periodic task went over its budget")
+    check_gc_threshold()
+    return host_stubs.status()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""Stand-in firmware modules for running app code under CPython.
+
+install() puts counting lcd/image stand-ins into sys.modules together with
+ujson, ubinascii, machine and the MicroPython time and gc extensions, so
+the host tools can import the apps unchanged. gc.mem_alloc() is backed by
+tracemalloc, it measures CPython objects and is only comparable between
+runs on the host.
+
+check() prints one result line of a host check and remembers the
+failures, the scripts exit with status() when done. StubSystem is the
+part of M5StickVSystem the apps call, with use_virtual_clock() its app
+tasks run on virtual time.
+"""
+import binascii
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import types
+
+WIDTH = 240
+HEIGHT = 135
+
+
+class LcdCounter(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = {}
+        self.pixels = 0
+
+    def count(self, name, pixels):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.pixels += pixels
+
+    def total(self):
+        return sum(self.calls.values())
+
+
+counter = LcdCounter()
+failures = []
+# virtual microseconds, see use_virtual_clock()
+clock = [0]
+
+
+def check(condition, message):
+    print("%s %s" % ("ok  " if condition else "FAIL", message))
+    if not condition:
+        failures.append(message)
+
+
+def status():
+    """exit status of a check script, 1 when a check failed"""
+    return 1 if failures else 0
+
+
+def use_virtual_clock():
+    """time.ticks_* and sleep_ms() on clock[0], only the sleeps and what
+    the stand-ins add to clock[0] advance it"""
+    time.ticks_us = lambda: clock[0]
+    time.ticks_ms = lambda: clock[0] // 1000
+    time.ticks_diff = lambda a, b: a - b
+    time.sleep_ms = lambda ms: clock.__setitem__(0, clock[0] + ms * 1000)
+
+
+class StubSystem(object):
+    """draws synchronously, full or the merged dirty rects, and runs the
+    app tasks on clock[0] like Scheduler does, earliest due first"""
+
+    def __init__(self):
+        self.app = None
+        self.full = False
+        self.rects = []
+        # [due_us, name, step, interval_ms], a step returning None ends its task
+        self.tasks = []
+
+    def invalidate_drawing(self):
+        self.full = True
+        self.rects = []
+
+    def invalidate_rect(self, x, y, w, h):
+        from framework import merge_rect
+        if not self.full:
+            merge_rect(self.rects, (x, y, w, h))
+
+    def add_app_task(self, app, name, step, interval_ms=0):
+        self.tasks.append([clock[0], name, step, interval_ms])
+
+    def draw(self):
+        """one frame of self.app, returns "draw", "draw_rects" or None
+        when nothing was invalidated"""
+        full, rects = self.full, self.rects
+        self.full = False
+        self.rects = []
+        if full:
+            self.app.on_draw()
+            return "draw"
+        if rects:
+            self.app.on_draw_rects(rects)
+            return "draw_rects"
+        return None
+
+    def run_tasks(self, until_us):
+        while clock[0] < until_us and self.tasks:
+            task = min(self.tasks, key=lambda t: t[0])
+            if task[0] > clock[0]:
+                clock[0] = task[0]
+            delay_ms = task[2]()
+            if delay_ms is None:
+                self.tasks.remove(task)
+                continue
+            task[0] = clock[0] + max(delay_ms, task[3]) * 1000
+
+
+def make_lcd():
+    lcd = types.ModuleType("lcd")
+    lcd.WHITE, lcd.BLACK, lcd.RED, lcd.BLUE = 0xFFFF, 0x0000, 0xF800, 0x001F
+    lcd.GREEN = 0x07E0
+    lcd.width = lambda: WIDTH
+    lcd.height = lambda: HEIGHT
+    lcd.clear = lambda *args: counter.count("clear", WIDTH * HEIGHT)
+    lcd.draw_string = lambda x, y, text, *args: counter.count(
+        "draw_string", len(text) * 8 * 16)
+    lcd.fill_rectangle = lambda x, y, w, h, *args: counter.count(
+        "fill_rectangle", w * h)
+
+    def display(img, roi=None, oft=(0, 0)):
+        w, h = (roi[2], roi[3]) if roi else (img.width(), img.height())
+        counter.count("display", w * h)
+    lcd.display = display
+    return lcd
+
+
+class StubImage(object):
+    def __init__(self, path=None, size=(WIDTH, HEIGHT)):
+        self.size = size
+        self.buffer = None
+
+    def bytearray(self):
+        if self.buffer is None:
+            self.buffer = bytearray(self.size[0] * self.size[1] * 2)
+        return self.buffer
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+    def draw_rectangle(self, *args, **kwargs):
+        pass
+
+    def draw_string(self, *args, **kwargs):
+        pass
+
+    def draw_image(self, *args, **kwargs):
+        pass
+
+
+def install():
+    if not hasattr(os, "ilistdir"):
+        # MicroPython style (name, type, inode) tuples from scandir
+        def _ilistdir(path):
+            for e in os.scandir(path):
+                yield (e.name, 0o040000 if e.is_dir() else 0o100000, e.inode())
+        os.ilistdir = _ilistdir
+    if not hasattr(time, "ticks_us"):
+        time.ticks_us = lambda: int(time.perf_counter() * 1000000)
+        time.ticks_ms = lambda: int(time.perf_counter() * 1000)
+        time.ticks_diff = lambda a, b: a - b
+    if not hasattr(gc, "mem_alloc"):
+        tracemalloc.start()
+        gc.mem_alloc = lambda: tracemalloc.get_traced_memory()[0]
+        gc.mem_free = lambda: 512 * 1024
+    sys.modules["lcd"] = make_lcd()
+    sys.modules["image"] = types.SimpleNamespace(Image=StubImage)
+    sys.modules["ujson"] = json
+    sys.modules["ubinascii"] = binascii
+    sys.modules["machine"] = types.SimpleNamespace(unique_id=lambda: b"\x01\x02\x03\x04\x05\x06\x07\x08")
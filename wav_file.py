@@ -0,0 +1,51 @@
+import struct
+
+# the data chunk starts at this offset so streaming writes of whole
+# blocks stay aligned to SD sectors, the gap is a JUNK chunk
+DATA_ALIGN = 512
+RIFF_SIZE_OFFSET = 4
+DATA_SIZE_OFFSET = DATA_ALIGN - 4
+
+
+def header(sample_rate, channels=1, bits=16, data_size=0):
+    block_align = channels * bits // 8
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate,
+                      sample_rate * block_align, block_align, bits)
+    junk_size = DATA_ALIGN - 12 - (8 + len(fmt)) - 8 - 8
+    return b"RIFF" + struct.pack("<I", DATA_ALIGN - 8 + data_size) + b"WAVE" + \
+        b"fmt " + struct.pack("<I", len(fmt)) + fmt + \
+        b"JUNK" + struct.pack("<I", junk_size) + bytes(junk_size) + \
+        b"data" + struct.pack("<I", data_size)
+
+
+def patch_sizes(f, data_size):
+    f.seek(RIFF_SIZE_OFFSET)
+    f.write(struct.pack("<I", DATA_ALIGN - 8 + data_size))
+    f.seek(DATA_SIZE_OFFSET)
+    f.write(struct.pack("<I", data_size))
+
+
+def parse(f):
+    """returns (channels, sample_rate, bits, data_offset, data_size) of a
+    PCM wav file, walking the chunks instead of assuming a 44 byte header"""
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("not a wav file")
+    offset = 12
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("wav data chunk not found")
+        size = struct.unpack("<I", chunk[4:8])[0]
+        offset += 8
+        if chunk[0:4] == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            f.seek(offset + size + (size & 1))
+        elif chunk[0:4] == b"data":
+            if fmt is None or fmt[0] != 1:
+                raise ValueError("only PCM wav is supported")
+            return fmt[1], fmt[2], fmt[5], offset, size
+        else:
+            f.seek(offset + size + (size & 1))
+        offset += size + (size & 1)
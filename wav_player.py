@@ -0,0 +1,115 @@
+import time
+from array import array
+
+import wav_file
+
+
+class WavPlayer:
+    """streams a 16 bit PCM wav file into an output in fixed chunks
+
+    A ring of preallocated array('h') chunks is refilled from the file with
+    readinto(), at most one chunk per service() call, and one chunk is
+    handed to the output per call. Volume is an integer Q8 gain so no
+    float math runs per sample, at 100% the samples are not touched.
+    The output queues one chunk, so underruns counts the hand-offs that
+    came later than the play time of the chunk before: the output ran dry
+    in between."""
+
+    def __init__(self, path, play_chunk, chunk_samples=1024, ring_chunks=4, volume=100):
+        self.f = open(path, "rb")
+        self.channels, self.sample_rate, bits, data_offset, self.data_size = wav_file.parse(self.f)
+        if bits != 16:
+            self.f.close()
+            raise ValueError("only 16 bit wav is supported")
+        self.f.seek(data_offset)
+        # play_chunk(samples, count) hands count samples to the output
+        self.play_chunk = play_chunk
+        self.chunks = []
+        for _ in range(ring_chunks):
+            self.chunks.append(array('h', [0] * chunk_samples))
+        self.chunk_lengths = array('H', [0] * ring_chunks)
+        self.read_index = 0
+        self.play_index = 0
+        self.filled = 0
+        self.bytes_left = self.data_size
+        self.gain = 256
+        self.set_volume(volume)
+        self.underruns = 0
+        # end of the last hand-off and the play time of its chunk
+        self.last_handoff_us = None
+        self.last_chunk_us = 0
+        self.chunks_played = 0
+        self.total_chunk_us = 0
+        self.max_chunk_us = 0
+        self.finished = False
+
+    def set_volume(self, percent):
+        self.gain = max(0, min(100, percent)) * 256 // 100
+
+    def fill_one(self):
+        if self.filled == len(self.chunks) or self.bytes_left <= 0:
+            return False
+        chunk = self.chunks[self.read_index]
+        n = self.f.readinto(chunk)
+        if not n:
+            self.bytes_left = 0
+            return False
+        n = min(n, self.bytes_left)
+        self.bytes_left -= n
+        self.chunk_lengths[self.read_index] = n // 2
+        self.read_index = (self.read_index + 1) % len(self.chunks)
+        self.filled += 1
+        return True
+
+    def prefill(self):
+        while self.fill_one():
+            pass
+
+    def apply_gain(self, chunk, count):
+        gain = self.gain
+        if gain == 256:
+            return
+        for i in range(count):
+            chunk[i] = (chunk[i] * gain) >> 8
+
+    def service(self):
+        """one step of playback, returns None once the file is done"""
+        if self.finished:
+            return None
+        start = time.ticks_us()
+        if self.last_handoff_us is not None and \
+                time.ticks_diff(start, self.last_handoff_us) > self.last_chunk_us:
+            self.underruns += 1
+        self.fill_one()
+        if self.filled == 0:
+            self.stop()
+            return None
+        play_start = time.ticks_us()
+        chunk = self.chunks[self.play_index]
+        count = self.chunk_lengths[self.play_index]
+        self.apply_gain(chunk, count)
+        self.play_chunk(chunk, count)
+        self.play_index = (self.play_index + 1) % len(self.chunks)
+        self.filled -= 1
+        end = time.ticks_us()
+        self.last_handoff_us = end
+        self.last_chunk_us = count // self.channels * 1000000 // self.sample_rate
+        elapsed = time.ticks_diff(end, play_start)
+        self.chunks_played += 1
+        self.total_chunk_us += elapsed
+        if elapsed > self.max_chunk_us:
+            self.max_chunk_us = elapsed
+        return 0
+
+    def stop(self):
+        if not self.finished:
+            self.finished = True
+            self.f.close()
+
+    def progress_percent(self):
+        return (self.data_size - self.bytes_left) * 100 // max(self.data_size, 1)
+
+    def stats(self):
+        return {"underruns": self.underruns, "chunks": self.chunks_played,
+                "avg_chunk_us": self.total_chunk_us // max(self.chunks_played, 1),
+                "max_chunk_us": self.max_chunk_us}
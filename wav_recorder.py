@@ -0,0 +1,75 @@
+import time
+
+import wav_file
+
+
+class WavRecorder:
+    """streams PCM samples into a wav file through two preallocated
+    buffers: feed() copies the captured samples into one while the other
+    waits for service() to write it as one block aligned write. Run
+    service() from its own task so the SD write never sits in the capture
+    step. The header sizes are patched once by stop().
+
+    overruns counts the times a buffer filled up before the previous one
+    was written, those writes happen synchronously in feed() so samples
+    are delayed but never lost."""
+
+    def __init__(self, path, sample_rate, channels=1, bits=16, block_size=8192):
+        self.f = open(path, "wb")
+        self.f.write(wav_file.header(sample_rate, channels, bits))
+        self.bytes_per_sample = channels * bits // 8
+        self.buffers = (bytearray(block_size), bytearray(block_size))
+        self.block_size = block_size
+        self.fill_index = 0
+        self.fill_pos = 0
+        # index of the full buffer waiting for service(), or None
+        self.pending = None
+        self.bytes_in = 0
+        self.bytes_written = 0
+        self.overruns = 0
+        self.max_write_us = 0
+
+    def feed(self, data):
+        data = memoryview(data)
+        size = len(data)
+        pos = 0
+        while pos < size:
+            buf = self.buffers[self.fill_index]
+            n = min(size - pos, self.block_size - self.fill_pos)
+            buf[self.fill_pos:self.fill_pos + n] = data[pos:pos + n]
+            self.fill_pos += n
+            pos += n
+            if self.fill_pos == self.block_size:
+                if self.pending is not None:
+                    self.overruns += 1
+                    self.service()
+                self.pending = self.fill_index
+                self.fill_index ^= 1
+                self.fill_pos = 0
+        self.bytes_in += size
+
+    def service(self):
+        """write the full buffer, returns False when none was waiting"""
+        if self.pending is None:
+            return False
+        start = time.ticks_us()
+        self.f.write(self.buffers[self.pending])
+        elapsed = time.ticks_diff(time.ticks_us(), start)
+        if elapsed > self.max_write_us:
+            self.max_write_us = elapsed
+        self.bytes_written += self.block_size
+        self.pending = None
+        return True
+
+    def samples_in(self):
+        return self.bytes_in // self.bytes_per_sample
+
+    def stop(self):
+        self.service()
+        if self.fill_pos:
+            self.f.write(memoryview(self.buffers[self.fill_index])[:self.fill_pos])
+            self.bytes_written += self.fill_pos
+            self.fill_pos = 0
+        wav_file.patch_sizes(self.f, self.bytes_written)
+        self.f.close()
+        return self.bytes_written // self.bytes_per_sample